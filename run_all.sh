@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+echo "==========================================="
+echo "Step 0: Preprocessing for ALL (S.C, D.C, M.C)..."
+echo "==========================================="
+python src/ALL/step0-preprocess-for-ALL.py
+if [ $? -ne 0 ]; then
+  echo "Error: Unified (S.C, D.C, M.C) data preprocessing failed!"
+  exit 1
+fi
+
+echo "==========================================="
+echo "Step 1: Training the unified three-class model..."
+echo "==========================================="
+python src/ALL/step1-train-for-ALL.py
+if [ $? -ne 0 ]; then
+  echo "Error: Unified training failed!"
+  exit 1
+fi
+
+echo "==========================================="
+echo "Unified Training Completed!"
+echo "==========================================="
\ No newline at end of file
@@ -0,0 +1,31 @@
+#!/usr/bin/env bash
+echo "==========================================="
+echo "Step 0: Joint preprocessing for SC and DC..."
+echo "==========================================="
+python src/pretrain/step0-preprocess-joint.py
+if [ $? -ne 0 ]; then
+  echo "Error: joint data preprocessing failed!"
+  exit 1
+fi
+
+echo "==========================================="
+echo "Step 1: Pretraining for SC..."
+echo "==========================================="
+python src/pretrain/SC/step1-pretrain-for-SC.py
+if [ $? -ne 0 ]; then
+  echo "Error: SC pretraining failed!"
+  exit 1
+fi
+
+echo "==========================================="
+echo "Step 1: Pretraining for DC..."
+echo "==========================================="
+python src/pretrain/DC/step1-pretrain-for-DC.py
+if [ $? -ne 0 ]; then
+  echo "Error: DC pretraining failed!"
+  exit 1
+fi
+
+echo "==========================================="
+echo "SC and DC Pretraining Completed!"
+echo "==========================================="
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.preprocess import (
+    check_file_names_consistency,
+    copy_images_to_destination,
+    process_labels,
+    count_labels,
+    move_and_convert_dic_images,
+    split_dataset_inter_device
+)
+from common.image_reader import ImageReader
+from common.label_stats import write_label_report
+
+def main():
+    # Set base paths
+    base_folders = [
+        '../../data/images/images_DIC',
+        '../../data/images/images_RFP',
+        '../../data/images/images_GFP',
+        '../../data/labels'
+    ]
+    
+    processed_data_path = './processed_data'
+    images_origin_all = os.path.join(processed_data_path, 'images_origin_all')
+    thumbnails = os.path.join(processed_data_path, 'thumbnails')
+    labels_all = os.path.join(processed_data_path, 'labels_all')
+    only_dic_images = os.path.join(processed_data_path, 'only_dic_images')
+    split_output_dir = 'split_for_yolo_detection'
+
+    # 1. Check filename consistency
+    check_file_names_consistency(base_folders)
+
+    # 2. Copy images
+    copy_images_to_destination(base_folders[:3], images_origin_all)
+    
+    # 3. Process labels (keeping S.C, D.C and M.C)
+    process_labels(base_folders[3], labels_all, exclude_classes=())
+    
+    # 4. Count labels
+    count_labels(labels_all)
+    
+    # One reader for the conversion and the QA thumbnails, so each file is decoded once
+    reader = ImageReader()
+
+    # 5. Process DIC images
+    move_and_convert_dic_images(images_origin_all, only_dic_images, reader, thumbnails)
+    
+    # 6. Split dataset
+    split_dataset_inter_device(only_dic_images, labels_all, split_output_dir,
+                               class_names=('S.C', 'D.C', 'M.C'))
+
+    # 7. Write label QA report
+    write_label_report(labels_all, os.path.join(processed_data_path, 'label_report'), split_output_dir)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import wandb
+import torch
+import gc
+import subprocess
+import shutil
+from pathlib import Path
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.autotune import autotune_train_settings
+from common.distillation import distill_fold, record_distillation
+from common.evaluation import clear_saved_predictions, evaluate_fold
+from common.quantization import quantize_fold, record_quantization
+from common.results_store import ResultsStore, compare_with_specialists, print_comparison
+from common.runtime import export_fold
+from common.training import train_fold
+
+CLASS_NAMES = ('S.C', 'D.C', 'M.C')
+
+# Experiment name under which fold metrics are recorded in the results store
+EXPERIMENT = os.environ.get('ICD_EXPERIMENT', 'yolov9-e')
+
+# Set ICD_AUTOTUNE=1 to probe batch size and workers on this host instead of the defaults
+AUTOTUNE = os.environ.get('ICD_AUTOTUNE', '0') == '1'
+
+# Set ICD_EXPORT=1 to export each fold to ONNX and TorchScript for CPU inference (needs onnx)
+EXPORT = os.environ.get('ICD_EXPORT', '0') == '1'
+
+# Set ICD_EXPORT_DYNAMIC=1 to export ONNX with a dynamic batch axis instead of batch 1
+EXPORT_DYNAMIC_BATCH = os.environ.get('ICD_EXPORT_DYNAMIC', '0') == '1'
+
+# Set ICD_QUANTIZE=1 to build an INT8 model per fold and compare it with FP32 on the CPU
+QUANTIZE = os.environ.get('ICD_QUANTIZE', '0') == '1'
+
+# Set ICD_DISTILL_STUDENT (yolov9-t, yolov9-s or yolov9-m) to distill each fold model into a smaller student
+DISTILL_STUDENT = os.environ.get('ICD_DISTILL_STUDENT')
+
+def setup_yolov9():
+    """Setup YOLOv9 repository and copy required files"""
+    
+    # 1) Clone YOLOv9 repository if it does not exist
+    if not Path('yolov9').exists():
+        subprocess.run(['git', 'clone', 'https://github.com/WongKinYiu/yolov9.git'], check=True)
+        
+        # Install requirements only if it's a fresh clone
+        os.chdir('yolov9')
+        subprocess.run(['pip', 'install', '-qr', 'requirements.txt'], check=True)
+        os.chdir('..')  # Return to original directory
+    
+    # 2) Change to yolov9 directory for the rest of the setup
+    os.chdir('yolov9')
+    
+    # # 3) Download YOLOv9-e pre-trained weights if not exists
+    # weights_path = Path('./yolov9-e.pt')
+    # if not weights_path.exists():
+    #     print("Downloading YOLOv9-e weights...")
+    #     url = 'https://github.com/WongKinYiu/yolov9/releases/download/v0.1/yolov9-e.pt'
+    #     response = requests.get(url, stream=True)
+    #     response.raise_for_status()
+        
+    #     with open(weights_path, 'wb') as f:
+    #         for chunk in response.iter_content(chunk_size=8192):
+    #             if chunk:
+    #                 f.write(chunk)
+        
+    #     print("YOLOv9-e weights downloaded successfully")
+    
+    # 4) Copy the split_for_yolo_detection folder into the yolov9 directory
+    source_dir = Path('../split_for_yolo_detection')
+    dest_dir   = Path('./split_for_yolo_detection')
+    
+    if source_dir.exists():
+        try:
+            if dest_dir.exists():
+                shutil.rmtree(dest_dir)  
+            shutil.copytree(source_dir, dest_dir)
+            print("Copied split_for_yolo_detection to yolov9 directory")
+            
+        except PermissionError:
+            print("Permission Error: Try running the script with administrator privileges")
+            raise
+        except Exception as e:
+            print(f"Error copying directory: {e}")
+            raise
+    else:
+        raise FileNotFoundError(
+            "split_for_yolo_detection directory not found in the parent directory"
+        )
+
+def train_model(fold):
+    """Train the three-class model for each fold
+    
+    Args:
+        fold: Current fold number
+    """
+    settings = {'batch': 4, 'workers': 0, 'device': '0'}
+    if AUTOTUNE:
+        settings = autotune_train_settings('models/detect/yolov9-e.yaml', 1024,
+                                           f'./split_for_yolo_detection/fold_{fold}/train.txt',
+                                           nc=len(CLASS_NAMES))
+
+    cmd = [
+        'python', 'train_dual.py',
+        '--workers', str(settings['workers']),
+        '--device', settings['device'],
+        '--batch', str(settings['batch']),
+        '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
+        '--img', '1024',
+        '--cfg', 'models/detect/yolov9-e.yaml',
+        '--weights', 'yolov9-e.pt',
+        '--name', f'test_fold_{fold}',
+        '--project', 'Yolov9_unifiedmodel',
+        '--hyp', 'hyp.scratch-high.yaml',
+        '--min-items', '0',
+        '--epochs', '100',        
+        '--close-mosaic', '15',
+        '--exist-ok'
+    ]
+    
+    # Resumes from last.pt after interruptions and retries failed runs
+    train_fold(cmd, 'Yolov9_unifiedmodel', f'test_fold_{fold}', fold)
+    torch.cuda.empty_cache()
+    gc.collect()
+
+def validate_model(fold):
+    """Validate the three-class model for each fold
+    
+    Args:
+        fold: Current fold number
+
+    Returns:
+        dict: Metrics computed from the saved predictions, per class
+    """
+    cmd = [
+        'python', 'val_dual.py',
+        '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
+        '--img', '1024',
+        '--batch', '4',
+        '--conf', '0.001',
+        '--iou', '0.7',
+        '--device', '0',
+        '--weights', f'./Yolov9_unifiedmodel/test_fold_{fold}/weights/best.pt',
+        '--save-json',
+        '--save-txt',
+        '--save-conf',
+        '--exist-ok',
+        '--name', f'test_fold_{fold}'
+    ]
+    
+    # val_dual.py appends to existing label files
+    clear_saved_predictions(f'runs/val/test_fold_{fold}')
+    subprocess.run(cmd, check=True)
+    torch.cuda.empty_cache()
+    gc.collect()
+
+    # Keep confidences so metrics at other thresholds never need a rerun
+    return evaluate_fold(f'./split_for_yolo_detection/fold_{fold}', f'runs/val/test_fold_{fold}', CLASS_NAMES)
+
+def main():
+    # Setup WandB
+    wandb.login(key="Your Key")    
+    
+    # Setup YOLOv9 and copy required files
+    setup_yolov9()
+    
+    # Collect per-fold metrics across runs
+    store = ResultsStore()
+
+    # Train and validate for each fold
+    for fold in range(5):
+        print(f"\nProcessing fold {fold}")
+        
+        print(f"Training fold {fold}...")
+        train_model(fold)
+        
+        print(f"Validating fold {fold}...")
+        metrics = validate_model(fold)
+        store.record_evaluation(EXPERIMENT, 'ALL', 'finetune', fold, metrics)
+
+        # Quantization starts from the exported best.onnx
+        if EXPORT or QUANTIZE:
+            print(f"Exporting fold {fold}...")
+            export_fold(f'./Yolov9_unifiedmodel/test_fold_{fold}/weights/best.pt', img_size=1024,
+                        dynamic=EXPORT_DYNAMIC_BATCH)
+
+        if QUANTIZE:
+            print(f"Quantizing fold {fold}...")
+            report = quantize_fold(f'./Yolov9_unifiedmodel/test_fold_{fold}/weights',
+                                   f'./split_for_yolo_detection/fold_{fold}', CLASS_NAMES, img_size=1024,
+                                   reference_metrics=f'runs/val/test_fold_{fold}/metrics.json')
+            record_quantization(store, EXPERIMENT, 'ALL', 'finetune', fold, report)
+
+        if DISTILL_STUDENT:
+            print(f"Distilling fold {fold} into {DISTILL_STUDENT}...")
+            report = distill_fold(fold, DISTILL_STUDENT, CLASS_NAMES, 'Yolov9_unifiedmodel', metrics, autotune=AUTOTUNE)
+            record_distillation(store, EXPERIMENT, DISTILL_STUDENT, 'ALL', 'finetune', fold, report)
+        break  # "Only the 0th fold is executed. (If you want additional training, comment out this line)"
+
+    # Per-class accuracy against the SC and DC finetuned models recorded under the same experiment
+    print_comparison(compare_with_specialists(store, EXPERIMENT))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
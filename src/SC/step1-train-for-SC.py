@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import sys
 import wandb
 import torch
 import gc
@@ -9,6 +10,34 @@ import subprocess
 import shutil
 from pathlib import Path
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.autotune import autotune_train_settings
+from common.distillation import distill_fold, record_distillation
+from common.evaluation import clear_saved_predictions, evaluate_fold
+from common.model_registry import resolve_weights
+from common.quantization import quantize_fold, record_quantization
+from common.results_store import ResultsStore
+from common.runtime import export_fold
+from common.training import train_fold
+
+# Experiment name under which fold metrics are recorded in the results store
+EXPERIMENT = os.environ.get('ICD_EXPERIMENT', 'yolov9-e')
+
+# Set ICD_AUTOTUNE=1 to probe batch size and workers on this host instead of the defaults
+AUTOTUNE = os.environ.get('ICD_AUTOTUNE', '0') == '1'
+
+# Set ICD_EXPORT=1 to export each fold to ONNX and TorchScript for CPU inference (needs onnx)
+EXPORT = os.environ.get('ICD_EXPORT', '0') == '1'
+
+# Set ICD_EXPORT_DYNAMIC=1 to export ONNX with a dynamic batch axis instead of batch 1
+EXPORT_DYNAMIC_BATCH = os.environ.get('ICD_EXPORT_DYNAMIC', '0') == '1'
+
+# Set ICD_QUANTIZE=1 to build an INT8 model per fold and compare it with FP32 on the CPU
+QUANTIZE = os.environ.get('ICD_QUANTIZE', '0') == '1'
+
+# Set ICD_DISTILL_STUDENT (yolov9-t, yolov9-s or yolov9-m) to distill each fold model into a smaller student
+DISTILL_STUDENT = os.environ.get('ICD_DISTILL_STUDENT')
+
 def setup_yolov9():
     """Setup YOLOv9 repository and copy required files"""
     
@@ -67,24 +96,34 @@ def train_model(fold):
     Args:
         fold: Current fold number
     """
+    settings = {'batch': 4, 'workers': 0, 'device': '0'}
+    if AUTOTUNE:
+        settings = autotune_train_settings('models/detect/yolov9-e.yaml', 1024,
+                                           f'./split_for_yolo_detection/fold_{fold}/train.txt')
+
+    # Pretrained weights published by the SC pretraining run
+    weights = resolve_weights('SC', fold, f'../pretrainedmodel_weight_for_sc/test_fold_{fold}/weights/best.pt')
+
     cmd = [
         'python', 'train_dual.py',
-        '--workers', '0',
-        '--device', '0',
-        '--batch', '4',
+        '--workers', str(settings['workers']),
+        '--device', settings['device'],
+        '--batch', str(settings['batch']),
         '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
         '--img', '1024',
         '--cfg', 'models/detect/yolov9-e.yaml',
-        '--weights', f'../pretrainedmodel_weight_for_sc/test_fold_{fold}/weights/best.pt',
+        '--weights', weights,
         '--name', f'test_fold_{fold}',
         '--project', 'Yolov9_finetunedmodel',
         '--hyp', 'hyp.scratch-high.yaml',
         '--min-items', '0',
         '--epochs', '100',        
-        '--close-mosaic', '15'
+        '--close-mosaic', '15',
+        '--exist-ok'
     ]
     
-    subprocess.run(cmd)
+    # Resumes from last.pt after interruptions and retries failed runs
+    train_fold(cmd, 'Yolov9_finetunedmodel', f'test_fold_{fold}', fold)
     torch.cuda.empty_cache()
     gc.collect()
 
@@ -93,6 +132,9 @@ def validate_model(fold):
     
     Args:
         fold: Current fold number
+
+    Returns:
+        dict: Metrics computed from the saved predictions
     """
     cmd = [
         'python', 'val_dual.py',
@@ -105,13 +147,20 @@ def validate_model(fold):
         '--weights', f'./Yolov9_finetunedmodel/test_fold_{fold}/weights/best.pt',
         '--save-json',
         '--save-txt',
+        '--save-conf',
+        '--exist-ok',
         '--name', f'test_fold_{fold}'
     ]
     
-    subprocess.run(cmd)
+    # val_dual.py appends to existing label files
+    clear_saved_predictions(f'runs/val/test_fold_{fold}')
+    subprocess.run(cmd, check=True)
     torch.cuda.empty_cache()
     gc.collect()
 
+    # Keep confidences so metrics at other thresholds never need a rerun
+    return evaluate_fold(f'./split_for_yolo_detection/fold_{fold}', f'runs/val/test_fold_{fold}', ('S.C',))
+
 def main():
     # Setup WandB
     wandb.login(key="Your Key")    
@@ -119,6 +168,9 @@ def main():
     # Setup YOLOv9 and copy required files
     setup_yolov9()
     
+    # Collect per-fold metrics across runs
+    store = ResultsStore()
+
     # Train and validate for each fold
     for fold in range(5):
         print(f"\nProcessing fold {fold}")
@@ -127,7 +179,26 @@ def main():
         train_model(fold)
         
         print(f"Validating fold {fold}...")
-        validate_model(fold)        
+        metrics = validate_model(fold)
+        store.record_evaluation(EXPERIMENT, 'SC', 'finetune', fold, metrics)
+
+        # Quantization starts from the exported best.onnx
+        if EXPORT or QUANTIZE:
+            print(f"Exporting fold {fold}...")
+            export_fold(f'./Yolov9_finetunedmodel/test_fold_{fold}/weights/best.pt', img_size=1024,
+                        dynamic=EXPORT_DYNAMIC_BATCH)
+
+        if QUANTIZE:
+            print(f"Quantizing fold {fold}...")
+            report = quantize_fold(f'./Yolov9_finetunedmodel/test_fold_{fold}/weights',
+                                   f'./split_for_yolo_detection/fold_{fold}', ('S.C',), img_size=1024,
+                                   reference_metrics=f'runs/val/test_fold_{fold}/metrics.json')
+            record_quantization(store, EXPERIMENT, 'SC', 'finetune', fold, report)
+
+        if DISTILL_STUDENT:
+            print(f"Distilling fold {fold} into {DISTILL_STUDENT}...")
+            report = distill_fold(fold, DISTILL_STUDENT, ('S.C',), 'Yolov9_finetunedmodel', metrics, autotune=AUTOTUNE)
+            record_distillation(store, EXPERIMENT, DISTILL_STUDENT, 'SC', 'finetune', fold, report)
         break  # "Only the 0th fold is executed. (If you want additional training, comment out this line)"
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Shared helpers used by the SC/DC preprocessing and training scripts."""
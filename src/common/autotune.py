@@ -0,0 +1,253 @@
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import resource
+import socket
+import sys
+import time
+
+DEFAULT_CACHE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'results', 'autotune.json'))
+BATCH_CANDIDATES = (1, 2, 4, 8, 16, 32, 64)
+MEMORY_FRACTION = 0.85
+PROBE_STEPS = 3
+# Longest time one batch size may take to probe before the probe process is abandoned
+PROBE_TIMEOUT = 600
+# Allocation failures on CUDA and of PyTorch's CPU allocator
+OOM_MESSAGES = ('out of memory', "can't allocate memory")
+
+def _tensor_sum(output):
+    # Stand-in loss touching every head output, so backward allocates like training
+    import torch
+
+    if isinstance(output, torch.Tensor):
+        return output.float().mean()
+    return sum(_tensor_sum(item) for item in output)
+
+def _total_host_memory():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+def _peak_host_memory():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def probe_batch_sizes(cfg, img_size, nc, device, yolov9_dir='.', candidates=BATCH_CANDIDATES, report=None):
+    """
+    Time forward/backward steps of the model at increasing batch sizes.
+
+    Stops at the first batch size that runs out of memory or whose peak
+    memory exceeds MEMORY_FRACTION of the device (GPU) or host (CPU) memory.
+
+    Args:
+        cfg (str): Model config (e.g. models/detect/yolov9-e.yaml)
+        img_size (int): Training image size
+        nc (int): Number of classes
+        device (str): "cpu" or a CUDA device index
+        yolov9_dir (str): yolov9 checkout providing the model code
+        candidates (tuple): Batch sizes to try, increasing
+        report (callable): Optional callback receiving each result as soon as it fits
+
+    Returns:
+        list: Dicts with batch, images_per_second and peak_memory for every batch size that fit
+    """
+    import torch
+
+    sys.path.insert(0, os.path.abspath(yolov9_dir))
+    from models.yolo import Model
+
+    cuda = device != 'cpu'
+    torch_device = torch.device(f'cuda:{device}' if cuda else 'cpu')
+    total_memory = (torch.cuda.get_device_properties(torch_device).total_memory if cuda
+                    else _total_host_memory())
+    model = Model(cfg, ch=3, nc=nc).to(torch_device).train()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.0)
+
+    results = []
+    for batch in candidates:
+        try:
+            if cuda:
+                torch.cuda.empty_cache()
+                torch.cuda.reset_peak_memory_stats(torch_device)
+            images = torch.rand(batch, 3, img_size, img_size, device=torch_device)
+            start = None
+            for step in range(PROBE_STEPS + 1):
+                if step == 1:
+                    # The first step includes allocator and cuDNN warm-up
+                    if cuda:
+                        torch.cuda.synchronize(torch_device)
+                    start = time.perf_counter()
+                optimizer.zero_grad(set_to_none=True)
+                with torch.autocast(device_type='cuda', enabled=cuda):
+                    loss = _tensor_sum(model(images))
+                loss.backward()
+                optimizer.step()
+            if cuda:
+                torch.cuda.synchronize(torch_device)
+            elapsed = time.perf_counter() - start
+            peak = torch.cuda.max_memory_allocated(torch_device) if cuda else _peak_host_memory()
+        except RuntimeError as error:
+            if not any(message in str(error).lower() for message in OOM_MESSAGES):
+                raise
+            break
+        finally:
+            images = loss = None
+
+        results.append({"batch": batch, "images_per_second": batch * PROBE_STEPS / elapsed, "peak_memory": peak})
+        print(f"Batch {batch}: {results[-1]['images_per_second']:.1f} img/s, peak {peak / 1024 ** 3:.2f} GiB")
+        if peak > MEMORY_FRACTION * total_memory:
+            results.pop()
+            break
+        if report is not None:
+            report(results[-1])
+    return results
+
+def probe_loader_throughput(image_paths, img_size, workers, n_images=64):
+    """
+    Measure how fast a pool of worker processes decodes and resizes images.
+
+    Args:
+        image_paths (list): Training image paths
+        img_size (int): Training image size
+        workers (int): Number of worker processes (0 decodes in this process)
+        n_images (int): Number of images to time
+
+    Returns:
+        float: Images per second
+    """
+    sample = (image_paths * (n_images // max(len(image_paths), 1) + 1))[:n_images]
+    args = [(path, img_size) for path in sample]
+    if workers == 0:
+        start = time.perf_counter()
+        for item in args:
+            _load_resized(item)
+        return len(sample) / (time.perf_counter() - start)
+
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        # Spawned workers re-import the interpreter and PIL; like yolov9's persistent
+        # dataloader workers, that start-up is paid once and must not be timed
+        pool.map(_load_resized, args[:workers], chunksize=1)
+        start = time.perf_counter()
+        pool.map(_load_resized, args, chunksize=1)
+        return len(sample) / (time.perf_counter() - start)
+
+def _load_resized(item):
+    from PIL import Image
+
+    path, img_size = item
+    with Image.open(path) as image:
+        image.convert('RGB').resize((img_size, img_size))
+
+def _probe_worker(queue, cfg, img_size, nc, device, yolov9_dir):
+    # Each fitting batch size is sent right away, so a killed probe still leaves its results
+    try:
+        probe_batch_sizes(cfg, img_size, nc, device, yolov9_dir, report=queue.put)
+        queue.put(None)
+    except Exception as error:
+        queue.put(error)
+
+def _run_probe(cfg, img_size, nc, device, yolov9_dir):
+    # Collect results until the probe finishes, fails, dies or stalls on one batch size
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_probe_worker, args=(queue, cfg, img_size, nc, device, yolov9_dir))
+    process.start()
+
+    probes = []
+    deadline = time.monotonic() + PROBE_TIMEOUT
+    while True:
+        try:
+            message = queue.get(timeout=5)
+        except queue_module.Empty:
+            if not process.is_alive():
+                process.join()
+                print(f"Autotune probe exited with code {process.exitcode}, "
+                      f"keeping the {len(probes)} batch sizes that fit")
+                break
+            if time.monotonic() > deadline:
+                print(f"Autotune probe stalled for {PROBE_TIMEOUT}s, keeping the {len(probes)} batch sizes that fit")
+                process.terminate()
+                break
+            continue
+        if message is None:
+            break
+        if isinstance(message, Exception):
+            process.join()
+            raise message
+        probes.append(message)
+        deadline = time.monotonic() + PROBE_TIMEOUT
+    process.join()
+    return probes
+
+def _cache_key(cfg, img_size, device, nc):
+    import torch
+
+    if device != 'cpu' and torch.cuda.is_available():
+        hardware = torch.cuda.get_device_name(int(device))
+    else:
+        hardware = f'cpu-{os.cpu_count()}'
+    # nc changes the detection head, so the batch size that fits depends on it
+    return f"{socket.gethostname()}|{hardware}|{os.path.basename(cfg)}|{img_size}|nc{nc}"
+
+def autotune_train_settings(cfg, img_size, data_list, nc=1, device='0', yolov9_dir='.',
+                            cache_path=DEFAULT_CACHE_PATH, refresh=False):
+    """
+    Pick the batch size, dataloader workers and device for train_dual.py.
+
+    The batch size is the largest that fits on the device with headroom. The
+    worker count is the smallest whose decode throughput keeps up with the
+    model at that batch size. The model probe runs in a separate process so
+    the launcher holds no GPU memory afterwards; if that process is killed
+    (e.g. by the kernel OOM killer) or stalls, the largest batch size that
+    fit before is used. Results are cached per host, device, model config,
+    image size and number of classes.
+
+    Args:
+        cfg (str): Model config (e.g. models/detect/yolov9-e.yaml)
+        img_size (int): Training image size
+        data_list (str): train.txt of the fold, used to time image loading
+        nc (int): Number of classes
+        device (str): Preferred CUDA device; falls back to "cpu" without CUDA
+        yolov9_dir (str): yolov9 checkout providing the model code
+        cache_path (str): JSON cache file
+        refresh (bool): Ignore the cached result and probe again
+
+    Returns:
+        dict: batch, workers and device to pass to train_dual.py
+    """
+    import torch
+
+    if not torch.cuda.is_available():
+        device = 'cpu'
+    key = _cache_key(cfg, img_size, device, nc)
+
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    if key in cache and not refresh:
+        print(f"Using cached autotune settings for {key}: {cache[key]}")
+        return cache[key]
+
+    probes = _run_probe(cfg, img_size, nc, device, yolov9_dir)
+    if not probes:
+        raise RuntimeError(f"Batch size 1 does not fit on device {device} at --img {img_size}")
+    best = probes[-1]
+
+    with open(data_list) as f:
+        image_paths = [line.strip() for line in f if line.strip()]
+    workers = 0
+    for candidate in (0, 1, 2, 4, 8, 16):
+        if candidate > (os.cpu_count() or 1):
+            break
+        workers = candidate
+        if probe_loader_throughput(image_paths, img_size, candidate) >= best["images_per_second"]:
+            break
+
+    settings = {"batch": best["batch"], "workers": workers, "device": device,
+                "images_per_second": best["images_per_second"]}
+    cache[key] = settings
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    print(f"Autotuned settings for {key}: {settings}")
+    return settings
@@ -0,0 +1,297 @@
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from common.transforms import PREPROCESS_MODES, iter_frames, load_frame
+
+class BatchMetrics:
+    """
+    Thread-safe counters and sliding windows of request latencies.
+
+    The long window feeds the reported percentiles; the short one tracks
+    current latency for adaptive waiting, so a change in load shows up
+    within a few batches.
+    """
+
+    def __init__(self, window=10000, recent_window=64):
+        """
+        Args:
+            window (int): Number of most recent request latencies kept for percentiles
+            recent_window (int): Number of most recent request latencies used by recent percentiles
+        """
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.recent_latencies = deque(maxlen=recent_window)
+        self.batch_sizes = deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+
+    def record_batch(self, size, latencies):
+        with self.lock:
+            self.batches += 1
+            self.requests += size
+            self.batch_sizes.append(size)
+            self.latencies.extend(latencies)
+            self.recent_latencies.extend(latencies)
+
+    def record_depth(self, depth):
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def latency_percentile(self, q, recent=False):
+        with self.lock:
+            latencies = list(self.recent_latencies if recent else self.latencies)
+        return float(np.percentile(latencies, q)) if latencies else 0.0
+
+    def snapshot(self, max_batch_size, queue_depth, max_wait_ms):
+        with self.lock:
+            latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+            sizes = np.array(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            return {"requests": self.requests, "batches": self.batches,
+                    "queue_depth": queue_depth, "max_queue_depth": self.max_queue_depth,
+                    "mean_batch_size": float(sizes.mean()), "batch_fill_rate": float(sizes.mean() / max_batch_size),
+                    "latency_p50_ms": float(p50), "latency_p95_ms": float(p95), "latency_p99_ms": float(p99),
+                    "max_wait_ms": max_wait_ms}
+
+class MicroBatcher:
+    """
+    Collect single requests into batches and run them on a worker pool.
+
+    A batch is dispatched as soon as it holds ``max_batch_size`` requests or
+    its oldest request has waited ``max_wait_ms``. With a latency SLO set,
+    the wait adapts after every batch: it shrinks when the p95 latency of
+    the most recent requests exceeds the SLO, and grows back while latency is comfortably within it
+    and batches leave the pool under-filled. A backlog of a full batch or
+    more is dispatched without waiting.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=20, workers=1, use_processes=False,
+                 latency_slo_ms=None, initializer=None, initargs=()):
+        """
+        Args:
+            run_batch (callable): Maps a list of requests to a list of results
+                (must be picklable with use_processes)
+            max_batch_size (int): Largest batch passed to run_batch
+            max_wait_ms (float): Longest time the first request of a batch waits for more
+            workers (int): Batches run concurrently
+            use_processes (bool): Run batches in a process pool instead of threads
+            latency_slo_ms (float): Target p95 latency; enables adaptive waiting
+            initializer (callable): Worker initializer (e.g. loads the model once per process)
+            initargs (tuple): Arguments of initializer
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.wait_limit_ms = max_wait_ms
+        self.latency_slo_ms = latency_slo_ms
+        self.metrics = BatchMetrics()
+        self.requests = queue.Queue()
+        self.slots = threading.Semaphore(workers)
+        executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.pool = executor(max_workers=workers, initializer=initializer, initargs=initargs)
+        self.closed = threading.Event()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def submit(self, request):
+        """
+        Queue one request.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the request's result
+        """
+        if self.closed.is_set():
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self.requests.put((request, future, time.perf_counter()))
+        self.metrics.record_depth(self.requests.qsize())
+        return future
+
+    def _collect(self):
+        while True:
+            try:
+                first = self.requests.get(timeout=0.1)
+            except queue.Empty:
+                if self.closed.is_set():
+                    return
+                continue
+
+            batch = [first]
+            if self.requests.qsize() < self.max_batch_size:
+                deadline = first[2] + self.max_wait_ms / 1000
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.requests.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Waiting for a free worker here keeps further requests queued, so the next batch fills up
+            self.slots.acquire()
+            # Requests cancelled while queued are dropped; the rest can no longer be cancelled
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                self.slots.release()
+                continue
+            try:
+                self.pool.submit(self.run_batch, [request for request, _, _ in batch]).add_done_callback(
+                    lambda done, batch=batch: self._finish(batch, done))
+            except Exception as error:
+                # e.g. a broken process pool; fail this batch instead of the collector
+                self.slots.release()
+                self._fail(batch, error)
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _finish(self, batch, done):
+        self.slots.release()
+        try:
+            results = done.result()
+            if len(results) != len(batch):
+                raise ValueError(f"run_batch returned {len(results)} results for {len(batch)} requests")
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as error:
+            self._fail(batch, error)
+        now = time.perf_counter()
+        self.metrics.record_batch(len(batch), [(now - submitted) * 1000 for _, _, submitted in batch])
+        self._adapt(len(batch))
+
+    def _adapt(self, batch_size):
+        if self.latency_slo_ms is None:
+            return
+        p95 = self.metrics.latency_percentile(95, recent=True)
+        if p95 > self.latency_slo_ms:
+            self.max_wait_ms = self.max_wait_ms / 2
+        elif p95 < 0.5 * self.latency_slo_ms and batch_size < self.max_batch_size:
+            self.max_wait_ms = min(self.wait_limit_ms, self.max_wait_ms + 0.1 * self.wait_limit_ms)
+
+    def snapshot(self):
+        """
+        Current metrics: queue depth, batch fill rate, p50/p95/p99 latency and the current wait.
+        """
+        return self.metrics.snapshot(self.max_batch_size, self.requests.qsize(), self.max_wait_ms)
+
+    def close(self):
+        """
+        Stop accepting requests, finish the queued ones and shut the pool down.
+        """
+        self.closed.set()
+        self.collector.join()
+        self.pool.shutdown(wait=True)
+
+# Detector and preprocessing of the current worker thread (or process)
+_worker = threading.local()
+
+def init_detector(model_path, img_size=1024, threads=None, output_index=-1, preprocess=None, native_depth=False):
+    """
+    Load a CPUDetector once per worker (MicroBatcher initializer).
+
+    Each worker thread keeps its own detector, so thread workers do not
+    replace each other's model while a batch is running.
+
+    Args:
+        preprocess (str): None for step0 outputs, "dic" or "merged" for raw channel images
+        native_depth (bool): Merge at native bit depth, as step0 with native_depth
+    """
+    from common.runtime import CPUDetector
+
+    _worker.detector = CPUDetector(model_path, img_size, threads, output_index)
+    _worker.preprocess = (preprocess, native_depth)
+
+def predict_frames(sources, conf_thres=0.001, iou_thres=0.7):
+    """
+    Batch function for MicroBatcher: detect objects in frames from iter_frames.
+
+    Returns:
+        list: Per frame, a (K, 6) array of normalized xc, yc, w, h, conf, cls
+    """
+    images = [load_frame(source, *_worker.preprocess) for source in sources]
+    return _worker.detector.predict(images, conf_thres, iou_thres)
+
+def replay_folder(batcher, images_folder, rate, burst=1, duration=None, seed=0, preprocess=None):
+    """
+    Submit a folder's frames with Poisson arrivals, in bursts of ``burst`` frames.
+
+    Args:
+        batcher (MicroBatcher): Scheduler under test
+        images_folder (str): Folder of images
+        rate (float): Mean frames per second
+        burst (int): Frames submitted together (e.g. one plate-reader read-out)
+        duration (float): Optional limit in seconds
+        seed (int): Arrival seed
+        preprocess (str): None, "dic" or "merged", as passed to init_detector
+
+    Returns:
+        dict: Metrics snapshot after all requests finished
+    """
+    sources = [source for _, source in iter_frames(images_folder, preprocess)]
+    rng = random.Random(seed)
+    futures = []
+    start = time.perf_counter()
+    for i in range(0, len(sources), burst):
+        if duration and time.perf_counter() - start > duration:
+            break
+        futures += [batcher.submit(source) for source in sources[i:i + burst]]
+        time.sleep(rng.expovariate(rate / burst))
+    for future in futures:
+        future.result()
+    snapshot = batcher.snapshot()
+    snapshot["images_per_second"] = len(futures) / (time.perf_counter() - start)
+    return snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batched CPU inference on a replayed image stream")
+    parser.add_argument("model", help="best.onnx or best.torchscript")
+    parser.add_argument("images_folder")
+    parser.add_argument("--img", type=int, default=1024)
+    parser.add_argument("--threads", type=int, help="Intra-op threads per worker")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--processes", action="store_true", help="Run workers as processes")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--slo-ms", type=float, help="p95 latency target for adaptive waiting")
+    parser.add_argument("--rate", type=float, default=10, help="Mean frames per second")
+    parser.add_argument("--burst", type=int, default=1, help="Frames arriving together")
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--preprocess", choices=PREPROCESS_MODES,
+                        help="Transform raw channel images in memory as step0 does")
+    parser.add_argument("--native-depth", action="store_true")
+    parser.add_argument("--metrics", help="Write the final metrics as JSON")
+    args = parser.parse_args()
+
+    initargs = (args.model, args.img, args.threads, -1, args.preprocess, args.native_depth)
+    batcher = MicroBatcher(predict_frames, args.max_batch, args.max_wait_ms, args.workers, args.processes,
+                           args.slo_ms, initializer=init_detector, initargs=initargs)
+    snapshot = replay_folder(batcher, args.images_folder, args.rate, args.burst, args.duration,
+                             preprocess=args.preprocess)
+    batcher.close()
+
+    print(json.dumps(snapshot, indent=2))
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import numpy as np
+from PIL import Image
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# Channels are processed as float32 on the 16-bit scale; 8-bit inputs are
+# stretched by 257 so that 255 maps to 65535 and 8-bit parameters still apply.
+FULL_SCALE = 65535.0
+SCALE_8_TO_16 = 257.0
+
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13.0
+
+def read_channel(path):
+    """
+    Read a channel image at its native bit depth.
+
+    Uncompressed TIFFs are memory-mapped when tifffile is installed, so 16-bit
+    microscope data is never collapsed to 8 bits or copied on open.
+
+    Args:
+        path (str): Image file path
+
+    Returns:
+        numpy.ndarray: Array of shape (H, W) or (H, W, C) in the file's dtype
+    """
+    if tifffile is not None and path.lower().endswith(('.tif', '.tiff')):
+        try:
+            return tifffile.memmap(path, mode='r')
+        except ValueError:
+            # Compressed or tiled TIFFs cannot be mapped
+            return tifffile.imread(path)
+
+    with Image.open(path) as image:
+        return np.asarray(image)
+
+def to_rgb16(array):
+    """
+    Convert a channel array to float32 RGB on the 16-bit scale.
+
+    Args:
+        array (numpy.ndarray): Array from read_channel
+
+    Returns:
+        numpy.ndarray: float32 array of shape (H, W, 3) in [0, 65535]
+    """
+    if array.dtype == np.uint8:
+        array = array.astype(np.float32) * SCALE_8_TO_16
+    elif array.dtype == np.uint16:
+        array = array.astype(np.float32)
+    else:
+        array = array.astype(np.float32)
+        peak = float(array.max()) if array.size else 0.0
+        if peak > 0:
+            array *= FULL_SCALE / peak
+
+    if array.ndim == 2:
+        array = np.repeat(array[:, :, None], 3, axis=2)
+    return array[:, :, :3]
+
+def luminance(rgb):
+    """
+    ITU-R 601-2 luma, the weights PIL uses for convert("L").
+
+    Args:
+        rgb (numpy.ndarray): float32 array of shape (H, W, 3)
+
+    Returns:
+        numpy.ndarray: float32 array of shape (H, W)
+    """
+    return rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+def adjust_contrast(rgb, factor):
+    """
+    Contrast enhancement around the mean luminance (ImageEnhance.Contrast).
+
+    Args:
+        rgb (numpy.ndarray): float32 array of shape (H, W, 3)
+        factor (float): Contrast factor (1.0 keeps the image unchanged)
+
+    Returns:
+        numpy.ndarray: Enhanced float32 array
+    """
+    if factor == 1:
+        return rgb
+    mean = float(luminance(rgb).mean())
+    return np.clip(mean + factor * (rgb - mean), 0, FULL_SCALE)
+
+def adjust_sharpness(rgb, factor):
+    """
+    Sharpness enhancement against a smoothed copy (ImageEnhance.Sharpness).
+
+    Args:
+        rgb (numpy.ndarray): float32 array of shape (H, W, 3)
+        factor (float): Sharpness factor (1.0 keeps the image unchanged)
+
+    Returns:
+        numpy.ndarray: Enhanced float32 array
+    """
+    if factor == 1:
+        return rgb
+    smoothed = rgb.copy()
+    height, width = rgb.shape[:2]
+    if height > 2 and width > 2:
+        # PIL leaves the one-pixel border unfiltered
+        inner = np.zeros((height - 2, width - 2, rgb.shape[2]), dtype=np.float32)
+        for dy in range(3):
+            for dx in range(3):
+                inner += SMOOTH_KERNEL[dy, dx] * rgb[dy:dy + height - 2, dx:dx + width - 2]
+        smoothed[1:-1, 1:-1] = inner
+    return np.clip(smoothed + factor * (rgb - smoothed), 0, FULL_SCALE)
+
+def fluorescence_layer(array, transparency, enhance_factor=1.5, threshold=50, background_alpha=50):
+    """
+    Array version of enhance_fluorescence on the 16-bit scale.
+
+    Args:
+        array (numpy.ndarray): Fluorescence channel from read_channel
+        transparency (int): Alpha (0-255) for pixels above the threshold
+        enhance_factor (float): Contrast enhancement factor
+        threshold (int): Threshold in 8-bit units, compared on the 16-bit scale
+        background_alpha (int): Alpha (0-255) for background pixels
+
+    Returns:
+        tuple: (rgb, alpha) float32 arrays, alpha in [0, 1]
+    """
+    rgb = adjust_contrast(to_rgb16(array), enhance_factor)
+    foreground = (rgb > threshold * SCALE_8_TO_16).any(axis=2)
+    alpha = np.where(foreground, transparency / 255.0, background_alpha / 255.0).astype(np.float32)
+    return rgb, alpha
+
+def composite_over(base, layer, alpha):
+    """
+    Composite a layer over an opaque base (Image.alpha_composite).
+
+    Args:
+        base (numpy.ndarray): Opaque float32 RGB array
+        layer (numpy.ndarray): float32 RGB array of the layer
+        alpha (numpy.ndarray): Layer alpha in [0, 1] of shape (H, W)
+
+    Returns:
+        numpy.ndarray: Composited float32 RGB array
+    """
+    alpha = alpha[:, :, None]
+    return layer * alpha + base * (1.0 - alpha)
+
+def merge_channel_arrays(dic, rfp, gfp, brightness_factor=0.9, final_contrast_factor=1.5,
+                         transparency=110, sharpness_factor=5):
+    """
+    Merge DIC, RFP and GFP arrays without intermediate 8-bit conversion.
+
+    Args:
+        dic (numpy.ndarray): DIC channel from read_channel
+        rfp (numpy.ndarray): RFP channel from read_channel
+        gfp (numpy.ndarray): GFP channel from read_channel
+        brightness_factor (float): Final brightness adjustment factor
+        final_contrast_factor (float): Final contrast adjustment factor
+        transparency (int): Alpha (0-255) of fluorescent areas
+        sharpness_factor (float): DIC sharpness factor
+
+    Returns:
+        numpy.ndarray: float32 RGB array on the 16-bit scale
+    """
+    combined = adjust_sharpness(to_rgb16(dic), sharpness_factor)
+    for channel in (rfp, gfp):
+        layer, alpha = fluorescence_layer(channel, transparency)
+        combined = composite_over(combined, layer, alpha)
+        del layer, alpha
+
+    combined = adjust_contrast(combined, final_contrast_factor)
+    return np.clip(combined * brightness_factor, 0, FULL_SCALE)
+
+def quantize_to_uint8(rgb):
+    """
+    Quantize a 16-bit scale float array to an 8-bit RGBA array.
+
+    Args:
+        rgb (numpy.ndarray): float32 RGB array on the 16-bit scale
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (H, W, 4) with an opaque alpha
+    """
+    rgba = np.empty(rgb.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = np.rint(rgb / SCALE_8_TO_16)
+    rgba[..., 3] = 255
+    return rgba
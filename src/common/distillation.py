@@ -0,0 +1,342 @@
+import argparse
+import gc
+import json
+import os
+import subprocess
+import time
+
+import numpy as np
+import yaml
+
+from common.autotune import autotune_train_settings
+from common.evaluation import box_iou, clear_saved_predictions, evaluate_fold, xywh_to_xyxy
+from common.streaming import iter_files
+from common.training import load_checkpoint, train_fold
+
+STUDENT_CONFIGS = {
+    'yolov9-t': 'models/detect/yolov9-t.yaml',
+    'yolov9-s': 'models/detect/yolov9-s.yaml',
+    'yolov9-m': 'models/detect/yolov9-m.yaml',
+}
+
+def predict_with_teacher(teacher_weights, source, project, name, img_size=1024, conf_thres=0.5, iou_thres=0.7,
+                         device='0'):
+    """
+    Run detect_dual.py with a teacher checkpoint and keep only the label files.
+
+    Labels of an earlier run under the same name are removed first, since
+    --save-txt appends to existing label files.
+
+    Args:
+        teacher_weights (str): Teacher best.pt
+        source (str): Image folder
+        project (str): detect_dual.py --project
+        name (str): detect_dual.py --name
+        img_size (int): Inference size
+        conf_thres (float): Minimum confidence of a pseudo-label
+        iou_thres (float): NMS IoU threshold
+        device (str): CUDA device or "cpu"
+
+    Returns:
+        str: Folder of YOLO label files with confidences
+    """
+    cmd = [
+        'python', 'detect_dual.py',
+        '--weights', teacher_weights,
+        '--source', source,
+        '--imgsz', str(img_size),
+        '--conf-thres', str(conf_thres),
+        '--iou-thres', str(iou_thres),
+        '--device', device,
+        '--save-txt',
+        '--save-conf',
+        '--nosave',
+        '--project', project,
+        '--name', name,
+        '--exist-ok'
+    ]
+    clear_saved_predictions(os.path.join(project, name))
+    subprocess.run(cmd, check=True)
+    return os.path.join(project, name, 'labels')
+
+def _read_labels(path, with_conf):
+    if not os.path.exists(path):
+        return np.zeros((0, 6 if with_conf else 5), dtype=np.float32)
+    with open(path) as f:
+        rows = [line.split() for line in f if line.strip()]
+    return np.array(rows, dtype=np.float32).reshape(-1, 6 if with_conf else 5)
+
+def merge_teacher_labels(gt_path, teacher_path, output_path, iou_thres=0.5):
+    """
+    Combine ground truth with the teacher's extra detections for one image.
+
+    Every ground-truth box is kept. A teacher box is added when it overlaps no
+    ground-truth box of its class by more than ``iou_thres``, so cells the
+    annotators missed but the teacher finds are learned by the student.
+
+    Args:
+        gt_path (str): Ground-truth label file (may be missing for unlabeled images)
+        teacher_path (str): Teacher label file with confidences (may be missing)
+        output_path (str): Merged label file
+
+    Returns:
+        int: Number of teacher boxes added
+    """
+    gt = _read_labels(gt_path, with_conf=False)
+    teacher = _read_labels(teacher_path, with_conf=True)[:, :5]
+    if len(gt) and len(teacher):
+        iou = box_iou(xywh_to_xyxy(teacher[:, 1:5]), xywh_to_xyxy(gt[:, 1:5]))
+        iou[teacher[:, 0][:, None] != gt[:, 0][None, :]] = 0
+        teacher = teacher[iou.max(1) <= iou_thres]
+
+    with open(output_path, 'w') as f:
+        for cls, xc, yc, w, h in np.concatenate([gt, teacher]):
+            f.write(f"{int(cls)} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n")
+    return len(teacher)
+
+def build_distillation_fold(fold_path, teacher_labels, output_path, unlabeled_images=None,
+                            unlabeled_teacher_labels=None, iou_thres=0.5):
+    """
+    Write a fold whose training labels include the teacher's pseudo-labels.
+
+    Images are symlinked rather than copied. The validation set keeps the
+    original ground truth so student and teacher are scored on the same labels.
+
+    Args:
+        fold_path (str): Fold directory (e.g. split_for_yolo_detection/fold_0)
+        teacher_labels (str): Teacher predictions on the fold's train/images
+        output_path (str): Distillation fold directory
+        unlabeled_images (str): Optional folder of extra images without annotations
+        unlabeled_teacher_labels (str): Teacher predictions on unlabeled_images
+        iou_thres (float): IoU above which a teacher box duplicates a ground-truth box
+
+    Returns:
+        dict: Number of training images and of pseudo-labels added
+    """
+    sources = [(os.path.join(fold_path, 'train', 'images'), os.path.join(fold_path, 'train', 'labels'),
+                teacher_labels, 'train')]
+    if unlabeled_images:
+        sources.append((unlabeled_images, None, unlabeled_teacher_labels, 'unlabeled'))
+
+    train_list = []
+    added = 0
+    for images_dir, gt_dir, teacher_dir, set_name in sources:
+        set_images = os.path.join(output_path, set_name, 'images')
+        set_labels = os.path.join(output_path, set_name, 'labels')
+        os.makedirs(set_labels, exist_ok=True)
+        if not os.path.lexists(set_images):
+            os.symlink(os.path.abspath(images_dir), set_images)
+
+        for image_path in sorted(iter_files(images_dir, ('.jpg', '.png', '.tif'))):
+            stem = os.path.splitext(os.path.basename(image_path))[0]
+            gt_path = os.path.join(gt_dir, stem + '.txt') if gt_dir else ''
+            added += merge_teacher_labels(gt_path, os.path.join(teacher_dir, stem + '.txt'),
+                                          os.path.join(set_labels, stem + '.txt'), iou_thres)
+            # Absolute, since the loader resolves "./" entries against the list's own folder
+            train_list.append(os.path.abspath(os.path.join(set_images, os.path.basename(image_path))))
+
+    with open(os.path.join(output_path, 'train.txt'), 'w') as f:
+        f.write('\n'.join(train_list) + '\n')
+
+    with open(os.path.join(fold_path, 'custom.yaml')) as f:
+        data = yaml.safe_load(f)
+    data.update(path=os.path.abspath(output_path), train='train.txt',
+                val=os.path.abspath(os.path.join(fold_path, 'valid.txt')))
+    with open(os.path.join(output_path, 'custom.yaml'), 'w') as f:
+        yaml.dump(data, f)
+
+    print(f"Distillation fold {output_path}: {len(train_list)} training images, {added} pseudo-labels added")
+    return {"images": len(train_list), "pseudo_labels": added}
+
+def benchmark_checkpoint(weights_path, img_size=1024, batch=1, device='0', yolov9_dir='.', n_warmup=3, n_runs=20):
+    """
+    Parameter count and forward latency of a checkpoint's model.
+
+    Args:
+        weights_path (str): best.pt
+        img_size (int): Input size
+        batch (int): Images per forward pass
+        device (str): CUDA device or "cpu"
+        yolov9_dir (str): yolov9 checkout providing the pickled model classes
+        n_warmup (int): Untimed passes
+        n_runs (int): Timed passes
+
+    Returns:
+        dict: params_m, latency_ms (median per batch) and images_per_second
+    """
+    import torch
+
+    checkpoint = load_checkpoint(weights_path, yolov9_dir)
+    cuda = device != 'cpu' and torch.cuda.is_available()
+    torch_device = torch.device(f'cuda:{device}' if cuda else 'cpu')
+    model = checkpoint['ema'] if checkpoint.get('ema') is not None else checkpoint['model']
+    model = model.float().eval().to(torch_device)
+    if cuda:
+        model.half()
+    inputs = torch.zeros(batch, 3, img_size, img_size, device=torch_device, dtype=torch.half if cuda else torch.float)
+
+    latencies = []
+    with torch.inference_mode():
+        for step in range(n_warmup + n_runs):
+            start = time.perf_counter()
+            model(inputs)
+            if cuda:
+                torch.cuda.synchronize(torch_device)
+            if step >= n_warmup:
+                latencies.append((time.perf_counter() - start) * 1000)
+    latency = float(np.median(latencies))
+    return {"params_m": sum(p.numel() for p in model.parameters()) / 1e6, "latency_ms": latency,
+            "images_per_second": batch * 1000 / latency, "device": str(torch_device)}
+
+def compare_teacher_student(teacher, student, output_path=None):
+    """
+    Speed/accuracy table of a teacher and its student for one fold.
+
+    Args:
+        teacher (dict): map50, map50_95 and benchmark_checkpoint results of the teacher
+        student (dict): The same for the student
+        output_path (str): Optional JSON path for the table
+
+    Returns:
+        dict: teacher, student, and the student's accuracy delta and speedup
+    """
+    report = {"teacher": teacher, "student": student,
+              "delta_map50": student["map50"] - teacher["map50"],
+              "delta_map50_95": student["map50_95"] - teacher["map50_95"],
+              "speedup": student["images_per_second"] / teacher["images_per_second"]}
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with open(output_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'model':<8} {'params (M)':>10} {'mAP50':>7} {'mAP50-95':>9} {'ms/batch':>9} {'img/s':>7}")
+    for label in ("teacher", "student"):
+        entry = report[label]
+        print(f"{label:<8} {entry['params_m']:>10.1f} {entry['map50']:>7.4f} {entry['map50_95']:>9.4f} "
+              f"{entry['latency_ms']:>9.1f} {entry['images_per_second']:>7.1f}")
+    print(f"Student: {report['delta_map50_95']:+.4f} mAP50-95 at {report['speedup']:.1f}x the throughput")
+    return report
+
+def _free_gpu_memory():
+    import torch
+
+    torch.cuda.empty_cache()
+    gc.collect()
+
+def distill_fold(fold, student, class_names, teacher_project, teacher_metrics, img_size=1024, autotune=False):
+    """
+    Train a smaller student on a fold with the finetuned fold model as teacher.
+
+    The teacher's confident detections on the training images are added to the
+    ground truth in split_for_distillation/fold_k, and the student is validated
+    on the unchanged validation set. Runs from the yolov9 checkout.
+
+    Args:
+        fold (int): Fold number
+        student (str): Key of STUDENT_CONFIGS (e.g. "yolov9-t")
+        class_names (tuple): Class names in label index order
+        teacher_project (str): train_dual.py --project of the teacher (e.g. "Yolov9_finetunedmodel")
+        teacher_metrics (dict): evaluate_fold results of the teacher
+        img_size (int): Training and inference size
+        autotune (bool): Probe batch size and workers for the student instead of the defaults
+
+    Returns:
+        dict: Speed/accuracy comparison from compare_teacher_student
+    """
+    fold_path = f'./split_for_yolo_detection/fold_{fold}'
+    distill_path = f'./split_for_distillation/fold_{fold}'
+    teacher_weights = f'./{teacher_project}/test_fold_{fold}/weights/best.pt'
+    teacher_labels = predict_with_teacher(teacher_weights, f'{fold_path}/train/images', 'runs/distill',
+                                          f'teacher_fold_{fold}', img_size=img_size)
+    build_distillation_fold(fold_path, teacher_labels, distill_path)
+
+    settings = {'batch': 8, 'workers': 0, 'device': '0'}
+    if autotune:
+        settings = autotune_train_settings(STUDENT_CONFIGS[student], img_size, f'{distill_path}/train.txt',
+                                           nc=len(class_names))
+
+    name = f'{student}_fold_{fold}'
+    cmd = [
+        'python', 'train_dual.py',
+        '--workers', str(settings['workers']),
+        '--device', settings['device'],
+        '--batch', str(settings['batch']),
+        '--data', f'{distill_path}/custom.yaml',
+        '--img', str(img_size),
+        '--cfg', STUDENT_CONFIGS[student],
+        '--weights', '',
+        '--name', name,
+        '--project', 'Yolov9_distilledmodel',
+        '--hyp', 'hyp.scratch-high.yaml',
+        '--min-items', '0',
+        '--epochs', '100',
+        '--close-mosaic', '15',
+        '--exist-ok'
+    ]
+    train_fold(cmd, 'Yolov9_distilledmodel', name, fold)
+    _free_gpu_memory()
+
+    student_weights = f'./Yolov9_distilledmodel/{name}/weights/best.pt'
+    cmd = [
+        'python', 'val_dual.py',
+        '--data', f'{fold_path}/custom.yaml',
+        '--img', str(img_size),
+        '--batch', '4',
+        '--conf', '0.001',
+        '--iou', '0.7',
+        '--device', '0',
+        '--weights', student_weights,
+        '--save-txt',
+        '--save-conf',
+        '--exist-ok',
+        '--name', name
+    ]
+    # val_dual.py appends to existing label files
+    clear_saved_predictions(f'runs/val/{name}')
+    subprocess.run(cmd, check=True)
+    student_metrics = evaluate_fold(fold_path, f'runs/val/{name}', class_names)
+
+    teacher = benchmark_checkpoint(teacher_weights, img_size=img_size)
+    teacher.update(map50=teacher_metrics['overall']['map50'], map50_95=teacher_metrics['overall']['map50_95'])
+    student_result = benchmark_checkpoint(student_weights, img_size=img_size)
+    student_result.update(map50=student_metrics['overall']['map50'],
+                          map50_95=student_metrics['overall']['map50_95'])
+    _free_gpu_memory()
+    return compare_teacher_student(teacher, student_result, f'runs/distill/{name}.json')
+
+def record_distillation(store, experiment, student, task, mode, fold, report):
+    """
+    Record the teacher and student rows of a distill_fold report in the results store.
+
+    The teacher goes under ``experiment`` and the student under
+    ``<experiment>-distill-<student>``.
+
+    Args:
+        store (ResultsStore): Results store
+        experiment (str): Experiment of the teacher
+        student (str): Key of STUDENT_CONFIGS
+        task (str): Task name ("SC", "DC" or "ALL")
+        mode (str): Training mode (e.g. "finetune")
+        fold (int): Fold number
+        report (dict): Output of distill_fold
+    """
+    experiments = {'teacher': experiment, 'student': f'{experiment}-distill-{student}'}
+    for role, name in experiments.items():
+        metrics = {key: report[role][key]
+                   for key in ('map50', 'map50_95', 'params_m', 'latency_ms', 'images_per_second')}
+        store.record_fold(name, task, mode, fold, metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build pseudo-labelled folds for student distillation")
+    parser.add_argument("fold", help="Fold directory (e.g. split_for_yolo_detection/fold_0)")
+    parser.add_argument("teacher_labels", help="Teacher detect_dual.py labels on the fold's train/images")
+    parser.add_argument("output", help="Distillation fold directory")
+    parser.add_argument("--unlabeled-images")
+    parser.add_argument("--unlabeled-teacher-labels")
+    parser.add_argument("--iou", type=float, default=0.5)
+    args = parser.parse_args()
+    build_distillation_fold(args.fold, args.teacher_labels, args.output, args.unlabeled_images,
+                            args.unlabeled_teacher_labels, args.iou)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from common.preprocess import extract_device_id
+from common.streaming import iter_files
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+CONF_THRESHOLDS = np.linspace(0, 1, 101)
+
+# np.trapz was renamed in NumPy 2.0
+trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+class DetectionSet:
+    """
+    Ground-truth and predicted boxes of one evaluation set as flat arrays.
+
+    Boxes are normalized xyxy. ``gt_image``/``pred_image`` index into
+    ``names``, the image base names.
+    """
+
+    def __init__(self, names, gt_image, gt_cls, gt_boxes, pred_image, pred_cls, pred_boxes, pred_conf):
+        self.names = names
+        self.gt_image = gt_image
+        self.gt_cls = gt_cls
+        self.gt_boxes = gt_boxes
+        self.pred_image = pred_image
+        self.pred_cls = pred_cls
+        self.pred_boxes = pred_boxes
+        self.pred_conf = pred_conf
+
+    def subset(self, image_mask):
+        """
+        Restrict the set to the images selected by a boolean mask.
+
+        Args:
+            image_mask (numpy.ndarray): Boolean mask over names
+
+        Returns:
+            DetectionSet: Set with the same image indexing
+        """
+        gt = image_mask[self.gt_image]
+        pred = image_mask[self.pred_image]
+        return DetectionSet(self.names, self.gt_image[gt], self.gt_cls[gt], self.gt_boxes[gt],
+                            self.pred_image[pred], self.pred_cls[pred], self.pred_boxes[pred],
+                            self.pred_conf[pred])
+
+def xywh_to_xyxy(boxes):
+    xy, half = boxes[:, :2], boxes[:, 2:4] / 2
+    return np.concatenate([xy - half, xy + half], axis=1)
+
+def read_label_folder(folder, names, with_conf):
+    """
+    Read YOLO txt files for the given image names into flat arrays.
+
+    Args:
+        folder (str): Folder containing <name>.txt files
+        names (list): Image base names, defining the image index
+        with_conf (bool): Whether lines carry a trailing confidence (--save-conf)
+
+    Returns:
+        tuple: (image_index, classes, xyxy_boxes, confidences)
+    """
+    width = 6 if with_conf else 5
+    indices, chunks = [], []
+    for i, name in enumerate(names):
+        path = os.path.join(folder, name + '.txt')
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            values = np.fromstring(f.read(), dtype=np.float64, sep=' ')
+        if values.size % width:
+            print(f"Skipping malformed label file {path}")
+            continue
+        chunks.append(values.reshape(-1, width))
+        indices.append(np.full(values.size // width, i, dtype=np.int64))
+
+    rows = np.concatenate(chunks) if chunks else np.zeros((0, width))
+    image_index = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+    confidences = rows[:, 5] if with_conf else np.ones(len(rows))
+    return image_index, rows[:, 0].astype(np.int64), xywh_to_xyxy(rows[:, 1:5]), confidences
+
+def load_detection_set(gt_labels_dir, pred_labels_dir):
+    """
+    Load a fold's ground truth and saved predictions once.
+
+    Args:
+        gt_labels_dir (str): Ground-truth label folder (e.g. fold_0/valid/labels)
+        pred_labels_dir (str): Prediction folder written by val_dual.py --save-txt --save-conf
+
+    Returns:
+        DetectionSet: Loaded boxes
+    """
+    names = sorted(os.path.splitext(os.path.basename(p))[0] for p in iter_files(gt_labels_dir, ('.txt',)))
+    gt = read_label_folder(gt_labels_dir, names, with_conf=False)
+    pred = read_label_folder(pred_labels_dir, names, with_conf=True)
+    return DetectionSet(names, *gt[:3], *pred)
+
+def box_iou(boxes1, boxes2):
+    """
+    Pairwise IoU of two sets of xyxy boxes.
+
+    Returns:
+        numpy.ndarray: IoU matrix of shape (len(boxes1), len(boxes2))
+    """
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area1 = (boxes1[:, 2:] - boxes1[:, :2]).prod(axis=1)
+    area2 = (boxes2[:, 2:] - boxes2[:, :2]).prod(axis=1)
+    return inter / (area1[:, None] + area2[None, :] - inter + 1e-16)
+
+def match_predictions(detections, iou_thresholds=IOU_THRESHOLDS):
+    """
+    Mark each prediction as a true positive at each IoU threshold.
+
+    Matching follows val_dual.py: same-class pairs above the threshold are
+    taken in decreasing IoU order, each label and prediction used at most once.
+
+    Args:
+        detections (DetectionSet): Loaded boxes
+        iou_thresholds (numpy.ndarray): IoU thresholds
+
+    Returns:
+        numpy.ndarray: Boolean array of shape (n_predictions, n_thresholds)
+    """
+    iou_thresholds = np.asarray(iou_thresholds)
+    correct = np.zeros((len(detections.pred_image), len(iou_thresholds)), dtype=bool)
+    gt_order = np.argsort(detections.gt_image, kind='stable')
+    pred_order = np.argsort(detections.pred_image, kind='stable')
+    n_images = len(detections.names)
+    gt_bounds = np.searchsorted(detections.gt_image[gt_order], np.arange(n_images + 1))
+    pred_bounds = np.searchsorted(detections.pred_image[pred_order], np.arange(n_images + 1))
+
+    for i in range(n_images):
+        gt = gt_order[gt_bounds[i]:gt_bounds[i + 1]]
+        pred = pred_order[pred_bounds[i]:pred_bounds[i + 1]]
+        if len(gt) == 0 or len(pred) == 0:
+            continue
+        iou = box_iou(detections.gt_boxes[gt], detections.pred_boxes[pred])
+        iou[detections.gt_cls[gt][:, None] != detections.pred_cls[pred][None, :]] = 0
+
+        for t, threshold in enumerate(iou_thresholds):
+            label_idx, pred_idx = np.nonzero(iou >= threshold)
+            if len(label_idx) == 0:
+                continue
+            order = np.argsort(-iou[label_idx, pred_idx], kind='stable')
+            label_idx, pred_idx = label_idx[order], pred_idx[order]
+            _, keep = np.unique(pred_idx, return_index=True)
+            label_idx, pred_idx = label_idx[keep], pred_idx[keep]
+            _, keep = np.unique(label_idx, return_index=True)
+            correct[pred[pred_idx[keep]], t] = True
+    return correct
+
+def compute_ap(recall, precision):
+    """
+    Average precision with COCO 101-point interpolation.
+
+    Args:
+        recall (numpy.ndarray): Recall curve (increasing)
+        precision (numpy.ndarray): Precision curve
+
+    Returns:
+        float: Average precision
+    """
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    return float(trapezoid(np.interp(x, mrec, mpre), x))
+
+def evaluate_detections(detections, correct, class_ids, conf_thresholds=CONF_THRESHOLDS):
+    """
+    Compute AP and threshold sweeps from matched predictions.
+
+    Sorting by confidence once gives the full precision/recall curve, so every
+    confidence threshold is read off the same cumulative sums.
+
+    Args:
+        detections (DetectionSet): Loaded boxes
+        correct (numpy.ndarray): Output of match_predictions
+        class_ids (list): Class IDs to report
+        conf_thresholds (numpy.ndarray): Confidence thresholds for the sweep
+
+    Returns:
+        dict: Per-class AP per IoU threshold, mAP50, mAP50-95 and, at the
+            first IoU threshold, precision/recall/F1 for every confidence threshold
+    """
+    order = np.argsort(-detections.pred_conf, kind='stable')
+    conf, pred_cls, correct = detections.pred_conf[order], detections.pred_cls[order], correct[order]
+    n_iou = correct.shape[1]
+
+    ap = np.zeros((len(class_ids), n_iou))
+    precision = np.zeros((len(class_ids), len(conf_thresholds)))
+    recall = np.zeros((len(class_ids), len(conf_thresholds)))
+    n_labels = np.zeros(len(class_ids), dtype=np.int64)
+
+    for k, class_id in enumerate(class_ids):
+        selected = pred_cls == class_id
+        n_labels[k] = int((detections.gt_cls == class_id).sum())
+        if not selected.any() or n_labels[k] == 0:
+            continue
+        tp = np.cumsum(correct[selected], axis=0)
+        fp = np.cumsum(~correct[selected], axis=0)
+        class_recall = tp / (n_labels[k] + 1e-16)
+        class_precision = tp / (tp + fp)
+
+        # Curves at the sweep thresholds (confidence decreases along the arrays)
+        recall[k] = np.interp(-conf_thresholds, -conf[selected], class_recall[:, 0], left=0)
+        precision[k] = np.interp(-conf_thresholds, -conf[selected], class_precision[:, 0], left=1)
+        for t in range(n_iou):
+            ap[k, t] = compute_ap(class_recall[:, t], class_precision[:, t])
+
+    f1 = 2 * precision * recall / (precision + recall + 1e-16)
+    present = n_labels > 0
+    return {
+        "classes": list(class_ids),
+        "n_labels": n_labels.tolist(),
+        "n_predictions": int(len(conf)),
+        "ap": ap.tolist(),
+        "map50": float(ap[present, 0].mean()) if present.any() else 0.0,
+        "map50_95": float(ap[present].mean()) if present.any() else 0.0,
+        "conf_thresholds": np.asarray(conf_thresholds).tolist(),
+        "precision": precision.tolist(),
+        "recall": recall.tolist(),
+        "f1": f1.tolist(),
+    }
+
+def evaluate(detections, class_ids, iou_thresholds=IOU_THRESHOLDS, conf_thresholds=CONF_THRESHOLDS,
+             per_device=True):
+    """
+    Evaluate a detection set overall and per device.
+
+    Args:
+        detections (DetectionSet): Loaded boxes
+        class_ids (list): Class IDs to report
+        iou_thresholds (numpy.ndarray): IoU thresholds for AP
+        conf_thresholds (numpy.ndarray): Confidence thresholds for the sweep
+        per_device (bool): Also report a breakdown per device ID
+
+    Returns:
+        dict: Evaluation results
+    """
+    correct = match_predictions(detections, iou_thresholds)
+    results = {"iou_thresholds": np.asarray(iou_thresholds).tolist(),
+               "overall": evaluate_detections(detections, correct, class_ids, conf_thresholds)}
+
+    if per_device:
+        devices = np.array([extract_device_id(name + '.txt') or 'unknown' for name in detections.names])
+        results["per_device"] = {}
+        for device in np.unique(devices):
+            image_mask = devices == device
+            subset = detections.subset(image_mask)
+            results["per_device"][str(device)] = evaluate_detections(
+                subset, correct[image_mask[detections.pred_image]], class_ids, conf_thresholds)
+    return results
+
+def clear_saved_predictions(run_dir):
+    """
+    Remove the label files of an earlier val_dual.py run before rerunning it.
+
+    val_dual.py --save-txt appends to existing label files, so a rerun under
+    the same --name with --exist-ok would otherwise duplicate every prediction.
+
+    Args:
+        run_dir (str): val_dual.py run directory (e.g. runs/val/test_fold_0)
+    """
+    shutil.rmtree(os.path.join(run_dir, 'labels'), ignore_errors=True)
+
+def evaluate_fold(fold_path, run_dir, class_names, output_path=None):
+    """
+    Evaluate a fold's validation predictions saved by val_dual.py.
+
+    Args:
+        fold_path (str): Fold directory (e.g. split_for_yolo_detection/fold_0)
+        run_dir (str): val_dual.py run directory (e.g. runs/val/test_fold_0)
+        class_names (tuple): Class names in class ID order
+        output_path (str): Where to write the JSON results (default: <run_dir>/metrics.json)
+
+    Returns:
+        dict: Evaluation results
+    """
+    detections = load_detection_set(os.path.join(fold_path, 'valid', 'labels'), os.path.join(run_dir, 'labels'))
+    results = evaluate(detections, list(range(len(class_names))))
+    results["class_names"] = list(class_names)
+
+    output_path = output_path or os.path.join(run_dir, 'metrics.json')
+    with open(output_path, 'w') as f:
+        json.dump(results, f)
+
+    overall = results["overall"]
+    print(f"mAP50: {overall['map50']:.4f}, mAP50-95: {overall['map50_95']:.4f} ({output_path})")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate saved val_dual.py predictions")
+    parser.add_argument("fold", help="Fold directory (e.g. split_for_yolo_detection/fold_0)")
+    parser.add_argument("run", help="val_dual.py run directory (e.g. runs/val/test_fold_0)")
+    parser.add_argument("--class-names", nargs="+", default=["S.C"])
+    parser.add_argument("--output", help="Output JSON path")
+    args = parser.parse_args()
+    evaluate_fold(args.fold, args.run, args.class_names, args.output)
+
+if __name__ == "__main__":
+    main()
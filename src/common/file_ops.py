@@ -0,0 +1,70 @@
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Per-file latency dominates on NFS/SMB shares, so several requests are kept
+# in flight; local disks are not slowed down by a small pool either.
+DEFAULT_IO_WORKERS = 16
+
+def run_bounded(func, items, max_workers=DEFAULT_IO_WORKERS, max_pending=None):
+    """
+    Apply a blocking I/O function to many argument tuples concurrently.
+
+    At most ``max_pending`` calls are submitted at a time, so a lazy ``items``
+    iterator is never materialized. The first exception raised by a call is
+    re-raised after the pool shuts down.
+
+    Args:
+        func (callable): Function to call
+        items (iterable): Argument tuples for each call
+        max_workers (int): Number of worker threads
+        max_pending (int): Maximum number of submitted, unfinished calls
+            (default: 4 per worker)
+
+    Returns:
+        int: Number of calls made
+    """
+    max_pending = max_pending or max_workers * 4
+    count = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for args in items:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(func, *args))
+            count += 1
+
+        for future in wait(pending).done:
+            future.result()
+
+    return count
+
+def copy_files(pairs, max_workers=DEFAULT_IO_WORKERS):
+    """
+    Copy files concurrently.
+
+    Args:
+        pairs (iterable): (source_path, destination_path) tuples
+        max_workers (int): Number of concurrent copies
+
+    Returns:
+        int: Number of files copied
+    """
+    return run_bounded(shutil.copy, pairs, max_workers=max_workers)
+
+def list_dirs(folders, max_workers=DEFAULT_IO_WORKERS):
+    """
+    List several folders concurrently.
+
+    Args:
+        folders (list): Folder paths
+        max_workers (int): Number of concurrent listings
+
+    Returns:
+        dict: Folder path -> list of entry names
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(folders, executor.map(os.listdir, folders)))
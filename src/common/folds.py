@@ -0,0 +1,115 @@
+import argparse
+import hashlib
+import json
+import os
+
+FOLDS_FILE = 'folds.json'
+FOLD_METHODS = ('balanced', 'hash')
+
+def stable_hash(key, seed=42):
+    """
+    Seeded 64-bit hash of a string that is the same on every host and run.
+
+    Python's hash() is salted per process, so SHA-256 is used instead.
+
+    Args:
+        key (str): Key to hash (e.g. a file name or device ID)
+        seed (int): Seed mixed into the hash
+
+    Returns:
+        int: Hash value
+    """
+    return int.from_bytes(hashlib.sha256(f"{seed}:{key}".encode()).digest()[:8], 'big')
+
+def hashed_order(keys, seed=42):
+    """
+    Pseudo-random but reproducible order of keys.
+
+    The order depends only on the keys and the seed, not on the order the
+    filesystem lists them in, and adding keys never reorders existing ones
+    relative to each other.
+
+    Args:
+        keys (iterable): Strings to order
+        seed (int): Seed of the order
+
+    Returns:
+        list: Keys sorted by stable_hash (ties by key)
+    """
+    return sorted(keys, key=lambda key: (stable_hash(key, seed), key))
+
+def assign_folds(group_sizes, n_splits=5, seed=42, method='balanced', existing=None):
+    """
+    Assign groups to folds without touching any global random state.
+
+    "balanced" is GroupKFold's rule: groups are taken largest first (equal
+    sizes in hashed order) and each goes to the fold with the fewest samples.
+    "hash" puts a group in fold stable_hash(group) % n_splits, which never
+    depends on the other groups, at the cost of looser balance.
+
+    Args:
+        group_sizes (dict): Group ID -> number of samples
+        n_splits (int): Number of folds
+        seed (int): Seed of the hashed order
+        method (str): "balanced" or "hash"
+        existing (dict): Group ID -> fold assignments to keep; only the other
+            groups are assigned, balanced against the existing fold sizes
+
+    Returns:
+        dict: Group ID -> fold
+    """
+    if method not in FOLD_METHODS:
+        raise ValueError(f"Unknown fold assignment method: {method}")
+
+    assignment = dict(existing or {})
+    new_groups = [group for group in hashed_order(group_sizes, seed) if group not in assignment]
+    if method == 'hash':
+        assignment.update({group: stable_hash(group, seed) % n_splits for group in new_groups})
+        return assignment
+
+    fold_sizes = [0] * n_splits
+    for group, fold in assignment.items():
+        fold_sizes[fold] += group_sizes.get(group, 0)
+    for group in sorted(new_groups, key=lambda group: -group_sizes[group]):
+        fold = min(range(n_splits), key=lambda k: fold_sizes[k])
+        assignment[group] = fold
+        fold_sizes[fold] += group_sizes[group]
+    return assignment
+
+def write_folds(output_path, assignment, n_splits, seed, method):
+    """
+    Record fold assignments as folds.json in a split directory.
+    """
+    with open(os.path.join(output_path, FOLDS_FILE), 'w') as f:
+        json.dump({"n_splits": n_splits, "seed": seed, "method": method,
+                   "groups": dict(sorted(assignment.items()))}, f, indent=2)
+
+def read_folds(output_path):
+    """
+    Read folds.json from a split directory.
+
+    Returns:
+        dict: n_splits, seed, method and groups (group ID -> fold), or None without a record
+    """
+    path = os.path.join(output_path, FOLDS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    from common.preprocess import update_split_inter_device
+
+    parser = argparse.ArgumentParser(description="Add new labels to an existing fold split")
+    parser.add_argument("images_path", help="Image folder the split was built from (new images included)")
+    parser.add_argument("labels_path", help="Label folder (old and new labels)")
+    parser.add_argument("output_path", help="Split directory with folds.json")
+    parser.add_argument("--class-names", nargs="+", default=["S.C"])
+    parser.add_argument("--sidecar-extensions", nargs="*", default=[], help="e.g. .npy for stacked channels")
+    args = parser.parse_args()
+
+    update_split_inter_device(args.images_path, args.labels_path, args.output_path, tuple(args.class_names),
+                              sidecar_extensions=tuple(args.sidecar_extensions))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+
+from PIL import Image
+
+# step0 consumers read a file back to back, so a few decoded triplets are enough
+DEFAULT_CACHE_BYTES = 128 * 1024 ** 2
+
+def _bytes_per_pixel(mode):
+    bytes_per_band = 4 if mode in ('I', 'F', 'I;32') else 2 if mode.startswith('I;16') else 1
+    return Image.getmodebands(mode) * bytes_per_band
+
+def image_nbytes(image):
+    """
+    Estimate the memory held by a decoded image.
+
+    Args:
+        image (PIL.Image): Decoded image
+
+    Returns:
+        int: Approximate size of the pixel buffer in bytes
+    """
+    return image.width * image.height * _bytes_per_pixel(image.mode)
+
+def header_nbytes(path, mode=None):
+    """
+    Estimate the memory a file will take once decoded, from its header only.
+
+    Args:
+        path (str): Image file path
+        mode (str): Mode the file will be converted to; None keeps the file's mode
+
+    Returns:
+        int: Approximate size of the decoded pixel buffer in bytes
+    """
+    with Image.open(path) as image:
+        width, height = image.size
+        mode = mode or image.mode
+    return width * height * _bytes_per_pixel(mode)
+
+class ImageReader:
+    """
+    Lazy image reader with a byte-bounded LRU cache of decoded images.
+
+    Files are only decoded on first use. Every consumer that goes through the
+    same reader (merge, DIC conversion, thumbnails) shares one decode per file
+    and mode, and the cache never holds more than ``max_bytes`` of pixels.
+
+    Images returned by ``read`` are shared with the cache and must be treated
+    as read-only; every PIL enhancement used in step0 returns a new image.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        Args:
+            max_bytes (int): Upper bound on cached pixel data in bytes
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def read(self, path, mode=None, size=None):
+        """
+        Return the decoded image for ``path``, decoding it only if needed.
+
+        Args:
+            path (str): Image file path
+            mode (str): Target PIL mode (e.g. "RGBA"); None keeps the file's mode
+            size (tuple): Optional (width, height) the consumer needs; larger
+                images are decoded at a reduced scale no smaller than this
+
+        Returns:
+            PIL.Image: Decoded image
+        """
+        key = (path, mode, size)
+        image = self._get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        native = self._get((path, None, size))
+        if native is None:
+            full = self._get((path, None, None)) if size is not None else None
+            if full is not None:
+                # A full-size decode is already cached; reduce it instead of decoding again
+                self.hits += 1
+                native = self._reduce(full, size)
+            else:
+                self.misses += 1
+                native = self._decode(path, size)
+            self._put((path, None, size), native)
+        else:
+            self.hits += 1
+
+        if mode is None or native.mode == mode:
+            return native
+
+        image = native.convert(mode)
+        self._put(key, image)
+        return image
+
+    def clear(self):
+        """Drop every cached image."""
+        self._cache.clear()
+        self.current_bytes = 0
+
+    def _decode(self, path, size):
+        image = Image.open(path)
+        if size is not None:
+            # JPEG can decode directly at 1/2, 1/4 or 1/8 scale
+            image.draft(image.mode, size)
+        image.load()
+        return self._reduce(image, size) if size is not None else image
+
+    @staticmethod
+    def _reduce(image, size):
+        factor = min(image.width // size[0], image.height // size[1])
+        return image.reduce(factor) if factor >= 2 else image
+
+    def _get(self, key):
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+        return image
+
+    def _put(self, key, image):
+        nbytes = image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return
+
+        self._cache[key] = image
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self.current_bytes -= image_nbytes(evicted)
@@ -0,0 +1,241 @@
+import argparse
+import html
+import json
+import os
+
+import numpy as np
+
+from common.preprocess import CLASS_NAMES, extract_device_id
+from common.streaming import iter_files
+
+HIST_BINS = 20
+
+def load_label_arrays(folder):
+    """
+    Parse every YOLO label file in a folder into flat arrays.
+
+    Args:
+        folder (str): Folder containing label files
+
+    Returns:
+        tuple: (names, image_index, boxes) where names lists the label file
+            base names, image_index (N,) maps each box to its file and boxes
+            (N, 5) holds class, x_center, y_center, width, height
+    """
+    names = []
+    counts = []
+    chunks = []
+
+    for txt_file in sorted(iter_files(folder, ('.txt',))):
+        with open(txt_file, 'r') as file:
+            values = np.fromstring(file.read(), dtype=np.float32, sep=' ')
+        if values.size % 5:
+            print(f"Skipping malformed label file {txt_file}")
+            continue
+        names.append(os.path.splitext(os.path.basename(txt_file))[0])
+        counts.append(values.size // 5)
+        chunks.append(values)
+
+    boxes = (np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float32)).reshape(-1, 5)
+    image_index = np.repeat(np.arange(len(names), dtype=np.int64), counts)
+    return names, image_index, boxes
+
+def read_fold_assignment(split_path, names):
+    """
+    Map each label file to the fold in which it is a validation sample.
+
+    Args:
+        split_path (str): split_for_yolo_detection directory
+        names (list): Label file base names from load_label_arrays
+
+    Returns:
+        numpy.ndarray: Fold number per file, -1 where the file is in no fold
+    """
+    position = {name: i for i, name in enumerate(names)}
+    folds = np.full(len(names), -1, dtype=np.int64)
+
+    for fold_name in sorted(os.listdir(split_path)):
+        valid_list = os.path.join(split_path, fold_name, "valid.txt")
+        if not fold_name.startswith("fold_") or not os.path.exists(valid_list):
+            continue
+        fold = int(fold_name.split("_")[1])
+        with open(valid_list) as file_list:
+            for line in file_list:
+                i = position.get(os.path.splitext(os.path.basename(line.strip()))[0])
+                if i is not None:
+                    folds[i] = fold
+    return folds
+
+def _distribution(values):
+    if values.size == 0:
+        return {"count": 0}
+    histogram, edges = np.histogram(values, bins=HIST_BINS)
+    percentiles = np.percentile(values, [1, 5, 25, 50, 75, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "percentiles": dict(zip(["p1", "p5", "p25", "p50", "p75", "p95", "p99"], map(float, percentiles))),
+        "histogram": {"counts": histogram.tolist(), "edges": edges.tolist()},
+    }
+
+def _class_table(group_index, group_names, classes, n_classes, class_names):
+    table = np.bincount(group_index * n_classes + classes,
+                        minlength=len(group_names) * n_classes).reshape(len(group_names), n_classes)
+    return {
+        str(group): {class_names.get(c, str(c)): int(table[g, c]) for c in range(n_classes)}
+        for g, group in enumerate(group_names)
+    }
+
+def compute_label_stats(names, image_index, boxes, class_names=None, folds=None, image_size=None):
+    """
+    Compute dataset statistics over parsed label arrays.
+
+    Args:
+        names (list): Label file base names
+        image_index (numpy.ndarray): File index of each box
+        boxes (numpy.ndarray): (N, 5) class, x_center, y_center, width, height
+        class_names (dict): Mapping from class ID to class name (default: S.C/D.C/M.C)
+        folds (numpy.ndarray): Optional validation fold of each file
+        image_size (int): Optional image side in pixels to also report pixel sizes
+
+    Returns:
+        dict: JSON-serializable statistics
+    """
+    if class_names is None:
+        class_names = CLASS_NAMES
+    classes = boxes[:, 0].astype(np.int64)
+    x, y, w, h = boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4]
+    n_classes = max(int(classes.max()) + 1 if classes.size else 0, max(class_names) + 1)
+
+    # Box geometry
+    valid_size = (w > 0) & (h > 0)
+    geometry = {
+        "width": _distribution(w),
+        "height": _distribution(h),
+        "area": _distribution(w * h),
+        "aspect_ratio": _distribution(w[valid_size] / h[valid_size]),
+    }
+    if image_size:
+        geometry["width_px"] = _distribution(w * image_size)
+        geometry["height_px"] = _distribution(h * image_size)
+
+    # Boxes per image
+    density = np.bincount(image_index, minlength=len(names))
+
+    # Degenerate boxes: empty, out of the image or with an unknown class
+    x1, y1, x2, y2 = x - w / 2, y - h / 2, x + w / 2, y + h / 2
+    tolerance = 1e-3
+    degenerate = {
+        "non_positive_size": int((~valid_size).sum()),
+        "center_outside_image": int(((x < 0) | (x > 1) | (y < 0) | (y > 1)).sum()),
+        "extends_outside_image": int(((x1 < -tolerance) | (y1 < -tolerance) |
+                                      (x2 > 1 + tolerance) | (y2 > 1 + tolerance)).sum()),
+        "unknown_class": int((~np.isin(classes, list(class_names))).sum()),
+    }
+
+    # Exact duplicates within the same image
+    keys = np.column_stack([image_index, classes, np.round(boxes[:, 1:] * 1e6).astype(np.int64)])
+    _, first, duplicate_counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+    duplicate_images = sorted({names[image_index[i]] for i in first[duplicate_counts > 1]})
+
+    # Class balance per device and per validation fold
+    devices = [extract_device_id(name + ".txt") or "unknown" for name in names]
+    device_names, device_of_image = np.unique(np.array(devices), return_inverse=True)
+
+    stats = {
+        "n_images": len(names),
+        "n_boxes": int(boxes.shape[0]),
+        "class_counts": {class_names.get(c, str(c)): int(n)
+                         for c, n in enumerate(np.bincount(classes, minlength=n_classes))},
+        "geometry": geometry,
+        "boxes_per_image": dict(_distribution(density.astype(np.float64)), empty_images=int((density == 0).sum())),
+        "degenerate_boxes": degenerate,
+        "duplicate_boxes": {"count": int((duplicate_counts - 1).sum()), "images": duplicate_images},
+        "per_device": _class_table(device_of_image[image_index], device_names.tolist(), classes,
+                                   n_classes, class_names),
+    }
+    if folds is not None:
+        fold_names = np.unique(folds)
+        fold_of_box = np.searchsorted(fold_names, folds[image_index])
+        stats["per_fold_valid"] = _class_table(fold_of_box, fold_names.tolist(), classes, n_classes, class_names)
+    return stats
+
+def _html_table(rows, header):
+    cells = "".join(f"<th>{html.escape(str(h))}</th>" for h in header)
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(str(v))}</td>" for v in row) + "</tr>" for row in rows)
+    return f"<table><tr>{cells}</tr>{body}</table>"
+
+def write_report(stats, output_prefix):
+    """
+    Write statistics as <output_prefix>.json and a readable <output_prefix>.html.
+
+    Args:
+        stats (dict): Output of compute_label_stats
+        output_prefix (str): Output path without extension
+    """
+    os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+    with open(output_prefix + ".json", "w") as f:
+        json.dump(stats, f, indent=2)
+
+    sections = [
+        "<h1>Label QA report</h1>",
+        f"<p>{stats['n_images']} images, {stats['n_boxes']} boxes</p>",
+        "<h2>Class counts</h2>", _html_table(stats["class_counts"].items(), ["class", "count"]),
+        "<h2>Box geometry (normalized)</h2>",
+        _html_table([(name, d.get("mean"), d.get("std"), d.get("min"), d.get("max"))
+                     for name, d in stats["geometry"].items()], ["metric", "mean", "std", "min", "max"]),
+        "<h2>Boxes per image</h2>",
+        _html_table([(k, v) for k, v in stats["boxes_per_image"].items() if k != "histogram"], ["metric", "value"]),
+        "<h2>Degenerate boxes</h2>", _html_table(stats["degenerate_boxes"].items(), ["check", "count"]),
+        "<h2>Duplicate boxes</h2>", f"<p>{stats['duplicate_boxes']['count']} duplicates in "
+                                    f"{len(stats['duplicate_boxes']['images'])} images</p>",
+    ]
+    for key, title in (("per_device", "Per device"), ("per_fold_valid", "Per fold (validation)")):
+        if key in stats:
+            table = stats[key]
+            header = next(iter(table.values()), {}).keys()
+            sections += [f"<h2>{title}</h2>",
+                         _html_table([[group, *counts.values()] for group, counts in table.items()],
+                                     ["group", *header])]
+
+    with open(output_prefix + ".html", "w") as f:
+        f.write("<html><body>" + "\n".join(sections) + "</body></html>")
+    print(f"Label report written to {output_prefix}.json and {output_prefix}.html")
+
+def write_label_report(labels_folder, output_prefix, split_path=None, class_names=None, image_size=None):
+    """
+    Load a label folder, compute its statistics and write the report.
+
+    Args:
+        labels_folder (str): Folder containing label files
+        output_prefix (str): Output path without extension
+        split_path (str): Optional split_for_yolo_detection directory for per-fold balance
+        class_names (dict): Mapping from class ID to class name (default: S.C/D.C/M.C)
+        image_size (int): Optional image side in pixels
+
+    Returns:
+        dict: Computed statistics
+    """
+    names, image_index, boxes = load_label_arrays(labels_folder)
+    folds = read_fold_assignment(split_path, names) if split_path and os.path.isdir(split_path) else None
+    stats = compute_label_stats(names, image_index, boxes, class_names, folds, image_size)
+    write_report(stats, output_prefix)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Label statistics and dataset QA report")
+    parser.add_argument("labels", help="Folder containing YOLO label files")
+    parser.add_argument("--splits", help="split_for_yolo_detection directory for per-fold balance")
+    parser.add_argument("--output", default="label_report", help="Output path without extension")
+    parser.add_argument("--image-size", type=int, help="Image side in pixels")
+    parser.add_argument("--class-names", nargs="+", help="Class names in class ID order")
+    args = parser.parse_args()
+
+    class_names = dict(enumerate(args.class_names)) if args.class_names else None
+    write_label_report(args.labels, args.output, args.splits, class_names, args.image_size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from common.training import load_checkpoint
+
+DEFAULT_REGISTRY_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'model_registry'))
+
+def file_sha256(path, chunk_size=1024 ** 2):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def link_or_copy(source, destination):
+    """
+    Place ``source`` at ``destination`` without copying when possible.
+
+    A symlink is used when both paths are on the same device, otherwise the
+    file is copied. An existing destination is replaced; callers that must
+    keep a hand-placed file move it aside first (see ModelRegistry.resolve).
+
+    Args:
+        source (str): Existing file
+        destination (str): Path to create
+
+    Returns:
+        str: "symlink" or "copy"
+    """
+    destination_dir = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(destination_dir, exist_ok=True)
+    tmp_path = destination + '.tmp'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    if os.stat(source).st_dev == os.stat(destination_dir).st_dev:
+        os.symlink(os.path.abspath(source), tmp_path)
+        method = "symlink"
+    else:
+        shutil.copy2(source, tmp_path)
+        method = "copy"
+    os.replace(tmp_path, destination)
+    return method
+
+def strip_for_inference(checkpoint_path, output_path, yolov9_dir='.'):
+    """
+    Write an inference-only copy of a YOLOv9 checkpoint.
+
+    Mirrors utils.general.strip_optimizer: EMA weights replace the model,
+    optimizer state is dropped and the model is stored in half precision.
+
+    Args:
+        checkpoint_path (str): Training checkpoint
+        output_path (str): Path of the stripped copy
+        yolov9_dir (str): yolov9 checkout providing the pickled model classes
+    """
+    import torch
+
+    checkpoint = load_checkpoint(checkpoint_path, yolov9_dir)
+    if checkpoint.get('ema'):
+        checkpoint['model'] = checkpoint['ema']
+    for key in ('optimizer', 'best_fitness', 'ema', 'updates'):
+        checkpoint[key] = None
+    checkpoint['epoch'] = -1
+    checkpoint['model'].half()
+    for parameter in checkpoint['model'].parameters():
+        parameter.requires_grad = False
+    torch.save(checkpoint, output_path)
+
+class ModelRegistry:
+    """
+    Content-addressed local store of fold weights.
+
+    ``objects/<sha256>.pt`` holds each distinct checkpoint once, next to its
+    inference-only copy ``objects/<sha256>.infer.pt``. ``refs/<task>/fold_<k>.json``
+    points a task and fold at the object last published for it.
+    """
+
+    def __init__(self, root=DEFAULT_REGISTRY_PATH):
+        """
+        Args:
+            root (str): Registry directory
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def _ref_path(self, task, fold):
+        return os.path.join(self.root, 'refs', task, f'fold_{fold}.json')
+
+    def object_path(self, digest, inference=False):
+        return os.path.join(self.objects_dir, digest + ('.infer.pt' if inference else '.pt'))
+
+    def publish(self, weights_path, task, fold, yolov9_dir='.'):
+        """
+        Add a checkpoint to the registry and point <task>/fold_<k> at it.
+
+        Args:
+            weights_path (str): Checkpoint to publish (e.g. .../weights/best.pt)
+            task (str): Task name ("SC" or "DC")
+            fold (int): Fold number
+            yolov9_dir (str): yolov9 checkout providing the pickled model classes
+
+        Returns:
+            str: SHA-256 of the checkpoint
+        """
+        digest = file_sha256(weights_path)
+        full_path = self.object_path(digest)
+        if not os.path.exists(full_path):
+            # A real copy: train_dual.py rewrites best.pt in place, which would
+            # change a linked object under its hash
+            shutil.copy2(weights_path, full_path + '.tmp')
+            os.replace(full_path + '.tmp', full_path)
+        inference_path = self.object_path(digest, inference=True)
+        if not os.path.exists(inference_path):
+            strip_for_inference(full_path, inference_path + '.tmp', yolov9_dir)
+            os.replace(inference_path + '.tmp', inference_path)
+
+        ref_path = self._ref_path(task, fold)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        with open(ref_path, 'w') as f:
+            json.dump({"sha256": digest, "source": os.path.abspath(weights_path),
+                       "published_at": time.strftime('%Y-%m-%d %H:%M:%S')}, f, indent=2)
+        print(f"Published {weights_path} as {task}/fold_{fold} ({digest[:12]})")
+        return digest
+
+    def lookup(self, task, fold):
+        """
+        Return the SHA-256 published for a task and fold, or None.
+        """
+        ref_path = self._ref_path(task, fold)
+        if not os.path.exists(ref_path):
+            return None
+        with open(ref_path) as f:
+            return json.load(f)["sha256"]
+
+    def resolve(self, task, fold, destination, inference=False):
+        """
+        Make the published weights of a task and fold available at a path.
+
+        A regular file already at the destination is kept when it has the
+        published hash. Otherwise (e.g. a best.pt copied there by hand) it is
+        renamed to ``<destination>.manual-<time>`` rather than overwritten.
+
+        Args:
+            task (str): Task name ("SC" or "DC")
+            fold (int): Fold number
+            destination (str): Path where the weights are expected
+            inference (bool): Resolve the stripped half-precision copy
+
+        Returns:
+            str: destination
+
+        Raises:
+            FileNotFoundError: If nothing was published for the task and fold
+        """
+        digest = self.lookup(task, fold)
+        if digest is None:
+            raise FileNotFoundError(f"No weights published for {task}/fold_{fold} in {self.root}")
+        source = self.object_path(digest, inference)
+        if os.path.realpath(destination) != os.path.realpath(source):
+            if os.path.isfile(destination) and not os.path.islink(destination):
+                if file_sha256(destination) == file_sha256(source):
+                    return destination
+                aside_path = f"{destination}.manual-{time.strftime('%Y%m%d-%H%M%S')}"
+                os.replace(destination, aside_path)
+                print(f"{destination} does not match {task}/fold_{fold} ({digest[:12]}), moved it to {aside_path}")
+            method = link_or_copy(source, destination)
+            print(f"Resolved {task}/fold_{fold} ({digest[:12]}) to {destination} by {method}")
+        return destination
+
+def resolve_weights(task, fold, destination, inference=False, registry_root=DEFAULT_REGISTRY_PATH):
+    """
+    Resolve fold weights from the registry, falling back to a manual copy.
+
+    Args:
+        task (str): Task name ("SC" or "DC")
+        fold (int): Fold number
+        destination (str): Path where the weights are expected
+        inference (bool): Resolve the stripped half-precision copy
+        registry_root (str): Registry directory
+
+    Returns:
+        str: destination
+    """
+    try:
+        return ModelRegistry(registry_root).resolve(task, fold, destination, inference)
+    except FileNotFoundError:
+        if os.path.exists(destination):
+            print(f"No registry entry for {task}/fold_{fold}, using {destination}")
+            return destination
+        raise
+
+def main():
+    parser = argparse.ArgumentParser(description="Local model registry for fold weights")
+    parser.add_argument("--root", default=DEFAULT_REGISTRY_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish = subparsers.add_parser("publish")
+    publish.add_argument("weights")
+    publish.add_argument("task")
+    publish.add_argument("fold", type=int)
+    publish.add_argument("--yolov9-dir", default=".")
+
+    resolve = subparsers.add_parser("resolve")
+    resolve.add_argument("task")
+    resolve.add_argument("fold", type=int)
+    resolve.add_argument("destination")
+    resolve.add_argument("--inference", action="store_true")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+    if args.command == "publish":
+        registry.publish(args.weights, args.task, args.fold, args.yolov9_dir)
+    else:
+        registry.resolve(args.task, args.fold, args.destination, args.inference)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import os
+import runpy
+import sys
+
+if __package__ in (None, ''):
+    # Launched as a script by train_fold; make the common package importable
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from common.channels import read_channel
+from common.streaming import iter_files, stream_stages
+
+CHANNEL_TYPES = ('DIC', 'RFP', 'GFP')
+
+# Fixed parameters of process_merged_images
+DEFAULT_MERGE = {"brightness_factor": 0.9, "final_contrast_factor": 1.5, "transparency": 110, "sharpness_factor": 5}
+
+def group_channel_files(images_folder):
+    """
+    Group <base>_DIC/RFP/GFP files of a folder by base name.
+
+    Args:
+        images_folder (str): Folder containing all channel images
+
+    Returns:
+        dict: Base name -> {"DIC": path, "RFP": path, "GFP": path}, complete triplets only
+    """
+    groups = {}
+    for image_path in iter_files(images_folder, ('.jpg', '.jpeg', '.png', '.tif')):
+        parts = os.path.basename(image_path).split('_')
+        image_type = parts[-1].split('.')[0]
+        if image_type in CHANNEL_TYPES:
+            groups.setdefault('_'.join(parts[:-1]), {})[image_type] = image_path
+
+    complete = {}
+    for base_name, paths in groups.items():
+        if len(paths) == len(CHANNEL_TYPES):
+            complete[base_name] = paths
+        else:
+            print(f"Missing images for {base_name}, skipping...")
+    return complete
+
+def build_channel_cache(images_folder, cache_folder, max_queue=4):
+    """
+    Decode every channel once into .npy files that can be memory-mapped.
+
+    Arrays keep the file's native dtype (16-bit TIFFs stay 16-bit) and drop
+    an alpha band, so the cache holds no more than the decoded source pixels.
+    Entries that already exist are skipped.
+
+    Args:
+        images_folder (str): Folder containing all channel images
+        cache_folder (str): Output folder for <base>_<channel>.npy files
+        max_queue (int): Number of decoded channels buffered before saving
+
+    Returns:
+        int: Number of cached samples
+    """
+    os.makedirs(cache_folder, exist_ok=True)
+    groups = group_channel_files(images_folder)
+
+    def pending():
+        for base_name, paths in groups.items():
+            for image_type, path in paths.items():
+                output_path = os.path.join(cache_folder, f'{base_name}_{image_type}.npy')
+                if not os.path.exists(output_path):
+                    yield path, output_path
+
+    def decode(item):
+        path, output_path = item
+        array = read_channel(path)
+        return (array[..., :3] if array.ndim == 3 else array), output_path
+
+    def save(decoded):
+        array, output_path = decoded
+        np.save(output_path + '.tmp.npy', np.ascontiguousarray(array))
+        os.replace(output_path + '.tmp.npy', output_path)
+
+    for _ in stream_stages(pending(), [decode, save], max_queue=max_queue):
+        pass
+    print(f"Cached channels of {len(groups)} samples in {cache_folder}")
+    return len(groups)
+
+def load_cached_channels(cache_folder, base_name):
+    """
+    Memory-map the cached DIC, RFP and GFP arrays of a sample.
+
+    Returns:
+        list: Arrays in DIC, RFP, GFP order, or None if the sample is not cached
+    """
+    paths = [os.path.join(cache_folder, f'{base_name}_{image_type}.npy') for image_type in CHANNEL_TYPES]
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return [np.load(path, mmap_mode='r') for path in paths]
+
+class MergeAugment:
+    """
+    Merge parameters drawn per sample from uniform ranges.
+
+    Each parameter is either a fixed value or a (low, high) range. Merging
+    goes through merge_transform, so with the default fixed values a sample
+    is the frame process_merged_images writes with the same native_depth.
+    """
+
+    def __init__(self, brightness_factor=0.9, final_contrast_factor=1.5, transparency=110, sharpness_factor=5,
+                 native_depth=False):
+        """
+        Args:
+            brightness_factor (float or tuple): Final brightness factor
+            final_contrast_factor (float or tuple): Final contrast factor
+            transparency (int or tuple): Alpha (0-255) of fluorescent areas
+            sharpness_factor (float or tuple): DIC sharpness factor
+            native_depth (bool): Merge on float arrays at the channels' bit depth instead of 8-bit PIL images
+        """
+        self.ranges = {"brightness_factor": brightness_factor, "final_contrast_factor": final_contrast_factor,
+                       "transparency": transparency, "sharpness_factor": sharpness_factor}
+        self.native_depth = native_depth
+
+    @classmethod
+    def around_defaults(cls, spread=0.15, center=None, native_depth=False):
+        """
+        Ranges of ±spread (relative) around the process_merged_images parameters.
+
+        Args:
+            spread (float): Relative half-width of each range
+            center (dict): Optional parameters replacing the defaults as range centers
+            native_depth (bool): See __init__
+        """
+        center = dict(DEFAULT_MERGE, **(center or {}))
+        return cls(**{name: (value * (1 - spread), value * (1 + spread)) for name, value in center.items()},
+                   native_depth=native_depth)
+
+    def sample(self, rng=np.random):
+        return {name: float(rng.uniform(*value)) if isinstance(value, (tuple, list)) else value
+                for name, value in self.ranges.items()}
+
+    def __call__(self, channels, rng=np.random):
+        """
+        Merge cached channels into an 8-bit BGR image, as cv2.imread returns it.
+
+        Args:
+            channels (list): DIC, RFP and GFP arrays
+            rng: Source of uniform samples (np.random is seeded per dataloader worker)
+
+        Returns:
+            numpy.ndarray: uint8 array of shape (H, W, 3)
+        """
+        # Imported here: common.transforms imports this module
+        from common.transforms import merge_transform, to_model_rgb
+
+        merged = merge_transform(*channels, native_depth=self.native_depth, **self.sample(rng))
+        return np.ascontiguousarray(to_model_rgb(merged)[:, :, ::-1])
+
+def install_online_merge(cache_folder, augment=None, fixed=None):
+    """
+    Make yolov9's LoadImagesAndLabels merge cached channels on the fly.
+
+    Every image whose file stem has cached channels is replaced by a fresh
+    merge, drawn from ``augment`` for training datasets and with fixed
+    parameters for validation. Other images load as before. Must be
+    called from inside the yolov9 checkout, before the dataloaders are built.
+
+    Args:
+        cache_folder (str): Folder written by build_channel_cache
+        augment (MergeAugment): Training merge parameters (default: fixed)
+        fixed (MergeAugment): Validation merge parameters (default: process_merged_images values)
+    """
+    import math
+
+    import cv2
+    from utils import dataloaders
+
+    fixed = fixed or MergeAugment()
+    augment = augment or fixed
+    original_load_image = dataloaders.LoadImagesAndLabels.load_image
+
+    def load_image(self, i):
+        if self.ims[i] is not None:
+            return original_load_image(self, i)
+        base_name = os.path.splitext(os.path.basename(self.im_files[i]))[0]
+        channels = load_cached_channels(cache_folder, base_name)
+        if channels is None:
+            return original_load_image(self, i)
+
+        im = (augment if self.augment else fixed)(channels)
+        h0, w0 = im.shape[:2]
+        r = self.img_size / max(h0, w0)
+        if r != 1:
+            interp = cv2.INTER_LINEAR if (self.augment or r > 1) else cv2.INTER_AREA
+            im = cv2.resize(im, (math.ceil(w0 * r), math.ceil(h0 * r)), interpolation=interp)
+        return im, (h0, w0), im.shape[:2]
+
+    dataloaders.LoadImagesAndLabels.load_image = load_image
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a yolov9 training script with channels merged on the fly",
+        usage="online_merge.py --cache-dir DIR [--randomize [SPREAD]] [--merge NAME=VALUE ...] [--native-depth] "
+              "train_dual.py [train_dual.py args]")
+    parser.add_argument("--cache-dir", required=True, help="Folder written by build_channel_cache")
+    parser.add_argument("--randomize", type=float, nargs="?", const=0.15, default=None,
+                        help="Randomize merge parameters by ± this fraction during training")
+    parser.add_argument("--merge", action="append", default=[], metavar="NAME=VALUE",
+                        help=f"Override a merge parameter ({', '.join(DEFAULT_MERGE)}); repeatable")
+    parser.add_argument("--native-depth", action="store_true",
+                        help="Merge at the channels' native bit depth, as step0 with ICD_NATIVE_DEPTH=1")
+    parser.add_argument("script", help="Training script in the current directory (e.g. train_dual.py)")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    center = {}
+    for item in args.merge:
+        name, _, value = item.partition('=')
+        if name not in DEFAULT_MERGE:
+            parser.error(f"unknown merge parameter: {name}")
+        center[name] = float(value)
+    fixed = MergeAugment(**dict(DEFAULT_MERGE, **center), native_depth=args.native_depth)
+    augment = (MergeAugment.around_defaults(args.randomize, center, args.native_depth) if args.randomize
+               else None)
+    sys.path.insert(0, os.getcwd())
+    install_online_merge(os.path.abspath(args.cache_dir), augment, fixed)
+
+    sys.argv = [args.script] + args.script_args
+    runpy.run_path(args.script, run_name='__main__')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+import os
+import yaml
+from PIL import Image
+
+from common.channels import read_channel
+from common.file_ops import DEFAULT_IO_WORKERS, copy_files, list_dirs
+from common.folds import FOLDS_FILE, assign_folds, hashed_order, read_folds, write_folds
+from common.image_reader import ImageReader, header_nbytes
+from common.streaming import iter_files, stream_stages
+from common.transforms import apply_fluorescence_alpha, dic_output_name, dic_transform, is_dic_file, merge_transform
+
+CLASS_NAMES = {0: 'S.C', 1: 'D.C', 2: 'M.C'}
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.tif')
+
+def check_file_names_consistency(folders, io_workers=DEFAULT_IO_WORKERS):
+    """
+    Check the consistency of filenames across different folders.
+
+    Args:
+        folders (list): List of folder paths to check
+        io_workers (int): Number of folders listed concurrently
+    """
+    file_names = {}
+    listings = list_dirs(folders, max_workers=io_workers)
+
+    for folder in folders:
+        file_names[folder] = set()
+        for filename in listings[folder]:
+            file_base_name, _ = os.path.splitext(filename)
+            file_base_name_without_suffix = (
+                file_base_name.replace('_DIC', '')
+                .replace('_RFP', '')
+                .replace('_GFP', '')
+            )
+            file_names[folder].add(file_base_name_without_suffix)
+
+    is_all_same = all(file_names[folders[0]] == file_names[folder] for folder in folders)
+
+    if is_all_same:
+        print("All folders have consistent filenames.")
+    else:
+        print("Different filenames found across folders.")
+        for i in range(len(folders)):
+            for j in range(i + 1, len(folders)):
+                different_files = file_names[folders[i]] ^ file_names[folders[j]]
+                if different_files:
+                    print(f"Different filenames between {folders[i]} and {folders[j]}: {different_files}")
+
+def copy_images_to_destination(source_folders, destination_folder, io_workers=DEFAULT_IO_WORKERS):
+    """
+    Copy images from multiple source folders to a destination folder.
+
+    Args:
+        source_folders (list): List of source folder paths
+        destination_folder (str): Destination folder path
+        io_workers (int): Number of concurrent copies
+    """
+    if not os.path.exists(destination_folder):
+        os.makedirs(destination_folder)
+
+    def copy_pairs():
+        for folder in source_folders:
+            for image_file in iter_files(folder, IMAGE_EXTENSIONS):
+                file_name = os.path.basename(image_file)
+                yield image_file, os.path.join(destination_folder, file_name)
+
+    copy_files(copy_pairs(), max_workers=io_workers)
+
+    print(f"All images have been copied to {destination_folder}")
+
+def copy_selected_images_to_destination(label_folder, source_folders, destination_folder,
+                                        io_workers=DEFAULT_IO_WORKERS):
+    """
+    Copy only the images that match with label files in labels_all folder.
+
+    Args:
+        label_folder (str): Path to labels folder containing selected labels
+        source_folders (list): List of source image folders (DIC, RFP, GFP)
+        destination_folder (str): Destination folder for selected images
+        io_workers (int): Number of concurrent copies
+    """
+    if not os.path.exists(destination_folder):
+        os.makedirs(destination_folder)
+
+    # Get base names from label files
+    label_files = {os.path.splitext(os.path.basename(f))[0]
+                   for f in iter_files(label_folder, ('.txt',))}
+
+    # Copy matching images from each source folder
+    def copy_pairs():
+        for folder in source_folders:
+            for image_file in iter_files(folder, IMAGE_EXTENSIONS):
+                file_name = os.path.basename(image_file)
+                base_name = os.path.splitext(file_name)[0]
+
+                # Remove suffixes
+                if base_name.endswith('_DIC'):
+                    base_name = base_name[:-4]
+                elif base_name.endswith('_RFP'):
+                    base_name = base_name[:-4]
+                elif base_name.endswith('_GFP'):
+                    base_name = base_name[:-4]
+
+                # Copy only if base name matches with labels
+                if base_name in label_files:
+                    yield image_file, os.path.join(destination_folder, file_name)
+
+    copy_files(copy_pairs(), max_workers=io_workers)
+
+    print(f"Selected images have been copied to {destination_folder}")
+
+def process_labels(source_folder, destination_folder, exclude_classes=(1, 2)):
+    """
+    Process and copy label files, excluding classes 1 and 2 by default.
+
+    Args:
+        source_folder (str): Source folder containing label files
+        destination_folder (str): Destination folder for processed labels
+        exclude_classes (tuple): Class IDs to drop (empty keeps every class)
+    """
+    if not os.path.exists(destination_folder):
+        os.makedirs(destination_folder)
+
+    excluded_prefixes = tuple(f'{class_id} ' for class_id in exclude_classes)
+    for txt_file in iter_files(source_folder, ('.txt',)):
+        file_name = os.path.basename(txt_file)
+        destination_file_path = os.path.join(destination_folder, file_name)
+        with open(txt_file, 'r') as source, open(destination_file_path, 'w') as destination:
+            # Select only lines that don't start with an excluded class
+            for line in source:
+                if not line.startswith(excluded_prefixes):
+                    destination.write(line)
+
+def count_labels(folder, class_names=None):
+    """
+    Count the number of instances for each class in label files.
+
+    Args:
+        folder (str): Folder containing label files
+        class_names (dict): Mapping from class ID to class name (default: S.C/D.C/M.C)
+    """
+    if class_names is None:
+        class_names = CLASS_NAMES
+    class_counts = {class_id: 0 for class_id in class_names}
+
+    for txt_file in iter_files(folder, ('.txt',)):
+        with open(txt_file, 'r') as file:
+            for line in file:
+                class_id = int(line.split()[0])
+                if class_id in class_counts:
+                    class_counts[class_id] += 1
+
+    print("Class ID counts:")
+    for class_id, count in class_counts.items():
+        print(f"{class_names[class_id]}: {count}")
+
+THUMBNAIL_SIZE = (256, 256)
+
+def save_thumbnail(image_path, target_folder, size=THUMBNAIL_SIZE, reader=None):
+    """
+    Save a PNG thumbnail of an image for visual QA.
+
+    Called right after a consumer decoded the same file through the same
+    reader, the thumbnail is reduced from the cached decode instead of
+    decoding the file again.
+
+    Args:
+        image_path (str): Image file path
+        target_folder (str): Target folder for thumbnails
+        size (tuple): Maximum thumbnail (width, height)
+        reader (ImageReader): Shared image reader (default: a new one)
+    """
+    if reader is None:
+        reader = ImageReader()
+    thumbnail = reader.read(image_path, size=size).copy()
+    thumbnail.thumbnail(size)
+    filename = os.path.basename(image_path)
+    thumbnail.save(os.path.join(target_folder, filename.rsplit('.', 1)[0] + '.png'), 'PNG')
+
+def move_and_convert_dic_images(source_folder, target_folder, reader=None, thumbnail_folder=None):
+    """
+    Select and convert DIC images to PNG format.
+
+    Args:
+        source_folder (str): Source folder containing DIC images
+        target_folder (str): Target folder for converted PNG images
+        reader (ImageReader): Shared image reader (default: a new one)
+        thumbnail_folder (str): Optional folder for QA thumbnails, made from the same decode
+    """
+    if not os.path.exists(target_folder):
+        os.makedirs(target_folder)
+    if thumbnail_folder:
+        os.makedirs(thumbnail_folder, exist_ok=True)
+    if reader is None:
+        reader = ImageReader()
+
+    for filename in os.listdir(source_folder):
+        if is_dic_file(filename):
+            source_path = os.path.join(source_folder, filename)
+            target_path = os.path.join(target_folder, dic_output_name(filename))
+
+            image = dic_transform(reader.read(source_path))
+            image.save(target_path, 'PNG')
+            if thumbnail_folder:
+                save_thumbnail(source_path, thumbnail_folder, reader=reader)
+
+def extract_device_id(label_filename):
+    """
+    Extract device ID from label filename.
+
+    Args:
+        label_filename (str): Label filename
+
+    Returns:
+        str: Device ID or None if not found
+    """
+    parts = label_filename.split('_')
+    return f"{parts[0]}_{parts[1]}" if len(parts) >= 3 else None
+
+def get_image_filename(label_filename, image_type):
+    """
+    Generate image filename from label filename.
+
+    Args:
+        label_filename (str): Label filename
+        image_type (str): Type of image (e.g., DIC, RFP, GFP)
+
+    Returns:
+        str: Generated image filename
+    """
+    return label_filename.replace(".txt", f"{image_type}.png")
+
+def write_fold_set(labels, images_path, fold_output_path, set_name, io_workers=DEFAULT_IO_WORKERS,
+                   sidecar_extensions=(), append=False):
+    """
+    Copy the images and labels of one fold set and list the images in <set_name>.txt.
+
+    Args:
+        labels (list): Label file paths
+        images_path (str): Path to image directory
+        fold_output_path (str): Fold directory
+        set_name (str): "train" or "valid"
+        io_workers (int): Number of concurrent copies
+        sidecar_extensions (tuple): Extra files copied next to each image
+        append (bool): Append to an existing set instead of rewriting its list
+    """
+    set_images_path = os.path.join(fold_output_path, set_name, "images")
+    set_labels_path = os.path.join(fold_output_path, set_name, "labels")
+
+    os.makedirs(set_images_path, exist_ok=True)
+    os.makedirs(set_labels_path, exist_ok=True)
+
+    copy_pairs = []
+    file_list_output_file = os.path.join(fold_output_path, f"{set_name}.txt")
+    with open(file_list_output_file, 'a' if append else 'w') as file_list_f:
+        for label_path in labels:
+            label_filename = os.path.basename(label_path)
+            image_filename = get_image_filename(label_filename, "")
+            image_path = os.path.join(images_path, image_filename)
+
+            copy_pairs.append((image_path, os.path.join(set_images_path, image_filename)))
+            for extension in sidecar_extensions:
+                sidecar_filename = os.path.splitext(image_filename)[0] + extension
+                copy_pairs.append((os.path.join(images_path, sidecar_filename),
+                                   os.path.join(set_images_path, sidecar_filename)))
+            copy_pairs.append((label_path, os.path.join(set_labels_path, label_filename)))
+            file_list_f.write(os.path.join(set_images_path, image_filename) + '\n')
+
+    copy_files(copy_pairs, max_workers=io_workers)
+
+def split_dataset_inter_device(images_path, labels_path, output_path, n_splits=5, random_state=42,
+                               class_names=('S.C',), io_workers=DEFAULT_IO_WORKERS, sidecar_extensions=(),
+                               fold_method='balanced'):
+    """
+    Split dataset into train and validation sets with K group folds (one group per device).
+
+    The split depends only on the file names and ``random_state``: labels are
+    ordered by a seeded hash instead of the filesystem listing and a shuffle
+    of the global RNG, so every host produces the same folds. Device-to-fold
+    assignments are recorded in ``folds.json``; devices already recorded
+    there (with the same settings) keep their fold when the split is rebuilt,
+    and only new devices are assigned.
+
+    Args:
+        images_path (str): Path to image directory
+        labels_path (str): Path to labels directory
+        output_path (str): Output directory for split datasets
+        n_splits (int): Number of folds for cross-validation (default: 5)
+        random_state (int): Seed of the hashed order
+        class_names (tuple): Class names written to each fold's custom.yaml
+        io_workers (int): Number of concurrent copies
+        sidecar_extensions (tuple): Extra files copied next to each image
+            (e.g. ('.npy',) for stacked channel arrays)
+        fold_method (str): "balanced" (GroupKFold's size balancing) or "hash"
+            (fold from the device ID's hash alone)
+    """
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    all_labels = [os.path.join(labels_path, name)
+                  for name in hashed_order(os.path.basename(path) for path in iter_files(labels_path, ('.txt',)))]
+
+    # Labels without a device ID form their own group
+    device_ids = [extract_device_id(os.path.basename(label)) or os.path.basename(label) for label in all_labels]
+    group_sizes = {}
+    for device_id in device_ids:
+        group_sizes[device_id] = group_sizes.get(device_id, 0) + 1
+
+    record = read_folds(output_path)
+    existing = None
+    if record and (record["n_splits"], record["seed"], record["method"]) == (n_splits, random_state, fold_method):
+        existing = {group: fold for group, fold in record["groups"].items() if group in group_sizes}
+    assignment = assign_folds(group_sizes, n_splits, random_state, fold_method, existing)
+    write_folds(output_path, assignment, n_splits, random_state, fold_method)
+
+    # Create K different train/valid splits
+    for fold in range(n_splits):
+        train_labels = [label for label, device_id in zip(all_labels, device_ids) if assignment[device_id] != fold]
+        valid_labels = [label for label, device_id in zip(all_labels, device_ids) if assignment[device_id] == fold]
+
+        # Create fold-specific directory
+        fold_output_path = os.path.join(output_path, f"fold_{fold}")
+        os.makedirs(fold_output_path, exist_ok=True)
+
+        # Process each set (train and valid)
+        for set_name, labels in [("train", train_labels), ("valid", valid_labels)]:
+            write_fold_set(labels, images_path, fold_output_path, set_name, io_workers, sidecar_extensions)
+
+        # Create YAML configuration file for each fold
+        yaml_data = {
+            "names": list(class_names),
+            "nc": len(class_names),
+            "path": fold_output_path,
+            "train": "train.txt",
+            "val": "valid.txt"
+        }
+
+        with open(os.path.join(fold_output_path, "custom.yaml"), "w") as f:
+            yaml.dump(yaml_data, f)
+
+        print(f"Created fold {fold} with train: {len(train_labels)}, "
+              f"valid: {len(valid_labels)} images.")
+
+
+def update_split_inter_device(images_path, labels_path, output_path, class_names=('S.C',),
+                              io_workers=DEFAULT_IO_WORKERS, sidecar_extensions=()):
+    """
+    Add new labels to an existing split without rebuilding it.
+
+    A label is new when its image is not listed in any fold's valid.txt.
+    New images of recorded devices join their device's fold; new devices
+    are assigned with the settings recorded in folds.json, balanced against
+    the current fold sizes. Only the new files are copied and appended to
+    train.txt and valid.txt; existing assignments and files stay untouched.
+    Without a folds.json the split is built from scratch.
+
+    Args:
+        images_path (str): Path to image directory
+        labels_path (str): Path to labels directory (old and new labels)
+        output_path (str): Split directory written by split_dataset_inter_device
+        class_names (tuple): Class names, used when the split is built from scratch
+        io_workers (int): Number of concurrent copies
+        sidecar_extensions (tuple): Extra files copied next to each image
+
+    Returns:
+        int: Number of labels added
+    """
+    record = read_folds(output_path)
+    if record is None:
+        print(f"No {FOLDS_FILE} in {output_path}, building the split from scratch...")
+        split_dataset_inter_device(images_path, labels_path, output_path, class_names=class_names,
+                                   io_workers=io_workers, sidecar_extensions=sidecar_extensions)
+        return len(list(iter_files(labels_path, ('.txt',))))
+
+    n_splits, seed = record["n_splits"], record["seed"]
+    group_sizes = {}
+    listed = set()
+    for fold in range(n_splits):
+        with open(os.path.join(output_path, f"fold_{fold}", "valid.txt")) as f:
+            for line in f:
+                image_filename = os.path.basename(line.strip())
+                if image_filename:
+                    listed.add(image_filename)
+                    device_id = extract_device_id(image_filename) or image_filename
+                    group_sizes[device_id] = group_sizes.get(device_id, 0) + 1
+
+    new_labels = [os.path.join(labels_path, name)
+                  for name in hashed_order(os.path.basename(path) for path in iter_files(labels_path, ('.txt',)))
+                  if get_image_filename(name, "") not in listed]
+    if not new_labels:
+        print("No new labels to add.")
+        return 0
+
+    device_ids = [extract_device_id(os.path.basename(label)) or os.path.basename(label) for label in new_labels]
+    for device_id in device_ids:
+        group_sizes[device_id] = group_sizes.get(device_id, 0) + 1
+    assignment = assign_folds(group_sizes, n_splits, seed, record["method"], record["groups"])
+    write_folds(output_path, assignment, n_splits, seed, record["method"])
+
+    for fold in range(n_splits):
+        fold_output_path = os.path.join(output_path, f"fold_{fold}")
+        train_labels = [label for label, device_id in zip(new_labels, device_ids) if assignment[device_id] != fold]
+        valid_labels = [label for label, device_id in zip(new_labels, device_ids) if assignment[device_id] == fold]
+        for set_name, labels in [("train", train_labels), ("valid", valid_labels)]:
+            write_fold_set(labels, images_path, fold_output_path, set_name, io_workers, sidecar_extensions,
+                           append=True)
+        print(f"Updated fold {fold} with train: +{len(train_labels)}, valid: +{len(valid_labels)} images.")
+
+    new_devices = len(set(device_ids) - set(record["groups"]))
+    print(f"Added {len(new_labels)} labels ({new_devices} new devices) to {output_path}")
+    return len(new_labels)
+
+
+def enhance_fluorescence(image_path, transparency, enhance_factor=1.5, threshold=50, background_alpha=50,
+                         reader=None):
+    """
+    Enhance fluorescence images and adjust transparency.
+
+    Args:
+        image_path (str): Path to fluorescence image
+        transparency (int): Transparency level for enhanced areas
+        enhance_factor (float): Contrast enhancement factor
+        threshold (int): Threshold for pixel enhancement
+        background_alpha (int): Background transparency level
+        reader (ImageReader): Shared image reader (default: decode directly)
+
+    Returns:
+        PIL.Image: Enhanced image
+    """
+    if reader is None:
+        image = Image.open(image_path).convert("RGBA")
+    else:
+        image = reader.read(image_path, mode="RGBA")
+    return apply_fluorescence_alpha(image, transparency, enhance_factor, threshold, background_alpha)
+
+def process_merged_images(images_folder, output_folder, brightness_factor=0.9, final_contrast_factor=1.5,
+                          reader=None, native_depth=False, memory_limit=None, max_queue=4, thumbnail_folder=None):
+    """
+    Merge and process DIC, RFP, and GFP images.
+
+    Decoding and merging run as two streaming stages connected by a bounded
+    queue, so only a few triplets are held in memory at any time.
+
+    Args:
+        images_folder (str): Source folder containing all images
+        output_folder (str): Output folder for merged images
+        brightness_factor (float): Final brightness adjustment factor
+        final_contrast_factor (float): Final contrast adjustment factor
+        reader (ImageReader): Shared image reader (default: a new one)
+        native_depth (bool): Merge on arrays at the files' native bit depth
+            (16-bit TIFFs stay 16-bit) and quantize to 8 bits only on save
+        memory_limit (int): Optional ceiling in bytes for decoded triplets in flight
+        max_queue (int): Number of decoded triplets buffered between stages
+        thumbnail_folder (str): Optional folder for QA thumbnails of every channel,
+            made from the same decode (without native_depth)
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    if thumbnail_folder:
+        os.makedirs(thumbnail_folder, exist_ok=True)
+    if reader is None:
+        reader = ImageReader(memory_limit) if memory_limit else ImageReader()
+
+    image_groups = {}
+    for image_path in iter_files(images_folder, ('.jpg', '.jpeg', '.png', '.tif')):
+        parts = os.path.basename(image_path).split('_')
+        base_name = '_'.join(parts[:-1])  # Remove the last part (DIC/RFP/GFP)
+        image_type = parts[-1].split('.')[0]
+        image_groups.setdefault(base_name, {})[image_type] = image_path
+
+    def complete_groups():
+        for base_name, image_paths in image_groups.items():
+            paths = tuple(image_paths.get(image_type) for image_type in ('DIC', 'RFP', 'GFP'))
+            if not all(paths):
+                print(f"Missing images for {base_name}, skipping...")
+                continue
+            yield base_name, paths
+
+    def decode(group):
+        base_name, paths = group
+        if native_depth:
+            channels = [read_channel(path) for path in paths]
+        else:
+            channels = [reader.read(path, mode="RGBA") for path in paths]
+        if thumbnail_folder:
+            for path in paths:
+                save_thumbnail(path, thumbnail_folder, reader=reader)
+        return base_name, channels
+
+    def merge_and_save(decoded):
+        base_name, channels = decoded
+        output_path = os.path.join(output_folder, base_name + '.png')
+        merge_transform(*channels, brightness_factor, final_contrast_factor, native_depth).save(output_path)
+        return output_path
+
+    def sizeof(group):
+        # Estimated from the headers, so the budget is held before decoding
+        _, paths = group
+        return sum(header_nbytes(path, None if native_depth else "RGBA") for path in paths)
+
+    for _ in stream_stages(complete_groups(), [decode, merge_and_save],
+                           max_queue=max_queue, memory_limit=memory_limit, sizeof=sizeof):
+        pass
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+
+from common.evaluation import evaluate_fold
+from common.runtime import CPUDetector, letterbox, predict_folder
+
+def read_calibration_sample(valid_list, n_images=64, seed=0):
+    """
+    Pick a reproducible sample of image paths from a fold's valid.txt.
+
+    Relative paths are resolved against the current directory, as train_dual.py does.
+
+    Args:
+        valid_list (str): valid.txt of the fold
+        n_images (int): Sample size
+        seed (int): Sampling seed
+
+    Returns:
+        list: Image paths
+    """
+    with open(valid_list) as f:
+        paths = sorted(line.strip() for line in f if line.strip())
+    return random.Random(seed).sample(paths, min(n_images, len(paths)))
+
+def _calibration_reader(image_paths, input_name, img_size):
+    from onnxruntime.quantization import CalibrationDataReader
+    from PIL import Image
+
+    class ValidSetReader(CalibrationDataReader):
+        # Feeds one letterboxed image at a time, preprocessed like CPUDetector.predict
+        def __init__(self):
+            self.paths = iter(image_paths)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            with Image.open(path) as image:
+                array, _, _ = letterbox(image.convert('RGB'), img_size)
+            inputs = np.ascontiguousarray(array.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+            return {input_name: inputs}
+
+        def rewind(self):
+            self.paths = iter(image_paths)
+
+    return ValidSetReader()
+
+def quantize_model(onnx_path, valid_list, output_path=None, img_size=1024, n_calibration=64, per_channel=True):
+    """
+    Statically quantize an exported ONNX model to INT8.
+
+    Weights are quantized per channel to int8 and activations to uint8 in
+    QDQ format, with ranges calibrated on a sample of the fold's validation
+    images. The model must have batch 1 or a dynamic batch axis.
+
+    Args:
+        onnx_path (str): FP32 best.onnx
+        valid_list (str): valid.txt of the fold
+        output_path (str): INT8 model path (default: best.int8.onnx next to the input)
+        img_size (int): Input size the model was exported with
+        n_calibration (int): Number of calibration images
+        per_channel (bool): Quantize weights per output channel
+
+    Returns:
+        str: INT8 model path
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    output_path = output_path or os.path.splitext(onnx_path)[0] + '.int8.onnx'
+    prepared_path = os.path.splitext(output_path)[0] + '.prep.onnx'
+    quant_pre_process(onnx_path, prepared_path)
+
+    input_name = ort.InferenceSession(prepared_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    reader = _calibration_reader(read_calibration_sample(valid_list, n_calibration), input_name, img_size)
+    quantize_static(prepared_path, output_path, reader,
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=per_channel,
+                    calibrate_method=CalibrationMethod.MinMax)
+    os.remove(prepared_path)
+    print(f"Quantized {onnx_path} to {output_path} with {n_calibration} calibration images")
+    return output_path
+
+def benchmark_model(model_path, img_size=1024, batch=1, threads=None, n_warmup=3, n_runs=20):
+    """
+    Time forward passes of an exported model on random input.
+
+    Args:
+        model_path (str): .onnx or .torchscript file
+        img_size (int): Input size
+        batch (int): Images per forward pass
+        threads (int): Intra-op threads
+        n_warmup (int): Untimed passes
+        n_runs (int): Timed passes
+
+    Returns:
+        dict: Median and p90 latency per batch in ms, and images per second
+    """
+    detector = CPUDetector(model_path, img_size, threads)
+    inputs = np.random.default_rng(0).random((batch, 3, img_size, img_size), dtype=np.float32)
+    for _ in range(n_warmup):
+        detector.forward(inputs)
+
+    latencies = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        detector.forward(inputs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    median = statistics.median(latencies)
+    return {"batch": batch, "threads": threads, "latency_ms": median,
+            "latency_p90_ms": latencies[int(0.9 * (len(latencies) - 1))],
+            "images_per_second": batch * 1000 / median}
+
+def compare_fold_models(fold_path, models, output_dir, class_names, img_size=1024, threads=None, batch=1,
+                        reference_metrics=None):
+    """
+    Evaluate and benchmark exported models of one fold side by side.
+
+    Each model predicts the fold's validation images through the CPU runner
+    and is scored with common.evaluation. Deltas are relative to the first model.
+
+    Args:
+        fold_path (str): Fold directory (e.g. split_for_yolo_detection/fold_0)
+        models (dict): Label -> model path, reference first (e.g. {"fp32": ..., "int8": ...})
+        output_dir (str): Directory for predictions and report.json
+        class_names (tuple): Class names in class ID order
+        img_size (int): Input size
+        threads (int): Intra-op threads
+        batch (int): Images per forward pass
+        reference_metrics (str): Optional metrics.json of the best.pt validation run
+
+    Returns:
+        dict: Label -> map50, map50_95, deltas, latency and throughput
+    """
+    report = {}
+    if reference_metrics and os.path.exists(reference_metrics):
+        with open(reference_metrics) as f:
+            overall = json.load(f)["overall"]
+        report["best.pt"] = {"map50": overall["map50"], "map50_95": overall["map50_95"]}
+
+    reference = None
+    for label, model_path in models.items():
+        run_dir = os.path.join(output_dir, label)
+        predict_folder(CPUDetector(model_path, img_size, threads), os.path.join(fold_path, 'valid', 'images'),
+                       os.path.join(run_dir, 'labels'), batch)
+        overall = evaluate_fold(fold_path, run_dir, class_names)["overall"]
+        entry = {"model": model_path, "map50": overall["map50"], "map50_95": overall["map50_95"],
+                 "size_mb": os.path.getsize(model_path) / 1024 ** 2}
+        entry.update(benchmark_model(model_path, img_size, batch, threads))
+        reference = reference or entry
+        entry["delta_map50"] = entry["map50"] - reference["map50"]
+        entry["delta_map50_95"] = entry["map50_95"] - reference["map50_95"]
+        entry["speedup"] = entry["images_per_second"] / reference["images_per_second"]
+        report[label] = entry
+
+    with open(os.path.join(output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    return report
+
+def print_report(report):
+    print(f"{'model':<10} {'mAP50':>7} {'mAP50-95':>9} {'Δ mAP50-95':>11} {'ms/batch':>9} {'p90 ms':>8} {'img/s':>7} {'MB':>7}")
+    for label, entry in report.items():
+        if "latency_ms" not in entry:
+            print(f"{label:<10} {entry['map50']:>7.4f} {entry['map50_95']:>9.4f}")
+            continue
+        print(f"{label:<10} {entry['map50']:>7.4f} {entry['map50_95']:>9.4f} {entry['delta_map50_95']:>+11.4f} "
+              f"{entry['latency_ms']:>9.1f} {entry['latency_p90_ms']:>8.1f} {entry['images_per_second']:>7.2f} "
+              f"{entry['size_mb']:>7.1f}")
+
+def quantize_fold(weights_dir, fold_path, class_names, img_size=1024, n_calibration=64, threads=None,
+                  reference_metrics=None):
+    """
+    Quantize a fold's exported best.onnx and compare it with the FP32 model.
+
+    Args:
+        weights_dir (str): Fold weights directory holding best.onnx
+        fold_path (str): Fold directory with valid.txt and valid/
+        class_names (tuple): Class names in class ID order
+        img_size (int): Input size the model was exported with
+        n_calibration (int): Number of calibration images
+        threads (int): Intra-op threads for evaluation and benchmark
+        reference_metrics (str): Optional metrics.json of the best.pt validation run
+
+    Returns:
+        dict: Comparison report (see compare_fold_models)
+    """
+    fp32_path = os.path.join(weights_dir, 'best.onnx')
+    int8_path = quantize_model(fp32_path, os.path.join(fold_path, 'valid.txt'), img_size=img_size,
+                               n_calibration=n_calibration)
+    output_dir = os.path.join(weights_dir, 'quantization')
+    os.makedirs(output_dir, exist_ok=True)
+    return compare_fold_models(fold_path, {"fp32": fp32_path, "int8": int8_path}, output_dir, class_names,
+                               img_size, threads, reference_metrics=reference_metrics)
+
+def record_quantization(store, experiment, task, mode, fold, report):
+    """
+    Record the FP32 and INT8 rows of a quantize_fold report in the results store.
+
+    They go under experiments ``<experiment>-onnx-fp32`` and ``-onnx-int8``.
+
+    Args:
+        store (ResultsStore): Results store
+        experiment (str): Experiment of the PyTorch model
+        task (str): Task name ("SC", "DC" or "ALL")
+        mode (str): Training mode (e.g. "finetune")
+        fold (int): Fold number
+        report (dict): Output of quantize_fold
+    """
+    for precision in ('fp32', 'int8'):
+        metrics = {key: report[precision][key] for key in ('map50', 'map50_95', 'latency_ms', 'images_per_second')}
+        store.record_fold(f'{experiment}-onnx-{precision}', task, mode, fold, metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization and CPU benchmark of exported fold models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    quantize = subparsers.add_parser("quantize", help="Quantize best.onnx of a fold and compare with FP32")
+    quantize.add_argument("weights_dir", help="Fold weights directory holding best.onnx")
+    quantize.add_argument("fold", help="Fold directory (e.g. split_for_yolo_detection/fold_0)")
+    quantize.add_argument("--class-names", nargs="+", default=["S.C"])
+    quantize.add_argument("--img", type=int, default=1024)
+    quantize.add_argument("--calibration-images", type=int, default=64)
+    quantize.add_argument("--threads", type=int)
+    quantize.add_argument("--reference-metrics", help="metrics.json of the best.pt validation run")
+
+    benchmark = subparsers.add_parser("benchmark", help="Latency and throughput of exported models")
+    benchmark.add_argument("models", nargs="+")
+    benchmark.add_argument("--img", type=int, default=1024)
+    benchmark.add_argument("--batch", type=int, default=1)
+    benchmark.add_argument("--threads", type=int)
+    benchmark.add_argument("--runs", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "quantize":
+        quantize_fold(args.weights_dir, args.fold, args.class_names, args.img, args.calibration_images,
+                      args.threads, args.reference_metrics)
+    else:
+        for model_path in args.models:
+            stats = benchmark_model(model_path, args.img, args.batch, args.threads, n_runs=args.runs)
+            print(f"{model_path}: {stats['latency_ms']:.1f} ms/batch (p90 {stats['latency_p90_ms']:.1f}), "
+                  f"{stats['images_per_second']:.2f} img/s")
+
+if __name__ == "__main__":
+    main()
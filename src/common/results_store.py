@@ -0,0 +1,255 @@
+import argparse
+import glob
+import json
+import math
+import os
+import sqlite3
+import time
+
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'results', 'metrics.db'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fold_metrics (
+    experiment TEXT NOT NULL,
+    task TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    fold INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (experiment, task, mode, fold, metric)
+);
+CREATE TABLE IF NOT EXISTS metric_summary (
+    experiment TEXT NOT NULL,
+    task TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    total REAL NOT NULL,
+    total_sq REAL NOT NULL,
+    PRIMARY KEY (experiment, task, mode, metric)
+);
+"""
+
+def flatten_evaluation(results):
+    """
+    Pick the scalar metrics to store from common.evaluation results.
+
+    Args:
+        results (dict): Output of evaluate_fold
+
+    Returns:
+        dict: Metric name -> value
+    """
+    overall = results["overall"]
+    metrics = {"map50": overall["map50"], "map50_95": overall["map50_95"]}
+    class_names = results.get("class_names") or [str(c) for c in overall["classes"]]
+
+    for k, name in enumerate(class_names):
+        ap = overall["ap"][k]
+        metrics[f"ap50/{name}"] = ap[0]
+        metrics[f"ap50_95/{name}"] = sum(ap) / len(ap)
+        f1 = overall["f1"][k]
+        best = max(range(len(f1)), key=f1.__getitem__)
+        metrics[f"best_f1/{name}"] = f1[best]
+        metrics[f"best_f1_conf/{name}"] = overall["conf_thresholds"][best]
+        metrics[f"precision@best_f1/{name}"] = overall["precision"][k][best]
+        metrics[f"recall@best_f1/{name}"] = overall["recall"][k][best]
+    return metrics
+
+class ResultsStore:
+    """
+    SQLite store of per-fold metrics with an incrementally updated summary.
+
+    Each (experiment, task, mode, fold, metric) has one row. Recording a fold
+    refreshes only the summary rows of its own group, so mean and std across
+    folds are always a single lookup.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """
+        Args:
+            db_path (str): SQLite database path
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record_fold(self, experiment, task, mode, fold, metrics):
+        """
+        Insert or replace the metrics of one fold and refresh the summary.
+
+        Args:
+            experiment (str): Experiment name
+            task (str): "SC" or "DC"
+            mode (str): "pretrain" or "finetune"
+            fold (int): Fold number
+            metrics (dict): Metric name -> value
+        """
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO fold_metrics VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(experiment, task, mode, fold, name, float(value), now) for name, value in metrics.items()])
+            self.connection.executemany(
+                """
+                INSERT OR REPLACE INTO metric_summary
+                SELECT experiment, task, mode, metric, COUNT(*), SUM(value), SUM(value * value)
+                FROM fold_metrics
+                WHERE experiment = ? AND task = ? AND mode = ? AND metric = ?
+                GROUP BY experiment, task, mode, metric
+                """,
+                [(experiment, task, mode, name) for name in metrics])
+
+    def record_evaluation(self, experiment, task, mode, fold, results):
+        """
+        Record the scalar metrics of a common.evaluation result.
+
+        Args:
+            experiment (str): Experiment name
+            task (str): "SC" or "DC"
+            mode (str): "pretrain" or "finetune"
+            fold (int): Fold number
+            results (dict): Output of evaluate_fold
+        """
+        self.record_fold(experiment, task, mode, fold, flatten_evaluation(results))
+
+    def summary(self, experiment=None, task=None, mode=None, metric=None):
+        """
+        Mean and sample std across folds for every matching group.
+
+        Args:
+            experiment (str): Optional experiment filter
+            task (str): Optional task filter
+            mode (str): Optional mode filter
+            metric (str): Optional metric filter
+
+        Returns:
+            list: Dicts with experiment, task, mode, metric, folds, mean and std
+        """
+        filters = {"experiment": experiment, "task": task, "mode": mode, "metric": metric}
+        clauses = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        query = "SELECT experiment, task, mode, metric, n, total, total_sq FROM metric_summary"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY metric, experiment, task, mode"
+
+        rows = []
+        for experiment, task, mode, metric, n, total, total_sq in self.connection.execute(
+                query, [value for value in filters.values() if value is not None]):
+            mean = total / n
+            variance = (total_sq - n * mean * mean) / (n - 1) if n > 1 else 0.0
+            rows.append({"experiment": experiment, "task": task, "mode": mode, "metric": metric,
+                         "folds": n, "mean": mean, "std": math.sqrt(max(variance, 0.0))})
+        return rows
+
+    def fold_values(self, experiment, task, mode, metric):
+        """
+        Per-fold values of one metric.
+
+        Returns:
+            dict: Fold number -> value
+        """
+        return dict(self.connection.execute(
+            "SELECT fold, value FROM fold_metrics WHERE experiment = ? AND task = ? AND mode = ? AND metric = ? "
+            "ORDER BY fold", (experiment, task, mode, metric)))
+
+def compare_with_specialists(store, experiment, mode='finetune', unified_task='ALL',
+                             specialists=(('S.C', 'SC'), ('D.C', 'DC')),
+                             metrics=('ap50', 'ap50_95', 'best_f1')):
+    """
+    Per-class metrics of the unified three-class model next to the specialist models.
+
+    The specialist rows come from the single-class task of each class. DC folds
+    are split from labels_DC, so their validation images differ from the
+    unified folds; compare the means across folds rather than fold by fold.
+
+    Args:
+        store (ResultsStore): Store holding both runs
+        experiment (str): Experiment name
+        mode (str): "pretrain" or "finetune"
+        unified_task (str): Task name of the unified model
+        specialists (tuple): (class name, specialist task) pairs
+        metrics (tuple): Per-class metric prefixes to compare
+
+    Returns:
+        list: Dicts with class, metric, unified and specialist summaries and the delta of the means
+    """
+    rows = []
+    for class_name, task in specialists:
+        for metric in metrics:
+            name = f"{metric}/{class_name}"
+            unified = store.summary(experiment, unified_task, mode, name)
+            specialist = store.summary(experiment, task, mode, name)
+            if not unified or not specialist:
+                continue
+            rows.append({"class": class_name, "metric": metric, "unified": unified[0], "specialist": specialist[0],
+                         "delta": unified[0]["mean"] - specialist[0]["mean"]})
+    return rows
+
+def collect_runs(store, runs_dir, experiment, task, mode):
+    """
+    Record every runs/val/test_fold_k/metrics.json under a directory.
+
+    Args:
+        store (ResultsStore): Target store
+        runs_dir (str): val_dual.py project directory (e.g. yolov9/runs/val)
+        experiment (str): Experiment name
+        task (str): "SC" or "DC"
+        mode (str): "pretrain" or "finetune"
+
+    Returns:
+        int: Number of folds recorded
+    """
+    count = 0
+    for metrics_path in sorted(glob.glob(os.path.join(runs_dir, 'test_fold_*', 'metrics.json'))):
+        fold = int(os.path.basename(os.path.dirname(metrics_path)).rsplit('_', 1)[1])
+        with open(metrics_path) as f:
+            store.record_evaluation(experiment, task, mode, fold, json.load(f))
+        count += 1
+    return count
+
+def print_comparison(rows):
+    print(f"{'class':<6} {'metric':<8} {'unified (ALL)':>25} {'specialist':>25} {'delta':>8}")
+    for row in rows:
+        unified, specialist = row["unified"], row["specialist"]
+        print(f"{row['class']:<6} {row['metric']:<8} "
+              f"{unified['mean']:>10.4f} ± {unified['std']:.4f} (n={unified['folds']}) "
+              f"{specialist['mean']:>10.4f} ± {specialist['std']:.4f} (n={specialist['folds']}) {row['delta']:>+8.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-fold metrics store")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    collect = subparsers.add_parser("collect", help="Record metrics.json files from a runs/val directory")
+    collect.add_argument("runs_dir")
+    collect.add_argument("--experiment", required=True)
+    collect.add_argument("--task", required=True, choices=["SC", "DC", "ALL"])
+    collect.add_argument("--mode", required=True, choices=["pretrain", "finetune"])
+
+    summary = subparsers.add_parser("summary", help="Print mean and std across folds")
+    for option in ("--experiment", "--task", "--mode", "--metric"):
+        summary.add_argument(option)
+
+    compare = subparsers.add_parser("compare", help="Per-class metrics of the unified model against the specialists")
+    compare.add_argument("--experiment", required=True)
+    compare.add_argument("--mode", default="finetune", choices=["pretrain", "finetune"])
+
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+    if args.command == "collect":
+        print(f"Recorded {collect_runs(store, args.runs_dir, args.experiment, args.task, args.mode)} folds")
+    elif args.command == "compare":
+        print_comparison(compare_with_specialists(store, args.experiment, args.mode))
+    else:
+        for row in store.summary(args.experiment, args.task, args.mode, args.metric):
+            print(f"{row['metric']:<28} {row['experiment']:<20} {row['task']:<3} {row['mode']:<9} "
+                  f"{row['mean']:.4f} ± {row['std']:.4f} (n={row['folds']})")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import os
+import subprocess
+import time
+
+import numpy as np
+
+
+EXPORT_FORMATS = ('onnx', 'torchscript')
+MAX_WH = 7680  # Class offset for batched NMS, as in yolov9's non_max_suppression
+
+def export_fold(weights_path, img_size=1024, batch=1, dynamic=False, formats=EXPORT_FORMATS, yolov9_dir='.'):
+    """
+    Export a fold's checkpoint with yolov9's export.py.
+
+    The artifacts are written next to the checkpoint (best.onnx, best.torchscript).
+
+    Args:
+        weights_path (str): Checkpoint to export (e.g. .../weights/best.pt)
+        img_size (int): Input image size
+        batch (int): Fixed batch size of the exported graph
+        dynamic (bool): Export ONNX with a dynamic batch axis instead
+        formats (tuple): Any of "onnx" and "torchscript"
+        yolov9_dir (str): yolov9 checkout providing export.py
+
+    Returns:
+        dict: Format -> exported file path
+    """
+    cmd = [
+        'python', 'export.py',
+        '--weights', os.path.abspath(weights_path),
+        '--imgsz', str(img_size),
+        '--batch-size', str(batch),
+        '--device', 'cpu',
+        '--include', *formats
+    ]
+    if dynamic:
+        cmd.append('--dynamic')
+    subprocess.run(cmd, cwd=yolov9_dir, check=True)
+
+    stem = os.path.splitext(weights_path)[0]
+    return {fmt: f'{stem}.{fmt}' for fmt in formats}
+
+def letterbox(image, img_size, fill=114):
+    """
+    Resize an image to fit a square input, keeping the aspect ratio, and pad it.
+
+    Args:
+        image (PIL.Image): RGB image
+        img_size (int): Side of the square input
+        fill (int): Padding value
+
+    Returns:
+        tuple: (HWC uint8 array, scale, (pad_x, pad_y))
+    """
+    from PIL import Image
+
+    scale = min(img_size / image.width, img_size / image.height)
+    width, height = round(image.width * scale), round(image.height * scale)
+    pad_x, pad_y = (img_size - width) // 2, (img_size - height) // 2
+    canvas = np.full((img_size, img_size, 3), fill, dtype=np.uint8)
+    canvas[pad_y:pad_y + height, pad_x:pad_x + width] = np.asarray(
+        image.resize((width, height), Image.BILINEAR))
+    return canvas, scale, (pad_x, pad_y)
+
+def non_max_suppression(prediction, conf_thres=0.001, iou_thres=0.7, max_det=300):
+    """
+    Class-aware greedy NMS over one image's raw head output.
+
+    Args:
+        prediction (np.ndarray): (4 + nc, N) array of xywh boxes and class scores
+        conf_thres (float): Minimum class score
+        iou_thres (float): IoU above which lower-scored boxes are suppressed
+        max_det (int): Maximum detections kept
+
+    Returns:
+        np.ndarray: (K, 6) array of x1, y1, x2, y2, conf, cls
+    """
+    prediction = prediction.T
+    scores = prediction[:, 4:]
+    cls = scores.argmax(1)
+    conf = scores[np.arange(len(scores)), cls]
+    keep = conf > conf_thres
+    xywh, conf, cls = prediction[keep, :4], conf[keep], cls[keep]
+
+    boxes = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], 1)
+    offset_boxes = boxes + cls[:, None] * MAX_WH
+    areas = (offset_boxes[:, 2] - offset_boxes[:, 0]) * (offset_boxes[:, 3] - offset_boxes[:, 1])
+    order = conf.argsort()[::-1]
+    selected = []
+    while order.size and len(selected) < max_det:
+        i = order[0]
+        selected.append(i)
+        rest = order[1:]
+        top_left = np.maximum(offset_boxes[i, :2], offset_boxes[rest, :2])
+        bottom_right = np.minimum(offset_boxes[i, 2:], offset_boxes[rest, 2:])
+        inter = np.clip(bottom_right - top_left, 0, None).prod(1)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.concatenate([boxes[selected], conf[selected, None], cls[selected, None]], 1)
+
+class CPUDetector:
+    """
+    Run an exported fold model on the CPU without the yolov9 checkout.
+
+    ``.onnx`` files run on ONNX Runtime's CPU provider and ``.torchscript``
+    files on torch.jit. Dual-head models return one output per head; the
+    last one is the main head used by val_dual.py.
+    """
+
+    def __init__(self, model_path, img_size=1024, threads=None, output_index=-1):
+        """
+        Args:
+            model_path (str): best.onnx or best.torchscript
+            img_size (int): Input size the model was exported with
+            threads (int): Intra-op threads (None keeps the runtime default)
+            output_index (int): Head output to decode
+        """
+        self.img_size = img_size
+        self.output_index = output_index
+        self.is_onnx = model_path.endswith('.onnx')
+        if self.is_onnx:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if threads:
+                options.intra_op_num_threads = threads
+                options.inter_op_num_threads = 1
+            self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+            self.input_name = self.session.get_inputs()[0].name
+            batch = self.session.get_inputs()[0].shape[0]
+            self.batch = batch if isinstance(batch, int) else None
+        else:
+            import torch
+
+            if threads:
+                torch.set_num_threads(threads)
+            self.model = torch.jit.optimize_for_inference(torch.jit.load(model_path, map_location='cpu').eval())
+            self.batch = None
+
+    def _run(self, inputs):
+        if self.is_onnx:
+            outputs = self.session.run(None, {self.input_name: inputs})
+        else:
+            import torch
+
+            with torch.inference_mode():
+                outputs = self.model(torch.from_numpy(inputs))
+            outputs = [outputs] if isinstance(outputs, torch.Tensor) else outputs
+            outputs = [output.numpy() for output in outputs]
+        return outputs[self.output_index]
+
+    def forward(self, inputs):
+        """
+        Raw head output for a float32 NCHW batch, padded to a fixed export batch.
+
+        Returns:
+            np.ndarray: (N, 4 + nc, anchors)
+        """
+        if self.batch is None:
+            return self._run(inputs)
+        outputs = []
+        for start in range(0, len(inputs), self.batch):
+            chunk = inputs[start:start + self.batch]
+            n = len(chunk)
+            if n < self.batch:
+                chunk = np.concatenate([chunk, np.zeros((self.batch - n,) + chunk.shape[1:], chunk.dtype)])
+            outputs.append(self._run(chunk)[:n])
+        return np.concatenate(outputs)
+
+    def predict(self, images, conf_thres=0.001, iou_thres=0.7):
+        """
+        Detect objects in PIL images.
+
+        Args:
+            images (list): RGB PIL images
+            conf_thres (float): Minimum class score
+            iou_thres (float): NMS IoU threshold
+
+        Returns:
+            list: Per image, a (K, 6) array of normalized xc, yc, w, h, conf, cls
+        """
+        letterboxed = [letterbox(image, self.img_size) for image in images]
+        inputs = np.stack([array for array, _, _ in letterboxed]).transpose(0, 3, 1, 2)
+        inputs = np.ascontiguousarray(inputs, dtype=np.float32) / 255.0
+
+        results = []
+        for output, image, (_, scale, (pad_x, pad_y)) in zip(self.forward(inputs), images, letterboxed):
+            detections = non_max_suppression(output, conf_thres, iou_thres)
+            boxes = detections[:, :4]
+            boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / scale).clip(0, image.width)
+            boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / scale).clip(0, image.height)
+            xywh = np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], 1)
+            xywh /= [image.width, image.height, image.width, image.height]
+            results.append(np.concatenate([xywh, detections[:, 4:]], 1))
+        return results
+
+def predict_folder(detector, images_folder, output_dir, batch=1, conf_thres=0.001, iou_thres=0.7,
+                   preprocess=None, native_depth=False):
+    """
+    Write YOLO-format predictions (cls xc yc w h conf) for every image in a folder.
+
+    The output matches val_dual.py --save-txt --save-conf, so
+    ``output_dir/..`` can be scored with common.evaluation.evaluate_fold.
+    With ``preprocess``, the folder holds raw channel images and every frame
+    is transformed in memory exactly as step0 would have written it.
+
+    Args:
+        detector (CPUDetector): Loaded model
+        images_folder (str): Folder of images
+        output_dir (str): Folder for the label files
+        batch (int): Images per forward pass
+        conf_thres (float): Minimum class score
+        iou_thres (float): NMS IoU threshold
+        preprocess (str): None for step0 outputs, "dic" or "merged" for raw channel images
+        native_depth (bool): Merge at native bit depth, as step0 with native_depth
+
+    Returns:
+        dict: images, seconds and images_per_second of the inference loop
+    """
+    from common.transforms import iter_frames, load_frame
+
+    os.makedirs(output_dir, exist_ok=True)
+    frames = list(iter_frames(images_folder, preprocess))
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        chunk = frames[i:i + batch]
+        images = [load_frame(source, preprocess, native_depth) for _, source in chunk]
+        for (name, _), detections in zip(chunk, detector.predict(images, conf_thres, iou_thres)):
+            with open(os.path.join(output_dir, name + '.txt'), 'w') as f:
+                for xc, yc, w, h, conf, cls in detections:
+                    f.write(f"{int(cls)} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f} {conf:.6f}\n")
+    seconds = time.perf_counter() - start
+    return {"images": len(frames), "seconds": seconds, "images_per_second": len(frames) / max(seconds, 1e-9)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Export fold models and run them on the CPU")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Export a checkpoint to ONNX and TorchScript")
+    export.add_argument("weights")
+    export.add_argument("--img", type=int, default=1024)
+    export.add_argument("--batch", type=int, default=1)
+    export.add_argument("--dynamic", action="store_true")
+    export.add_argument("--include", nargs="+", default=list(EXPORT_FORMATS), choices=EXPORT_FORMATS)
+    export.add_argument("--yolov9-dir", default=".")
+
+    predict = subparsers.add_parser("predict", help="Write predictions for a folder of images")
+    predict.add_argument("model", help="best.onnx or best.torchscript")
+    predict.add_argument("images_folder")
+    predict.add_argument("output_dir")
+    predict.add_argument("--img", type=int, default=1024)
+    predict.add_argument("--batch", type=int, default=1)
+    predict.add_argument("--threads", type=int)
+    predict.add_argument("--output-index", type=int, default=-1)
+    predict.add_argument("--conf", type=float, default=0.001)
+    predict.add_argument("--iou", type=float, default=0.7)
+    predict.add_argument("--preprocess", choices=("dic", "merged"),
+                         help="Transform raw channel images in memory as step0 does")
+    predict.add_argument("--native-depth", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        for fmt, path in export_fold(args.weights, args.img, args.batch, args.dynamic,
+                                     args.include, args.yolov9_dir).items():
+            print(f"{fmt}: {path}")
+    else:
+        detector = CPUDetector(args.model, args.img, args.threads, args.output_index)
+        stats = predict_folder(detector, args.images_folder, args.output_dir, args.batch, args.conf, args.iou,
+                               args.preprocess, args.native_depth)
+        print(f"{stats['images']} images in {stats['seconds']:.1f}s ({stats['images_per_second']:.2f} img/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import csv
+import json
+import os
+import re
+
+import numpy as np
+
+from common.preprocess import CLASS_NAMES
+from common.streaming import iter_files
+
+# Default schema: plate and well are the first two "_" fields, as in extract_device_id
+FILENAME_PATTERN = r'^(?P<plate>[^_]+)_(?P<well>[^_]+)_'
+N_CLASSES = len(CLASS_NAMES)
+SC_CLASS, DC_CLASS, MC_CLASS = 0, 1, 2
+
+def read_layout(path):
+    """
+    Read a plate layout CSV with plate, well, compound and role columns.
+
+    role is "negative" for negative control wells (the z-score baseline),
+    "positive" for positive controls and anything else for samples.
+
+    Returns:
+        dict: (plate, well) -> {"compound": ..., "role": ...}
+    """
+    with open(path, newline='') as f:
+        return {(row["plate"], row["well"]): {"compound": row.get("compound", ""), "role": row.get("role", "sample")}
+                for row in csv.DictReader(f)}
+
+def read_prediction_classes(path, conf_thres=0.25):
+    """
+    Class IDs of the detections in a YOLO prediction file.
+
+    Files without a confidence column (ground-truth labels) keep every box.
+
+    Returns:
+        numpy.ndarray: int64 class IDs
+    """
+    with open(path) as f:
+        rows = [line.split() for line in f if line.strip()]
+    if not rows:
+        return np.zeros(0, dtype=np.int64)
+    values = np.array(rows, dtype=np.float32)
+    if values.shape[1] > 5:
+        values = values[values[:, 5] >= conf_thres]
+    return values[:, 0].astype(np.int64)
+
+class ScreeningAggregator:
+    """
+    Per-well detection counts, updated incrementally and rolled up on demand.
+
+    Counts are kept in one (wells, classes) integer array; each batch of
+    detections is added with a single np.bincount over well-and-class codes,
+    so the cost of an update is linear in the batch and independent of the
+    data already aggregated.
+    """
+
+    def __init__(self, filename_pattern=FILENAME_PATTERN):
+        """
+        Args:
+            filename_pattern (str): Regex with named groups "plate" and "well",
+                matched against image file names
+        """
+        self.filename_pattern = filename_pattern
+        self._regex = re.compile(filename_pattern)
+        self.wells = []
+        self.well_index = {}
+        self.counts = np.zeros((0, N_CLASSES), dtype=np.int64)
+        self.images = np.zeros(0, dtype=np.int64)
+        self.seen = set()
+
+    def _well_ids(self, keys):
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self.well_index]
+        for key in new_keys:
+            self.well_index[key] = len(self.wells)
+            self.wells.append(key)
+        if new_keys:
+            self.counts = np.vstack([self.counts, np.zeros((len(new_keys), N_CLASSES), dtype=np.int64)])
+            self.images = np.concatenate([self.images, np.zeros(len(new_keys), dtype=np.int64)])
+        return np.fromiter((self.well_index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def parse_name(self, name):
+        match = self._regex.match(os.path.basename(name))
+        return (match.group('plate'), match.group('well')) if match else None
+
+    def add_detections(self, image_names, classes, images=None):
+        """
+        Add a batch of detections.
+
+        Args:
+            image_names (list): Image name of each detection
+            classes (numpy.ndarray): Class ID of each detection
+            images (list): Optional names of all images of the batch, including
+                images without detections, counted per well
+
+        Returns:
+            int: Number of detections added
+        """
+        classes = np.asarray(classes, dtype=np.int64)
+        unique_names, inverse = np.unique(np.asarray(image_names), return_inverse=True)
+        keys = [self.parse_name(name) for name in unique_names]
+        valid = np.array([key is not None for key in keys], dtype=bool)
+        if not valid.all():
+            print(f"{int((~valid).sum())} image names do not match {self.filename_pattern}, skipping...")
+        keep = valid[inverse] & (classes >= 0) & (classes < N_CLASSES)
+
+        well_ids = self._well_ids([key for key in keys if key is not None])
+        name_to_well = np.full(len(unique_names), -1, dtype=np.int64)
+        name_to_well[valid] = well_ids
+        codes = name_to_well[inverse[keep]] * N_CLASSES + classes[keep]
+        self.counts += np.bincount(codes, minlength=self.counts.size).reshape(self.counts.shape)
+
+        if images:
+            image_keys = [self.parse_name(name) for name in images]
+            image_wells = self._well_ids([key for key in image_keys if key is not None])
+            self.images += np.bincount(image_wells, minlength=len(self.images))
+        return int(keep.sum())
+
+    def add_folder(self, labels_folder, conf_thres=0.25):
+        """
+        Add every prediction file not added before.
+
+        Returns:
+            int: Number of new files
+        """
+        names, classes, images = [], [], []
+        for path in iter_files(labels_folder, ('.txt',)):
+            name = os.path.basename(path)
+            if name in self.seen:
+                continue
+            file_classes = read_prediction_classes(path, conf_thres)
+            names.extend([name] * len(file_classes))
+            classes.append(file_classes)
+            images.append(name)
+            self.seen.add(name)
+        if images:
+            self.add_detections(names, np.concatenate(classes), images)
+        return len(images)
+
+    def save(self, path):
+        np.savez(path, counts=self.counts, images=self.images)
+        with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+            json.dump({"filename_pattern": self.filename_pattern, "wells": self.wells,
+                       "seen": sorted(self.seen)}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.splitext(path)[0] + '.json') as f:
+            meta = json.load(f)
+        aggregator = cls(meta["filename_pattern"])
+        aggregator.wells = [tuple(key) for key in meta["wells"]]
+        aggregator.well_index = {key: i for i, key in enumerate(aggregator.wells)}
+        aggregator.seen = set(meta["seen"])
+        with np.load(path) as arrays:
+            aggregator.counts = arrays["counts"]
+            aggregator.images = arrays["images"]
+        return aggregator
+
+def _control_stats(values, robust):
+    if len(values) == 0:
+        return np.nan, np.nan
+    if robust:
+        center = np.median(values)
+        # 1.4826 * MAD estimates the standard deviation of normal data
+        return center, 1.4826 * np.median(np.abs(values - center))
+    return values.mean(), values.std(ddof=1) if len(values) > 1 else np.nan
+
+def score_wells(aggregator, layout, robust=False, min_cells=20):
+    """
+    DC and M.C ratios per well and their z-scores against the plate's negative controls.
+
+    Args:
+        aggregator (ScreeningAggregator): Aggregated counts
+        layout (dict): Output of read_layout
+        robust (bool): Use median and MAD of the controls instead of mean and std
+        min_cells (int): Wells with fewer detected cells get no z-score
+
+    Returns:
+        list: One dict per well
+    """
+    counts = aggregator.counts.astype(np.float64)
+    totals = counts.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dc_ratio = counts[:, DC_CLASS] / totals
+        mc_ratio = counts[:, MC_CLASS] / totals
+
+    plates = np.array([plate for plate, _ in aggregator.wells])
+    roles = np.array([layout.get(key, {}).get("role", "sample") for key in aggregator.wells])
+    usable = totals >= min_cells
+    z_dc = np.full(len(totals), np.nan)
+    for plate in np.unique(plates):
+        on_plate = plates == plate
+        center, scale = _control_stats(dc_ratio[on_plate & usable & (roles == "negative")], robust)
+        if scale and np.isfinite(scale):
+            z_dc[on_plate & usable] = (dc_ratio[on_plate & usable] - center) / scale
+
+    rows = []
+    for i, (plate, well) in enumerate(aggregator.wells):
+        rows.append({"plate": plate, "well": well, "compound": layout.get((plate, well), {}).get("compound", ""),
+                     "role": roles[i], "images": int(aggregator.images[i]),
+                     "sc": int(counts[i, SC_CLASS]), "dc": int(counts[i, DC_CLASS]), "mc": int(counts[i, MC_CLASS]),
+                     "dc_ratio": float(dc_ratio[i]), "mc_ratio": float(mc_ratio[i]), "z_dc": float(z_dc[i])})
+    return rows
+
+def summarize_plates(well_rows, robust=False, min_cells=20):
+    """
+    Roll wells up to plates for plate-level quality control.
+
+    Per plate: well, image and class totals, the pooled DC and M.C ratios,
+    the DC ratio of the negative and positive controls (wells with at least
+    ``min_cells`` cells, as in score_wells) and the Z'-factor between them,
+    1 - 3 * (scale_pos + scale_neg) / |center_pos - center_neg|.
+
+    Args:
+        well_rows (list): Output of score_wells
+        robust (bool): Use median and MAD of the controls instead of mean and std
+        min_cells (int): Control wells with fewer detected cells are left out
+
+    Returns:
+        dict: Plate -> summary
+    """
+    plates = {}
+    for row in well_rows:
+        plates.setdefault(row["plate"], []).append(row)
+
+    summary = {}
+    for plate, rows in sorted(plates.items()):
+        sc, dc, mc = (sum(row[key] for row in rows) for key in ("sc", "dc", "mc"))
+        total = sc + dc + mc
+        controls = {}
+        for role in ("negative", "positive"):
+            ratios = np.array([row["dc_ratio"] for row in rows
+                               if row["role"] == role and row["sc"] + row["dc"] + row["mc"] >= min_cells])
+            center, scale = _control_stats(ratios, robust)
+            controls[role] = {"wells": len(ratios), "dc_ratio_center": float(center), "dc_ratio_scale": float(scale)}
+        separation = abs(controls["positive"]["dc_ratio_center"] - controls["negative"]["dc_ratio_center"])
+        z_prime = (1 - 3 * (controls["positive"]["dc_ratio_scale"] + controls["negative"]["dc_ratio_scale"]) / separation
+                   if separation else float('nan'))
+        summary[plate] = {"wells": len(rows), "images": sum(row["images"] for row in rows),
+                          "sc": sc, "dc": dc, "mc": mc,
+                          "dc_ratio": dc / total if total else float('nan'),
+                          "mc_ratio": mc / total if total else float('nan'),
+                          "negative_controls": controls["negative"], "positive_controls": controls["positive"],
+                          "z_prime": float(z_prime),
+                          "scored_wells": int(sum(np.isfinite(row["z_dc"]) for row in rows))}
+    return summary
+
+def call_hits(well_rows, z_threshold=3.0, min_replicates=1):
+    """
+    Roll wells up to compounds and flag hits.
+
+    A compound is a hit when at least ``min_replicates`` of its sample wells
+    have a DC z-score at or above ``z_threshold``.
+
+    Returns:
+        list: One dict per compound, hits first
+    """
+    compounds = {}
+    for row in well_rows:
+        if row["role"] != "sample" or not row["compound"]:
+            continue
+        compounds.setdefault(row["compound"], []).append(row)
+
+    results = []
+    for compound, rows in compounds.items():
+        z = np.array([row["z_dc"] for row in rows])
+        scored = z[np.isfinite(z)]
+        hit_wells = int((scored >= z_threshold).sum())
+        results.append({"compound": compound, "wells": len(rows), "scored_wells": len(scored),
+                        "plates": len({row["plate"] for row in rows}),
+                        "mean_dc_ratio": float(np.nanmean([row["dc_ratio"] for row in rows])),
+                        "mean_z_dc": float(scored.mean()) if len(scored) else float('nan'),
+                        "hit_wells": hit_wells, "hit": hit_wells >= min_replicates})
+    results.sort(key=lambda row: (not row["hit"], -np.nan_to_num(row["mean_z_dc"], nan=-np.inf)))
+    return results
+
+def write_rows(rows, path):
+    if not rows:
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate detections to wells and compounds and call ICD hits")
+    parser.add_argument("labels", help="Prediction folder (cls xc yc w h conf per line)")
+    parser.add_argument("layout", help="Plate layout CSV (plate, well, compound, role)")
+    parser.add_argument("output", help="Output folder for wells.csv, compounds.csv, plates.json and the aggregator state")
+    parser.add_argument("--filename-pattern", default=FILENAME_PATTERN)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--z", type=float, default=3.0, help="DC z-score threshold for a hit well")
+    parser.add_argument("--min-replicates", type=int, default=1)
+    parser.add_argument("--min-cells", type=int, default=20)
+    parser.add_argument("--robust", action="store_true", help="Median/MAD of the controls instead of mean/std")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    state_path = os.path.join(args.output, 'counts.npz')
+    aggregator = (ScreeningAggregator.load(state_path) if os.path.exists(state_path)
+                  else ScreeningAggregator(args.filename_pattern))
+    print(f"Added {aggregator.add_folder(args.labels, args.conf)} new prediction files")
+    aggregator.save(state_path)
+
+    wells = score_wells(aggregator, read_layout(args.layout), args.robust, args.min_cells)
+    compounds = call_hits(wells, args.z, args.min_replicates)
+    write_rows(wells, os.path.join(args.output, 'wells.csv'))
+    write_rows(compounds, os.path.join(args.output, 'compounds.csv'))
+    plates = summarize_plates(wells, args.robust, args.min_cells)
+    with open(os.path.join(args.output, 'plates.json'), 'w') as f:
+        json.dump(plates, f, indent=2)
+    for plate, summary in plates.items():
+        print(f"Plate {plate}: {summary['wells']} wells, DC ratio {summary['dc_ratio']:.3f}, "
+              f"Z' {summary['z_prime']:.2f}")
+    hits = [row for row in compounds if row["hit"]]
+    print(f"{len(wells)} wells, {len(compounds)} compounds, {len(hits)} hits")
+    for row in hits:
+        print(f"  {row['compound']}: mean z {row['mean_z_dc']:.2f}, {row['hit_wells']}/{row['scored_wells']} wells")
+
+if __name__ == "__main__":
+    main()
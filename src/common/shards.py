@@ -0,0 +1,251 @@
+import argparse
+import io
+import json
+import os
+import shutil
+import tarfile
+
+import yaml
+
+DEFAULT_SHARD_BYTES = 1024 ** 3
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+def _add_member(tar, name, data):
+    """
+    Append one member to an open tar and return the offset of its data.
+
+    Args:
+        tar (tarfile.TarFile): Tar opened for writing
+        name (str): Member name
+        data (bytes): Member content
+
+    Returns:
+        int: Byte offset of the member's data inside the shard file
+    """
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+    padded_size = -(-len(data) // BLOCK_SIZE) * BLOCK_SIZE
+    return tar.offset - padded_size
+
+def write_shards(samples, output_dir, prefix, shard_bytes=DEFAULT_SHARD_BYTES, sidecar_extensions=()):
+    """
+    Pack (key, image_path, label_path) samples into tar shards with an index.
+
+    Each sample is stored as ``<key>.png`` and ``<key>.txt`` next to each other
+    (WebDataset layout), followed by its sidecars (e.g. ``<key>.npy`` of
+    stacked channel samples), so shards can be streamed sequentially with any
+    tar reader. ``<prefix>-index.json`` records the byte offset and size of
+    every member for random access.
+
+    Args:
+        samples (iterable): (key, image_path, label_path) tuples
+        output_dir (str): Output directory for shards and index
+        prefix (str): Shard name prefix (e.g. "train")
+        shard_bytes (int): Approximate maximum size of one shard
+        sidecar_extensions (tuple): Files next to each image packed with it, as in write_fold_set
+
+    Raises:
+        FileNotFoundError: If a sample lacks one of its sidecars
+
+    Returns:
+        str: Path of the written index file
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shard_names = []
+    index = []
+    tar = None
+
+    try:
+        for key, image_path, label_path in samples:
+            if tar is None or tar.offset >= shard_bytes:
+                if tar is not None:
+                    tar.close()
+                shard_names.append(f"{prefix}-{len(shard_names):05d}.tar")
+                tar = tarfile.open(os.path.join(output_dir, shard_names[-1]), 'w', format=tarfile.USTAR_FORMAT)
+
+            with open(image_path, 'rb') as f:
+                image_data = f.read()
+            label_data = b''
+            if os.path.exists(label_path):
+                with open(label_path, 'rb') as f:
+                    label_data = f.read()
+
+            image_ext = os.path.splitext(image_path)[1]
+            image_offset = _add_member(tar, key + image_ext, image_data)
+            label_offset = _add_member(tar, key + '.txt', label_data)
+            sidecars = []
+            for extension in sidecar_extensions:
+                with open(os.path.splitext(image_path)[0] + extension, 'rb') as f:
+                    sidecar_data = f.read()
+                sidecars.append([_add_member(tar, key + extension, sidecar_data), len(sidecar_data)])
+            index.append([key, len(shard_names) - 1, image_ext,
+                          image_offset, len(image_data), label_offset, len(label_data), sidecars])
+    finally:
+        if tar is not None:
+            tar.close()
+
+    index_path = os.path.join(output_dir, f"{prefix}-index.json")
+    with open(index_path, 'w') as f:
+        json.dump({"shards": shard_names, "sidecar_extensions": list(sidecar_extensions), "samples": index}, f)
+    return index_path
+
+def pack_fold(fold_path, output_dir, shard_bytes=DEFAULT_SHARD_BYTES, sidecar_extensions=()):
+    """
+    Pack one fold of split_for_yolo_detection into shards.
+
+    Args:
+        fold_path (str): Fold directory (e.g. split_for_yolo_detection/fold_0)
+        output_dir (str): Output directory for the fold's shards
+        shard_bytes (int): Approximate maximum size of one shard
+        sidecar_extensions (tuple): Files next to each image packed with it
+            (".npy" for stacked channel folds, as passed to write_fold_set)
+
+    Raises:
+        ValueError: If the fold holds .npy sidecars that would not be packed
+    """
+    for set_name in ("train", "valid"):
+        images_path = os.path.join(fold_path, set_name, "images")
+        labels_path = os.path.join(fold_path, set_name, "labels")
+        # Without its .npy sidecars a stacked fold would train on the black placeholder PNGs
+        if '.npy' not in sidecar_extensions and any(name.endswith('.npy') for name in os.listdir(images_path)):
+            raise ValueError(f"{images_path} holds .npy sidecars (stacked channels), "
+                             "pack with sidecar_extensions=('.npy',)")
+
+        def samples():
+            with open(os.path.join(fold_path, f"{set_name}.txt")) as file_list:
+                for line in file_list:
+                    image_filename = os.path.basename(line.strip())
+                    if not image_filename:
+                        continue
+                    key = os.path.splitext(image_filename)[0]
+                    yield (key, os.path.join(images_path, image_filename),
+                           os.path.join(labels_path, key + '.txt'))
+
+        write_shards(samples(), output_dir, set_name, shard_bytes, sidecar_extensions)
+
+    shutil.copy(os.path.join(fold_path, "custom.yaml"), os.path.join(output_dir, "custom.yaml"))
+    print(f"Packed {fold_path} into {output_dir}")
+
+class ShardReader:
+    """
+    Random and sequential access to samples packed by write_shards.
+    """
+
+    def __init__(self, index_path):
+        """
+        Args:
+            index_path (str): Path of a <prefix>-index.json file
+        """
+        with open(index_path) as f:
+            index = json.load(f)
+        self.shard_dir = os.path.dirname(index_path)
+        self.shards = index["shards"]
+        self.sidecar_extensions = index.get("sidecar_extensions", [])
+        self.samples = index["samples"]
+        self._files = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, i):
+        """
+        Read one sample through the index.
+
+        Args:
+            i (int): Sample position
+
+        Returns:
+            tuple: (key, image_ext, image_bytes, label_text)
+        """
+        key, shard, image_ext, image_offset, image_size, label_offset, label_size = self.samples[i][:7]
+        fd = self._fd(shard)
+        image_data = os.pread(fd, image_size, image_offset)
+        label_data = os.pread(fd, label_size, label_offset)
+        return key, image_ext, image_data, label_data.decode()
+
+    def sidecars(self, i):
+        """
+        Read the sidecars of one sample.
+
+        Returns:
+            dict: Extension -> bytes
+        """
+        sample = self.samples[i]
+        fd = self._fd(sample[1])
+        return {extension: os.pread(fd, size, offset)
+                for extension, (offset, size) in zip(self.sidecar_extensions, sample[7] if len(sample) > 7 else [])}
+
+    def __iter__(self):
+        """Yield every sample in shard order, reading each shard front to back."""
+        for i in range(len(self.samples)):
+            yield self[i]
+
+    def close(self):
+        for fd in self._files.values():
+            os.close(fd)
+        self._files.clear()
+
+    def _fd(self, shard):
+        fd = self._files.get(shard)
+        if fd is None:
+            fd = os.open(os.path.join(self.shard_dir, self.shards[shard]), os.O_RDONLY)
+            self._files[shard] = fd
+        return fd
+
+def unpack_fold(shard_dir, fold_output_path):
+    """
+    Stage a packed fold back into the directory layout train_dual.py reads.
+
+    Args:
+        shard_dir (str): Directory written by pack_fold
+        fold_output_path (str): Fold directory to create
+    """
+    for set_name in ("train", "valid"):
+        set_images_path = os.path.join(fold_output_path, set_name, "images")
+        set_labels_path = os.path.join(fold_output_path, set_name, "labels")
+        os.makedirs(set_images_path, exist_ok=True)
+        os.makedirs(set_labels_path, exist_ok=True)
+
+        reader = ShardReader(os.path.join(shard_dir, f"{set_name}-index.json"))
+        with open(os.path.join(fold_output_path, f"{set_name}.txt"), 'w') as file_list_f:
+            for i, (key, image_ext, image_data, label_text) in enumerate(reader):
+                image_filename = key + image_ext
+                with open(os.path.join(set_images_path, image_filename), 'wb') as f:
+                    f.write(image_data)
+                for extension, sidecar_data in reader.sidecars(i).items():
+                    with open(os.path.join(set_images_path, key + extension), 'wb') as f:
+                        f.write(sidecar_data)
+                with open(os.path.join(set_labels_path, key + '.txt'), 'w') as f:
+                    f.write(label_text)
+                file_list_f.write(os.path.join(set_images_path, image_filename) + '\n')
+        reader.close()
+
+    with open(os.path.join(shard_dir, "custom.yaml")) as f:
+        yaml_data = yaml.safe_load(f)
+    yaml_data["path"] = fold_output_path
+    with open(os.path.join(fold_output_path, "custom.yaml"), "w") as f:
+        yaml.dump(yaml_data, f)
+    print(f"Unpacked {shard_dir} into {fold_output_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack or unpack fold data as tar shards")
+    parser.add_argument("command", choices=["pack", "unpack"])
+    parser.add_argument("source", help="split_for_yolo_detection directory (pack) or shard directory (unpack)")
+    parser.add_argument("destination", help="Shard directory (pack) or split_for_yolo_detection directory (unpack)")
+    parser.add_argument("--shard-bytes", type=int, default=DEFAULT_SHARD_BYTES)
+    parser.add_argument("--sidecar-extensions", nargs="*", default=[], help="e.g. .npy for stacked channels")
+    args = parser.parse_args()
+
+    for fold_name in sorted(os.listdir(args.source)):
+        if not fold_name.startswith("fold_"):
+            continue
+        source = os.path.join(args.source, fold_name)
+        destination = os.path.join(args.destination, fold_name)
+        if args.command == "pack":
+            pack_fold(source, destination, args.shard_bytes, tuple(args.sidecar_extensions))
+        else:
+            unpack_fold(source, destination)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from common.channels import read_channel, to_rgb16, SCALE_8_TO_16
+from common.online_merge import group_channel_files
+from common.streaming import stream_stages
+
+STACKED_HYP_NAME = 'hyp.stacked.yaml'
+
+def channel_to_uint8(array):
+    """
+    Reduce a channel image to one 8-bit plane.
+
+    Colour-coded fluorescence images keep their signal in one colour band, so
+    the brightest band is used rather than the luminance.
+
+    Args:
+        array (numpy.ndarray): Array from read_channel
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (H, W)
+    """
+    return np.rint(to_rgb16(array).max(axis=2) / SCALE_8_TO_16).astype(np.uint8)
+
+def stack_channel_images(images_folder, output_folder, max_queue=4):
+    """
+    Stack DIC, RFP and GFP as the three channels of one .npy array per sample.
+
+    Each sample gets ``<base>.npy`` of shape (H, W, 3) in DIC, RFP, GFP order,
+    plus an all-black ``<base>.png`` of the same size. yolov9's dataloader
+    reads the .npy next to an image in place of the image itself, while the
+    PNG (a few KB) keeps the fold lists, label checks and rectangular
+    batching working unchanged.
+
+    Args:
+        images_folder (str): Folder containing all channel images
+        output_folder (str): Output folder for the stacked samples
+        max_queue (int): Number of decoded samples buffered before saving
+
+    Returns:
+        int: Number of stacked samples
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    groups = group_channel_files(images_folder)
+
+    def decode(item):
+        base_name, paths = item
+        planes = [channel_to_uint8(read_channel(paths[image_type])) for image_type in ('DIC', 'RFP', 'GFP')]
+        return base_name, np.stack(planes, axis=2)
+
+    def save(decoded):
+        base_name, stacked = decoded
+        np.save(os.path.join(output_folder, base_name + '.npy'), stacked)
+        height, width = stacked.shape[:2]
+        Image.new('L', (width, height)).save(os.path.join(output_folder, base_name + '.png'))
+
+    for _ in stream_stages(groups.items(), [decode, save], max_queue=max_queue):
+        pass
+    print(f"Stacked channels of {len(groups)} samples in {output_folder}")
+    return len(groups)
+
+def write_stacked_hyp(base_hyp='data/hyps/hyp.scratch-high.yaml', output_path=None):
+    """
+    Copy a yolov9 hyperparameter file with HSV augmentation disabled.
+
+    HSV jitter treats the three channels as colours, which mixes the DIC,
+    RFP and GFP planes of stacked input.
+
+    Args:
+        base_hyp (str): Hyperparameter file to start from
+        output_path (str): Output path (default: hyp.stacked.yaml next to base_hyp)
+
+    Returns:
+        str: Output path
+    """
+    with open(base_hyp) as f:
+        hyp = yaml.safe_load(f)
+    hyp.update(hsv_h=0.0, hsv_s=0.0, hsv_v=0.0)
+
+    output_path = output_path or os.path.join(os.path.dirname(base_hyp), STACKED_HYP_NAME)
+    with open(output_path, 'w') as f:
+        yaml.safe_dump(hyp, f, sort_keys=False)
+    return output_path
@@ -0,0 +1,163 @@
+import os
+import queue
+import threading
+
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+class MemoryBudget:
+    """
+    Blocking byte budget shared by the stages of a streaming pipeline.
+
+    ``acquire`` waits until enough bytes are free. An item larger than the
+    whole budget is still admitted once nothing else is held, so the pipeline
+    cannot deadlock on a single oversized image. Waiting ends without
+    acquiring once ``stop`` is set, so producers never outlive an abandoned
+    pipeline.
+    """
+
+    def __init__(self, max_bytes, stop=None):
+        """
+        Args:
+            max_bytes (int): Memory ceiling in bytes
+            stop (threading.Event): Optional event that aborts waiting in acquire
+        """
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.stop = stop or threading.Event()
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes):
+        """
+        Returns:
+            bool: True once the bytes are held, False if stop was set first
+        """
+        with self._condition:
+            while self.used > 0 and self.used + nbytes > self.max_bytes:
+                if self.stop.is_set():
+                    return False
+                self._condition.wait(timeout=0.1)
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes):
+        with self._condition:
+            self.used -= nbytes
+            self._condition.notify_all()
+
+def iter_files(folder, extensions):
+    """
+    Lazily yield paths of files in a folder with one of the given extensions.
+
+    Args:
+        folder (str): Folder to scan
+        extensions (tuple): Lower-case extensions including the dot (e.g. ('.png',))
+
+    Yields:
+        str: File path
+    """
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(extensions):
+                yield entry.path
+
+def stream_stages(source, stages, max_queue=4, memory_limit=None, sizeof=None):
+    """
+    Run items through a chain of stages, one thread per stage.
+
+    Stages are connected by bounded queues, so a slow stage blocks the ones
+    before it instead of letting work pile up in memory. With ``memory_limit``
+    set, the first stage waits until the bytes an item will take (estimated
+    by ``sizeof`` before the item is processed, e.g. from image headers) fit
+    in the budget; they are released once the caller has consumed the final
+    result. When the caller stops consuming, or a stage fails, every thread
+    stops waiting and exits.
+
+    Args:
+        source (iterable): Input items, consumed lazily
+        stages (list): Callables applied in order; returning None drops the item
+        max_queue (int): Capacity of each inter-stage queue
+        memory_limit (int): Optional ceiling in bytes for items in flight
+        sizeof (callable): Returns the estimated size in bytes of a source item
+            once the first stage has processed it
+
+    Yields:
+        Results of the last stage, in input order
+    """
+    stop = threading.Event()
+    budget = MemoryBudget(memory_limit, stop) if memory_limit else None
+    queues = [queue.Queue(maxsize=max_queue) for _ in range(len(stages) + 1)]
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], (item, 0)):
+                    return
+        except Exception as error:
+            put(queues[0], _Failure(error))
+        put(queues[0], _DONE)
+
+    def run(index, stage):
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            message = get(inbox)
+            if message is _DONE or isinstance(message, _Failure):
+                put(outbox, message)
+                return
+            item, nbytes = message
+            try:
+                if budget is not None and index == 0:
+                    nbytes = sizeof(item) if sizeof else 0
+                    if not budget.acquire(nbytes):
+                        return
+                result = stage(item)
+            except Exception as error:
+                if budget is not None and nbytes:
+                    budget.release(nbytes)
+                put(outbox, _Failure(error))
+                return
+            if result is None:
+                if budget is not None and nbytes:
+                    budget.release(nbytes)
+                continue
+            if not put(outbox, (result, nbytes)):
+                return
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=run, args=(i, stage), daemon=True) for i, stage in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            message = queues[-1].get()
+            if message is _DONE:
+                break
+            if isinstance(message, _Failure):
+                raise message.error
+            result, nbytes = message
+            yield result
+            if budget is not None and nbytes:
+                budget.release(nbytes)
+    finally:
+        stop.set()
@@ -0,0 +1,377 @@
+import argparse
+import csv
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import time
+
+import yaml
+
+from common.file_ops import run_bounded
+from common.results_store import ResultsStore
+from common.training import FoldManifest
+
+DEFAULT_METRIC = 'metrics/mAP_0.5:0.95'
+
+# results.csv columns stored per trial, under the results store's metric names
+STORED_COLUMNS = {'metrics/mAP_0.5': 'map50', 'metrics/mAP_0.5:0.95': 'map50_95',
+                  'metrics/precision': 'precision', 'metrics/recall': 'recall'}
+
+def load_spec(path):
+    """
+    Read a sweep specification.
+
+    Keys: ``base`` (fixed train_dual.py arguments, e.g. cfg, weights, hyp,
+    epochs, batch), ``space`` (parameters to search), ``trials``, ``folds``,
+    ``seed``, ``metric`` and optionally ``merge_cache`` (channel cache folder,
+    needed for merge.* parameters) and ``stacked`` (true for folds split from
+    stacked channel samples, whose .npy sidecars are the training input). Search space entries are a list (choice),
+    ``{uniform: [low, high]}``, ``{log_uniform: [low, high]}``,
+    ``{int: [low, high]}`` or a fixed value. Names are train_dual.py
+    arguments (``img``, ``close-mosaic``), ``hyp.<key>`` for a key of the
+    hyperparameter file or ``merge.<name>`` for an online merge parameter.
+
+    Args:
+        path (str): YAML file
+
+    Returns:
+        dict: Specification with defaults filled in
+    """
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    spec.setdefault('base', {})
+    spec.setdefault('space', {})
+    spec.setdefault('trials', 20)
+    spec.setdefault('folds', [0])
+    spec.setdefault('seed', 0)
+    spec.setdefault('metric', DEFAULT_METRIC)
+    spec.setdefault('stacked', False)
+    spec['base'].setdefault('hyp', 'hyp.scratch-high.yaml')
+    return spec
+
+def sample_value(domain, rng):
+    if isinstance(domain, list):
+        return rng.choice(domain)
+    if isinstance(domain, dict):
+        (kind, (low, high)), = domain.items()
+        if kind == 'uniform':
+            return rng.uniform(low, high)
+        if kind == 'log_uniform':
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        if kind == 'int':
+            return rng.randint(low, high)
+        raise ValueError(f"Unknown search space type: {kind}")
+    return domain
+
+def sample_configs(space, n_trials, seed=0):
+    """
+    Draw trial configurations with a local RNG, so a sweep is reproducible.
+
+    Args:
+        space (dict): Parameter name -> domain (see load_spec)
+        n_trials (int): Number of configurations
+        seed (int): RNG seed
+
+    Returns:
+        list: Parameter name -> value dicts
+    """
+    rng = random.Random(seed)
+    return [{name: sample_value(domain, rng) for name, domain in sorted(space.items())} for _ in range(n_trials)]
+
+def write_trial_hyp(base_hyp, overrides, output_path):
+    """
+    Copy a hyperparameter file with some keys replaced.
+
+    Like train_dual.py, a bare file name is also looked up in data/hyps.
+
+    Returns:
+        str: Output path
+    """
+    if not os.path.exists(base_hyp):
+        base_hyp = os.path.join('data', 'hyps', base_hyp)
+    with open(base_hyp) as f:
+        hyp = yaml.safe_load(f)
+    unknown = set(overrides) - set(hyp)
+    if unknown:
+        raise ValueError(f"Keys not in {base_hyp}: {sorted(unknown)}")
+    hyp.update(overrides)
+    with open(output_path, 'w') as f:
+        yaml.safe_dump(hyp, f, sort_keys=False)
+    return output_path
+
+def trial_command(spec, config, fold, device, project, name):
+    """
+    train_dual.py command of one trial on one fold.
+
+    Every trial trains on the existing ``split_for_yolo_detection/fold_k``
+    and reuses one image cache: the disk cache (``--cache disk``) unless merge
+    parameters are searched, in which case all trials merge from the same
+    channel cache through the online merge launcher. Stacked folds already
+    hold their .npy inputs and get no disk cache.
+
+    Args:
+        spec (dict): Sweep specification
+        config (dict): Sampled parameters
+        fold (int): Fold number
+        device (str): Value of --device
+        project (str): Value of --project
+        name (str): Value of --name
+
+    Returns:
+        list: Command
+    """
+    args = dict(spec['base'])
+    hyp = {key[len('hyp.'):]: value for key, value in config.items() if key.startswith('hyp.')}
+    merge = {key[len('merge.'):]: value for key, value in config.items() if key.startswith('merge.')}
+    args.update({key: value for key, value in config.items() if not key.startswith(('hyp.', 'merge.'))})
+    if hyp:
+        os.makedirs(os.path.join(project, name), exist_ok=True)
+        args['hyp'] = write_trial_hyp(args['hyp'], hyp, os.path.join(project, name, 'hyp.yaml'))
+
+    cmd = ['python']
+    if merge or spec.get('merge_cache'):
+        from common import online_merge
+
+        unknown = set(merge) - set(online_merge.DEFAULT_MERGE)
+        if unknown:
+            raise ValueError(f"Unknown merge parameters: {sorted(unknown)}")
+        if not spec.get('merge_cache'):
+            raise ValueError("merge.* parameters need merge_cache in the sweep specification")
+        cmd += [online_merge.__file__, '--cache-dir', spec['merge_cache']]
+        for key, value in sorted(merge.items()):
+            cmd += ['--merge', f'{key}={value}']
+    elif not spec.get('stacked'):
+        args.setdefault('cache', 'disk')
+
+    cmd += ['train_dual.py', '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
+            '--device', str(device), '--project', project, '--name', name, '--exist-ok']
+    for key, value in args.items():
+        cmd += [f'--{key}', str(value)]
+    return cmd
+
+def read_epoch_metrics(results_csv):
+    """
+    Per-epoch metrics from a yolov9 run's results.csv.
+
+    Returns:
+        list: One dict per finished epoch (column -> float)
+    """
+    if not os.path.exists(results_csv):
+        return []
+    with open(results_csv, newline='') as f:
+        rows = list(csv.reader(f))
+    if len(rows) < 2:
+        return []
+    header = [column.strip() for column in rows[0]]
+    epochs = []
+    for row in rows[1:]:
+        try:
+            epochs.append({column: float(value) for column, value in zip(header, row)})
+        except ValueError:
+            # A row being written
+            break
+    return epochs
+
+def warm_image_cache(fold_path, io_workers=8):
+    """
+    Write yolov9's --cache disk .npy files of a fold once, before trials start.
+
+    Concurrent trials would otherwise race to write the same files. The
+    cache shares its ``<image>.npy`` paths with stacked channel samples, so
+    folds with stacked sidecars must not be warmed (see check_stacked_sidecars).
+
+    Args:
+        fold_path (str): Fold directory with train.txt and valid.txt
+        io_workers (int): Concurrent decodes
+
+    Returns:
+        int: Number of files written
+    """
+    import cv2
+    import numpy as np
+
+    def cache(image_path):
+        npy_path = os.path.splitext(image_path)[0] + '.npy'
+        if not os.path.exists(npy_path):
+            np.save(npy_path, cv2.imread(image_path))
+
+    paths = []
+    for list_name in ('train.txt', 'valid.txt'):
+        with open(os.path.join(fold_path, list_name)) as f:
+            paths += [line.strip() for line in f if line.strip()]
+    missing = [(path,) for path in paths if not os.path.exists(os.path.splitext(path)[0] + '.npy')]
+    run_bounded(cache, missing, max_workers=io_workers)
+    return len(missing)
+
+def check_stacked_sidecars(fold_path):
+    """
+    Make sure every image of a stacked fold has its .npy sidecar.
+
+    A missing sidecar would make yolov9 train on the all-black placeholder PNG.
+
+    Raises:
+        FileNotFoundError: If any sidecar is missing
+    """
+    paths = []
+    for list_name in ('train.txt', 'valid.txt'):
+        with open(os.path.join(fold_path, list_name)) as f:
+            paths += [line.strip() for line in f if line.strip()]
+    missing = [path for path in paths if not os.path.exists(os.path.splitext(path)[0] + '.npy')]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} images of {fold_path} have no stacked .npy sidecar, "
+                                f"e.g. {missing[0]}")
+
+class MedianStopper:
+    """
+    Median stopping rule over the trials of the same fold.
+
+    After ``grace_epochs``, a trial is stopped when its best metric so far is
+    below the median of the best-so-far values other trials had at the same
+    epoch, provided at least ``min_trials`` other trials got that far.
+    """
+
+    def __init__(self, grace_epochs=10, min_trials=3):
+        self.grace_epochs = grace_epochs
+        self.min_trials = min_trials
+
+    def should_stop(self, curve, other_curves):
+        """
+        Args:
+            curve (list): Metric per epoch of the trial
+            other_curves (list): Metric curves of the other trials of the fold
+
+        Returns:
+            bool: True if the trial should be stopped
+        """
+        epoch = len(curve)
+        if epoch <= self.grace_epochs:
+            return False
+        reference = [max(other[:epoch]) for other in other_curves if len(other) >= epoch]
+        return len(reference) >= self.min_trials and max(curve) < statistics.median(reference)
+
+def run_sweep(spec, slots, sweep_dir='runs/sweep', stopper=None, poll_interval=30, store=None, task='SC'):
+    """
+    Run every trial of a sweep on the given device slots.
+
+    Trials are (configuration, fold) pairs, launched as soon as a slot is
+    free. results.csv of every running trial is polled, and a trial that
+    falls behind under the stopping rule is terminated. State is kept in
+    ``<sweep_dir>/trials.json``; rerunning the sweep skips trials that
+    completed or were stopped and restarts the others from scratch (the run
+    directory of an interrupted or failed trial is removed first, since
+    yolov9 appends to an existing results.csv).
+
+    Args:
+        spec (dict): Output of load_spec
+        slots (list): One --device value per concurrent trial (e.g. ["0", "1"] or ["cpu"])
+        sweep_dir (str): Project directory of the trial runs (inside the yolov9 checkout)
+        stopper (MedianStopper): Early stopping rule (None disables it)
+        poll_interval (float): Seconds between polls of results.csv
+        store (ResultsStore): Optional store; each finished trial is recorded with mode "sweep"
+        task (str): Task recorded in the store
+
+    Returns:
+        list: One dict per trial (name, fold, config, status, best metric)
+    """
+    configs = sample_configs(spec['space'], spec['trials'], spec['seed'])
+    manifest = FoldManifest(os.path.join(sweep_dir, 'trials.json'))
+    metric = spec['metric']
+    if spec.get('stacked'):
+        for fold in spec['folds']:
+            check_stacked_sidecars(f'./split_for_yolo_detection/fold_{fold}')
+    elif not any(key.startswith('merge.') for key in spec['space']) and not spec.get('merge_cache'):
+        for fold in spec['folds']:
+            print(f"Cached {warm_image_cache(f'./split_for_yolo_detection/fold_{fold}')} images of fold {fold}")
+
+    trials = [(f'trial_{k:03d}_fold_{fold}', k, fold) for k, _ in enumerate(configs) for fold in spec['folds']]
+    for name, k, fold in trials:
+        if not manifest.get(name):
+            manifest.update(name, trial=k, fold=fold, config=configs[k], status='pending', curve=[])
+    pending = [trial for trial in trials if manifest.get(trial[0])['status'] not in ('completed', 'stopped')]
+    running = {}
+    free_slots = list(slots)
+
+    def fold_curves(fold, exclude):
+        return [entry['curve'] for key, entry in manifest.folds.items()
+                if entry['fold'] == fold and key != exclude and entry['curve']]
+
+    def finish(name, k, fold, status):
+        entry = manifest.get(name)
+        manifest.update(name, status=status)
+        epochs = read_epoch_metrics(os.path.join(sweep_dir, name, 'results.csv'))
+        if store is not None and epochs:
+            best = max(epochs, key=lambda row: row.get(metric, float('-inf')))
+            store.record_fold(f"{spec.get('name', 'sweep')}/trial_{k:03d}", task, 'sweep', fold,
+                              {stored: best[column] for column, stored in STORED_COLUMNS.items() if column in best})
+        print(f"{name} {status} after {len(entry['curve'])} epochs "
+              f"(best {metric}: {max(entry['curve'], default=float('nan')):.4f})")
+
+    while pending or running:
+        while pending and free_slots:
+            name, k, fold = pending.pop(0)
+            device = free_slots.pop(0)
+            shutil.rmtree(os.path.join(sweep_dir, name), ignore_errors=True)
+            cmd = trial_command(spec, configs[k], fold, device, sweep_dir, name)
+            print(f"Starting {name} on device {device}: {configs[k]}")
+            manifest.update(name, status='running', device=device, curve=[])
+            running[name] = (k, fold, device, subprocess.Popen(cmd))
+
+        time.sleep(poll_interval)
+        for name, (k, fold, device, process) in list(running.items()):
+            epochs = read_epoch_metrics(os.path.join(sweep_dir, name, 'results.csv'))
+            curve = [row[metric] for row in epochs if metric in row]
+            manifest.update(name, curve=curve)
+
+            returncode = process.poll()
+            if returncode is not None:
+                finish(name, k, fold, 'completed' if returncode == 0 else 'failed')
+            elif stopper is not None and stopper.should_stop(curve, fold_curves(fold, name)):
+                process.terminate()
+                process.wait()
+                finish(name, k, fold, 'stopped')
+            else:
+                continue
+            del running[name]
+            free_slots.append(device)
+
+    return [{"name": name, "fold": fold, "config": configs[k], "status": manifest.get(name)['status'],
+             "best": max(manifest.get(name)['curve'], default=None)} for name, k, fold in trials]
+
+def print_leaderboard(results, top=10):
+    """
+    Print the best configurations, averaged over their folds.
+    """
+    by_config = {}
+    for row in results:
+        if row['best'] is not None:
+            by_config.setdefault(row['name'].rsplit('_fold_', 1)[0], (row['config'], []))[1].append(row['best'])
+    ranked = sorted(by_config.items(), key=lambda item: -statistics.mean(item[1][1]))
+    for trial, (config, values) in ranked[:top]:
+        print(f"{trial}: {statistics.mean(values):.4f} over {len(values)} folds  {config}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep over train_dual.py on the existing folds")
+    parser.add_argument("spec", help="Sweep specification (YAML)")
+    parser.add_argument("--slots", nargs="+", default=["0"], help="--device value of each concurrent trial")
+    parser.add_argument("--sweep-dir", default="runs/sweep")
+    parser.add_argument("--grace-epochs", type=int, default=10)
+    parser.add_argument("--min-trials", type=int, default=3)
+    parser.add_argument("--no-early-stop", action="store_true")
+    parser.add_argument("--poll", type=float, default=30, help="Seconds between results.csv polls")
+    parser.add_argument("--task", default="SC", help="Task recorded in the results store")
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    spec.setdefault('name', os.path.splitext(os.path.basename(args.spec))[0])
+    stopper = None if args.no_early_stop else MedianStopper(args.grace_epochs, args.min_trials)
+
+    store = ResultsStore()
+    results = run_sweep(spec, args.slots, os.path.join(args.sweep_dir, spec['name']), stopper,
+                        args.poll, store, args.task)
+    print_leaderboard(results)
+
+if __name__ == "__main__":
+    main()
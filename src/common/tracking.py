@@ -0,0 +1,453 @@
+import argparse
+import csv
+import json
+import os
+import pickle
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from common.preprocess import extract_device_id
+from common.streaming import iter_files
+
+# Tracking classes, as predicted by the three-class ALL model (S.C, D.C, M.C)
+SC_CLASS = 0
+DC_CLASS = 1
+FRAME_PATTERN = r'(\d+)(?!.*\d)'  # Last number in the file stem
+
+def parse_frame_name(stem, frame_pattern=FRAME_PATTERN):
+    """
+    Split an image stem into its device ID and frame index.
+
+    Args:
+        stem (str): Image or label file name without extension
+        frame_pattern (str): Regex whose first group is the frame index,
+            searched in the part of the stem after the device ID
+
+    Returns:
+        tuple: (device_id, frame_index), or (None, None) if either is missing
+    """
+    device_id = extract_device_id(stem + '.txt')
+    if device_id is None:
+        return None, None
+    match = re.search(frame_pattern, stem[len(device_id):])
+    return (device_id, int(match.group(1))) if match else (None, None)
+
+def read_detections(path, conf_thres=0.25):
+    """
+    Read a YOLO prediction file (cls xc yc w h conf).
+
+    Returns:
+        numpy.ndarray: (K, 6) float array of detections above conf_thres
+    """
+    with open(path) as f:
+        rows = [line.split() for line in f if line.strip()]
+    detections = np.array(rows, dtype=np.float32).reshape(-1, 6)
+    return detections[detections[:, 5] >= conf_thres]
+
+def remap_classes(detections, class_map):
+    """
+    Translate model classes to tracking classes.
+
+    The SC and DC models each predict their cell type as class 0, so their
+    detections must be mapped to SC_CLASS and DC_CLASS before tracking.
+
+    Args:
+        detections (numpy.ndarray): (K, 6) array of cls, xc, yc, w, h, conf
+        class_map (dict): Model class -> tracking class; None keeps the classes.
+            Detections of classes missing from the map are dropped
+
+    Returns:
+        numpy.ndarray: Detections with tracking classes
+    """
+    if class_map is None:
+        return detections
+    keep = np.array([int(cls) in class_map for cls in detections[:, 0]], dtype=bool)
+    detections = detections[keep].copy()
+    detections[:, 0] = [class_map[int(cls)] for cls in detections[:, 0]]
+    return detections
+
+def _iou(box, boxes):
+    # xywh box against (N, 4) xywh boxes
+    top_left = np.maximum(box[:2] - box[2:] / 2, boxes[:, :2] - boxes[:, 2:] / 2)
+    bottom_right = np.minimum(box[:2] + box[2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2)
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=1)
+    return inter / (box[2:].prod() + boxes[:, 2:].prod(axis=1) - inter + 1e-16)
+
+class Track:
+    """
+    One cell followed across frames.
+    """
+
+    def __init__(self, track_id, frame, detection):
+        self.track_id = track_id
+        self.frames = [frame]
+        self.detections = [detection]
+        self.seen_sc = int(detection[0]) == SC_CLASS
+        self.dc_streak = int(int(detection[0]) == DC_CLASS)
+        self.induction_frame = None
+
+    @property
+    def box(self):
+        return self.detections[-1][1:5]
+
+    @property
+    def last_frame(self):
+        return self.frames[-1]
+
+    def update(self, frame, detection, confirm_frames):
+        self.frames.append(frame)
+        self.detections.append(detection)
+        cls = int(detection[0])
+        self.dc_streak = self.dc_streak + 1 if cls == DC_CLASS else 0
+        self.seen_sc = self.seen_sc or cls == SC_CLASS
+        # seen_sc can only come from frames before the current DC streak
+        if self.induction_frame is None and self.seen_sc and self.dc_streak >= confirm_frames:
+            # Induction is dated to the first frame of the confirmed DC streak
+            self.induction_frame = self.frames[-self.dc_streak]
+
+    def summary(self):
+        classes = [int(detection[0]) for detection in self.detections]
+        return {"track_id": self.track_id, "first_frame": self.frames[0], "last_frame": self.frames[-1],
+                "n_frames": len(self.frames), "initial_class": classes[0], "final_class": classes[-1],
+                "induction_frame": self.induction_frame,
+                "frames_to_induction": None if self.induction_frame is None
+                else self.induction_frame - self.frames[0]}
+
+class DeviceTracker:
+    """
+    IoU tracker for the frames of one device, updated one frame at a time.
+
+    Active tracks are bucketed on a grid by box centre, so each detection is
+    only compared with tracks in its own and neighbouring cells. For cells
+    that move less than a grid cell between frames this keeps the cost of a
+    frame proportional to its number of detections. Candidate pairs are
+    assigned with the Hungarian algorithm (or greedily by IoU).
+    """
+
+    def __init__(self, iou_thres=0.3, max_age=2, confirm_frames=2, cell_size=0.05, method='hungarian'):
+        """
+        Args:
+            iou_thres (float): Minimum IoU to link a detection to a track
+            max_age (int): Frames a track survives without a matching detection
+            confirm_frames (int): Consecutive DC frames that confirm an SC to DC induction
+            cell_size (float): Grid cell size in normalized image coordinates
+            method (str): "hungarian" or "greedy"
+        """
+        self.iou_thres = iou_thres
+        self.max_age = max_age
+        self.confirm_frames = confirm_frames
+        self.cell_size = cell_size
+        self.method = method
+        self.active = {}
+        self.finished = []
+        self.next_id = 0
+        self.last_frame = None
+
+    def _cell(self, box):
+        return int(box[0] // self.cell_size), int(box[1] // self.cell_size)
+
+    def _candidates(self, detections):
+        grid = defaultdict(list)
+        for track_id, track in self.active.items():
+            grid[self._cell(track.box)].append(track_id)
+
+        pairs = []
+        for d, detection in enumerate(detections):
+            cx, cy = self._cell(detection[1:5])
+            track_ids = [track_id for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                         for track_id in grid.get((cx + dx, cy + dy), ())]
+            if not track_ids:
+                continue
+            ious = _iou(detection[1:5], np.array([self.active[track_id].box for track_id in track_ids]))
+            pairs += [(iou, track_id, d) for track_id, iou in zip(track_ids, ious) if iou >= self.iou_thres]
+        return pairs
+
+    def _assign(self, pairs):
+        if not pairs:
+            return []
+        if self.method == 'greedy':
+            matches, used_tracks, used_detections = [], set(), set()
+            for iou, track_id, d in sorted(pairs, reverse=True):
+                if track_id not in used_tracks and d not in used_detections:
+                    matches.append((track_id, d))
+                    used_tracks.add(track_id)
+                    used_detections.add(d)
+            return matches
+
+        from scipy.optimize import linear_sum_assignment
+
+        # Solve each connected group of candidate pairs on its own, so the
+        # assignment cost stays local however many cells share the frame
+        parent = {}
+
+        def find(node):
+            parent.setdefault(node, node)
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for _, track_id, d in pairs:
+            parent[find(('track', track_id))] = find(('detection', d))
+        components = defaultdict(list)
+        for pair in pairs:
+            components[find(('detection', pair[2]))].append(pair)
+
+        matches = []
+        for component in components.values():
+            track_ids = sorted({track_id for _, track_id, _ in component})
+            detection_ids = sorted({d for _, _, d in component})
+            row = {track_id: i for i, track_id in enumerate(track_ids)}
+            col = {d: j for j, d in enumerate(detection_ids)}
+            cost = np.ones((len(track_ids), len(detection_ids)), dtype=np.float32)
+            for iou, track_id, d in component:
+                cost[row[track_id], col[d]] = 1 - iou
+            rows, cols = linear_sum_assignment(cost)
+            matches += [(track_ids[i], detection_ids[j]) for i, j in zip(rows, cols) if cost[i, j] < 1]
+        return matches
+
+    def update(self, frame, detections):
+        """
+        Link one frame's detections to the active tracks.
+
+        Args:
+            frame (int): Frame index, greater than any frame seen before
+            detections (numpy.ndarray): (K, 6) array of cls, xc, yc, w, h, conf
+
+        Returns:
+            list: Track ID of each detection
+        """
+        if self.last_frame is not None and frame <= self.last_frame:
+            raise ValueError(f"Frame {frame} arrived after frame {self.last_frame}")
+        self.last_frame = frame
+
+        assigned = [None] * len(detections)
+        for track_id, d in self._assign(self._candidates(detections)):
+            self.active[track_id].update(frame, detections[d], self.confirm_frames)
+            assigned[d] = track_id
+
+        for d, track_id in enumerate(assigned):
+            if track_id is None:
+                track = Track(self.next_id, frame, detections[d])
+                self.active[track.track_id] = track
+                assigned[d] = track.track_id
+                self.next_id += 1
+
+        for track_id in [track_id for track_id, track in self.active.items()
+                         if frame - track.last_frame > self.max_age]:
+            self.finished.append(self.active.pop(track_id))
+        return assigned
+
+    def tracks(self):
+        return self.finished + list(self.active.values())
+
+class TrackingSession:
+    """
+    Trackers of every device, fed frame by frame and saved between runs.
+    """
+
+    def __init__(self, frame_pattern=FRAME_PATTERN, **tracker_options):
+        """
+        Args:
+            frame_pattern (str): Regex for the frame index (see parse_frame_name)
+            **tracker_options: DeviceTracker options
+        """
+        self.frame_pattern = frame_pattern
+        self.tracker_options = tracker_options
+        self.devices = {}
+
+    def configure(self, frame_pattern=None, **tracker_options):
+        """
+        Change options of a (loaded) session, including its existing trackers.
+
+        Args:
+            frame_pattern (str): New frame regex, or None to keep it
+            **tracker_options: DeviceTracker options to change
+
+        Returns:
+            dict: Option -> (old value, new value) for every option that changed
+        """
+        changed = {}
+        if frame_pattern is not None and frame_pattern != self.frame_pattern:
+            changed['frame_pattern'] = (self.frame_pattern, frame_pattern)
+            self.frame_pattern = frame_pattern
+        defaults = DeviceTracker()
+        for option, value in tracker_options.items():
+            old = self.tracker_options.get(option, getattr(defaults, option))
+            if value != old:
+                changed[option] = (old, value)
+            self.tracker_options[option] = value
+            for tracker in self.devices.values():
+                setattr(tracker, option, value)
+        return changed
+
+    def add_frame(self, stem, detections):
+        """
+        Track one frame.
+
+        Args:
+            stem (str): Image file name without extension
+            detections (numpy.ndarray): (K, 6) array of cls, xc, yc, w, h, conf
+
+        Returns:
+            list: Track ID of each detection, or None if the frame was skipped
+        """
+        device_id, frame = parse_frame_name(stem, self.frame_pattern)
+        if device_id is None:
+            print(f"Cannot parse device and frame from {stem}, skipping...")
+            return None
+        tracker = self.devices.setdefault(device_id, DeviceTracker(**self.tracker_options))
+        if tracker.last_frame is not None and frame <= tracker.last_frame:
+            return None
+        return tracker.update(frame, detections)
+
+    def add_folder(self, labels_folder, conf_thres=0.25, class_map=None):
+        """
+        Track every new prediction file of a folder, in frame order per device.
+
+        Frames at or before the last tracked frame of their device are
+        skipped, so rerunning on a growing folder only processes new frames.
+
+        Args:
+            labels_folder (str): Prediction folder
+            conf_thres (float): Minimum detection confidence
+            class_map (dict): Model class -> tracking class (see remap_classes)
+
+        Returns:
+            int: Number of frames tracked
+        """
+        return self.add_folders([(labels_folder, class_map)], conf_thres)
+
+    def add_folders(self, sources, conf_thres=0.25):
+        """
+        Track frames predicted into several folders, e.g. by the SC and DC models.
+
+        The detections of a frame are the union over the folders, each
+        remapped with its class map. A frame is only tracked once every folder
+        holds its prediction file, so a folder that lags behind on a growing
+        run does not lose its detections.
+
+        Args:
+            sources (list): (labels_folder, class_map) pairs
+            conf_thres (float): Minimum detection confidence
+
+        Returns:
+            int: Number of frames tracked
+        """
+        paths = defaultdict(dict)
+        for k, (labels_folder, _) in enumerate(sources):
+            for path in iter_files(labels_folder, ('.txt',)):
+                paths[os.path.splitext(os.path.basename(path))[0]][k] = path
+
+        frames = []
+        for stem, stem_paths in paths.items():
+            device_id, frame = parse_frame_name(stem, self.frame_pattern)
+            if device_id is not None and len(stem_paths) == len(sources):
+                frames.append((device_id, frame, stem, stem_paths))
+
+        count = 0
+        for _, _, stem, stem_paths in sorted(frames, key=lambda item: item[:3]):
+            detections = np.concatenate([remap_classes(read_detections(stem_paths[k], conf_thres), class_map)
+                                         for k, (_, class_map) in enumerate(sources)])
+            if self.add_frame(stem, detections) is not None:
+                count += 1
+        return count
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def write_trajectories(self, path):
+        """
+        Write one CSV row per tracked detection.
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["device", "track_id", "frame", "cls", "xc", "yc", "w", "h", "conf"])
+            for device_id, tracker in sorted(self.devices.items()):
+                for track in tracker.tracks():
+                    for frame, detection in zip(track.frames, track.detections):
+                        writer.writerow([device_id, track.track_id, frame, int(detection[0])]
+                                        + [f"{value:.6f}" for value in detection[1:]])
+
+    def induction_summary(self):
+        """
+        Per device: tracks, SC tracks, confirmed SC to DC inductions and their timing.
+
+        Returns:
+            dict: Device ID -> summary, each with its per-track summaries
+        """
+        summary = {}
+        for device_id, tracker in sorted(self.devices.items()):
+            tracks = [track.summary() for track in tracker.tracks()]
+            sc_tracks = [track for track in tracks if track["initial_class"] == SC_CLASS]
+            delays = [track["frames_to_induction"] for track in sc_tracks if track["induction_frame"] is not None]
+            summary[device_id] = {
+                "tracks": len(tracks),
+                "sc_tracks": len(sc_tracks),
+                "inductions": len(delays),
+                "induction_fraction": len(delays) / len(sc_tracks) if sc_tracks else 0.0,
+                "median_frames_to_induction": float(np.median(delays)) if delays else None,
+                "last_frame": tracker.last_frame,
+                "track_summaries": tracks,
+            }
+        return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Track SC/DC detections across time-lapse frames")
+    parser.add_argument("output", help="Output folder for trajectories.csv, induction.json and the session state")
+    parser.add_argument("--labels", help="Predictions of the three-class ALL model (cls xc yc w h conf per line)")
+    parser.add_argument("--sc-labels", help="Predictions of the SC model (its class 0 is tracked as SC)")
+    parser.add_argument("--dc-labels", help="Predictions of the DC model (its class 0 is tracked as DC)")
+    parser.add_argument("--conf", type=float, default=0.25)
+    # Tracker options default to DeviceTracker's; given on a saved session, they replace the saved ones
+    parser.add_argument("--iou", type=float)
+    parser.add_argument("--max-age", type=int)
+    parser.add_argument("--confirm-frames", type=int)
+    parser.add_argument("--method", choices=["hungarian", "greedy"])
+    parser.add_argument("--frame-pattern")
+    args = parser.parse_args()
+
+    sources = []
+    if args.labels:
+        sources.append((args.labels, None))
+    if args.sc_labels:
+        sources.append((args.sc_labels, {0: SC_CLASS}))
+    if args.dc_labels:
+        sources.append((args.dc_labels, {0: DC_CLASS}))
+    if not sources:
+        parser.error("give --labels, or --sc-labels and/or --dc-labels")
+
+    options = {option: value for option, value in (("iou_thres", args.iou), ("max_age", args.max_age),
+                                                   ("confirm_frames", args.confirm_frames), ("method", args.method))
+               if value is not None}
+    os.makedirs(args.output, exist_ok=True)
+    state_path = os.path.join(args.output, 'session.pkl')
+    if os.path.exists(state_path):
+        session = TrackingSession.load(state_path)
+        for option, (old, new) in session.configure(args.frame_pattern, **options).items():
+            print(f"Changing {option} of the saved session from {old} to {new}")
+    else:
+        session = TrackingSession(args.frame_pattern or FRAME_PATTERN, **options)
+
+    print(f"Tracked {session.add_folders(sources, args.conf)} new frames")
+    session.save(state_path)
+    session.write_trajectories(os.path.join(args.output, 'trajectories.csv'))
+    summary = session.induction_summary()
+    with open(os.path.join(args.output, 'induction.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    for device_id, device in summary.items():
+        print(f"{device_id}: {device['inductions']}/{device['sc_tracks']} SC tracks induced, "
+              f"median {device['median_frames_to_induction']} frames")
+
+if __name__ == "__main__":
+    main()
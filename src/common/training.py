@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+class FoldManifest:
+    """
+    JSON record of each fold's training state, rewritten atomically on update.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Manifest file path
+        """
+        self.path = path
+        self.folds = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.folds = json.load(f)
+
+    def get(self, fold):
+        return self.folds.get(str(fold), {})
+
+    def update(self, fold, **fields):
+        """
+        Merge fields into a fold's entry and save the manifest.
+
+        Args:
+            fold (int): Fold number
+            **fields: Values to store (e.g. status="running")
+        """
+        entry = self.folds.setdefault(str(fold), {})
+        entry.update(fields, updated_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.folds, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+def load_checkpoint(checkpoint_path, yolov9_dir='.'):
+    """
+    Load a YOLOv9 checkpoint on the CPU.
+
+    Checkpoints pickle the model object, so the yolov9 checkout must be
+    importable, and newer PyTorch versions need weights_only=False; older
+    ones do not know the argument.
+
+    Args:
+        checkpoint_path (str): Path to a .pt checkpoint
+        yolov9_dir (str): yolov9 checkout providing the pickled model classes
+
+    Returns:
+        dict: Checkpoint contents
+    """
+    import torch
+
+    yolov9_dir = os.path.abspath(yolov9_dir)
+    if yolov9_dir not in sys.path:
+        sys.path.insert(0, yolov9_dir)
+
+    try:
+        return torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    except TypeError:
+        return torch.load(checkpoint_path, map_location='cpu')
+
+def checkpoint_is_finished(checkpoint_path):
+    """
+    Check whether a YOLOv9 checkpoint belongs to a finished run.
+
+    train_dual.py strips the optimizer and sets epoch to -1 once training ends
+    (including early stopping); such checkpoints cannot be resumed.
+
+    Args:
+        checkpoint_path (str): Path to last.pt
+
+    Returns:
+        bool: True if the run that wrote the checkpoint has finished
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    return checkpoint.get('epoch', -1) == -1 or checkpoint.get('optimizer') is None
+
+def _arg_value(cmd, flag):
+    return cmd[cmd.index(flag) + 1] if flag in cmd[:-1] else None
+
+def run_fingerprint(cmd):
+    """
+    Hash of everything a training run depends on.
+
+    Covers the command line, the contents of the fold directory named by
+    --data (custom.yaml, train.txt, valid.txt) and of the --hyp file, and the
+    size and modification time of the --weights file, so a changed split,
+    hyperparameter or starting checkpoint gives a different fingerprint.
+
+    Args:
+        cmd (list): train_dual.py command
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256(json.dumps(cmd).encode())
+
+    files = []
+    data = _arg_value(cmd, '--data')
+    if data and os.path.exists(data):
+        data_dir = os.path.dirname(data)
+        files += sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir)
+                        if name.endswith(('.txt', '.yaml')))
+    hyp = _arg_value(cmd, '--hyp')
+    if hyp:
+        files += [path for path in (hyp, os.path.join('data', 'hyps', hyp)) if os.path.exists(path)][:1]
+    for path in files:
+        with open(path, 'rb') as f:
+            digest.update(path.encode() + f.read())
+
+    weights = _arg_value(cmd, '--weights')
+    if weights and os.path.exists(weights):
+        stat = os.stat(weights)
+        digest.update(f"{weights}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+# Exit codes worth retrying: a launcher or wrapper shell reporting SIGKILL (e.g. the
+# OOM killer) or SIGTERM (preemption) as 128 + signal; negative codes (the process
+# itself died from a signal) are always retried
+RETRY_EXIT_CODES = (128 + 9, 128 + 15)
+
+def is_retryable(returncode):
+    return returncode < 0 or returncode in RETRY_EXIT_CODES
+
+def train_fold(cmd, project, name, fold, max_retries=3, backoff=30):
+    """
+    Run train_dual.py for one fold, resuming and retrying after failures.
+
+    An interrupted run is resumed from ``<project>/<name>/weights/last.pt``
+    instead of restarting, both on the first attempt (after a crash of an
+    earlier invocation) and on every retry. Only crashes and kills are retried
+    (see is_retryable); any other non-zero exit, such as a bad argument, a
+    missing file or CUDA running out of memory at a fixed batch size, fails
+    at once.
+
+    A fold whose run already finished is skipped, but only if its
+    run_fingerprint matches; a run made with another command, split,
+    hyperparameter file or starting checkpoint is moved aside to
+    ``<name>_stale_<time>`` and the fold trains from scratch. State is
+    recorded in ``<project>/fold_manifest.json``.
+
+    Args:
+        cmd (list): train_dual.py command for a fresh run (must use --exist-ok); anything
+            before train_dual.py (e.g. a launcher) is kept when resuming
+        project (str): Value of --project
+        name (str): Value of --name
+        fold (int): Fold number
+        max_retries (int): Number of retries after a failed attempt
+        backoff (float): Delay in seconds before the first retry, doubled on each retry
+
+    Raises:
+        RuntimeError: If the fold fails with a non-retryable exit code or still fails after all retries
+    """
+    manifest = FoldManifest(os.path.join(project, 'fold_manifest.json'))
+    launcher = cmd[:cmd.index('train_dual.py') + 1]
+    run_dir = os.path.join(project, name)
+    last_checkpoint = os.path.join(run_dir, 'weights', 'last.pt')
+    fingerprint = run_fingerprint(cmd)
+
+    if os.path.exists(last_checkpoint) and manifest.get(fold).get('fingerprint') != fingerprint:
+        stale_dir = f"{run_dir}_stale_{time.strftime('%Y%m%d-%H%M%S')}"
+        print(f"Fold {fold} was trained with other settings or data, moving {run_dir} to {stale_dir}")
+        os.replace(run_dir, stale_dir)
+        manifest.update(fold, status='stale', attempts=0)
+    elif os.path.exists(last_checkpoint) and checkpoint_is_finished(last_checkpoint):
+        print(f"Fold {fold} already finished training, skipping")
+        manifest.update(fold, status='completed')
+        return
+
+    attempts = manifest.get(fold).get('attempts', 0)
+    for retry in range(max_retries + 1):
+        resume = os.path.exists(last_checkpoint)
+        run_cmd = launcher + ['--resume', last_checkpoint] if resume else cmd
+        attempts += 1
+        manifest.update(fold, status='running', attempts=attempts, resumed=resume, fingerprint=fingerprint)
+        if resume:
+            print(f"Resuming fold {fold} from {last_checkpoint}")
+
+        result = subprocess.run(run_cmd)
+        if result.returncode == 0:
+            manifest.update(fold, status='completed', returncode=0)
+            return
+
+        manifest.update(fold, status='failed', returncode=result.returncode)
+        if not is_retryable(result.returncode):
+            raise RuntimeError(f"Training fold {fold} failed with exit code {result.returncode}")
+        if retry < max_retries:
+            delay = backoff * 2 ** retry
+            print(f"Training fold {fold} failed with exit code {result.returncode}, retrying in {delay}s")
+            time.sleep(delay)
+
+    raise RuntimeError(f"Training fold {fold} failed after {max_retries + 1} attempts")
@@ -0,0 +1,249 @@
+import argparse
+import os
+
+import numpy as np
+from PIL import Image, ImageChops, ImageEnhance
+
+from common.channels import merge_channel_arrays, quantize_to_uint8
+from common.online_merge import CHANNEL_TYPES, group_channel_files
+from common.streaming import iter_files
+
+DIC_SUFFIXES = ('DIC.jpg', 'DIC.jpeg', 'DIC.png', 'DIC.tif')
+PREPROCESS_MODES = ('dic', 'merged')
+
+def is_dic_file(filename):
+    return filename.endswith(DIC_SUFFIXES)
+
+def dic_output_name(filename):
+    """
+    Name step0 gives a converted DIC image (<base>_DIC.tif -> <base>.png).
+    """
+    return filename.replace('_DIC', '').rsplit('.', 1)[0] + '.png'
+
+def dic_transform(image):
+    """
+    DIC-only frame as written by move_and_convert_dic_images.
+
+    The conversion is a lossless re-encode to PNG, so the frame is the decoded
+    image itself; arrays are wrapped as PIL images.
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Decoded DIC image
+
+    Returns:
+        PIL.Image: Frame in the mode step0 saves
+    """
+    return Image.fromarray(image) if isinstance(image, np.ndarray) else image
+
+def apply_fluorescence_alpha(image, transparency, enhance_factor=1.5, threshold=50, background_alpha=50):
+    """
+    Enhance an RGBA fluorescence image and set its alpha from a threshold mask.
+
+    Args:
+        image (PIL.Image): RGBA fluorescence image
+        transparency (int): Transparency level for enhanced areas
+        enhance_factor (float): Contrast enhancement factor
+        threshold (int): Threshold for pixel enhancement
+        background_alpha (int): Background transparency level
+
+    Returns:
+        PIL.Image: Enhanced image
+    """
+    enhancer = ImageEnhance.Contrast(image)
+    image_enhanced = enhancer.enhance(enhance_factor)
+
+    # A pixel is foreground if any of its R, G or B values exceeds the threshold
+    red, green, blue, _ = image_enhanced.split()
+    above = [band.point(lambda value: 255 if value > threshold else 0) for band in (red, green, blue)]
+    mask = ImageChops.lighter(ImageChops.lighter(above[0], above[1]), above[2])
+    image_enhanced.putalpha(mask.point(lambda value: transparency if value else background_alpha))
+    return image_enhanced
+
+def merge_channel_images(dic_image, rfp_image, gfp_image, brightness_factor=0.9, final_contrast_factor=1.5,
+                         transparency=110, sharpness_factor=5):
+    """
+    Merge decoded RGBA DIC, RFP and GFP images into one composite.
+
+    Args:
+        dic_image (PIL.Image): RGBA DIC image
+        rfp_image (PIL.Image): RGBA RFP image
+        gfp_image (PIL.Image): RGBA GFP image
+        brightness_factor (float): Final brightness adjustment factor
+        final_contrast_factor (float): Final contrast adjustment factor
+        transparency (int): Alpha (0-255) of fluorescent areas, rounded to an integer
+        sharpness_factor (float): DIC sharpness factor
+
+    Returns:
+        PIL.Image: Merged RGBA image
+    """
+    transparency = int(round(transparency))
+    rfp_enhanced = apply_fluorescence_alpha(rfp_image, transparency)
+    gfp_enhanced = apply_fluorescence_alpha(gfp_image, transparency)
+
+    # Enhance DIC image (contrast factor 1 is an identity, so only sharpen)
+    dic_image_sharpened = ImageEnhance.Sharpness(dic_image).enhance(sharpness_factor)
+
+    # Merge images
+    combined_image = Image.alpha_composite(dic_image_sharpened, rfp_enhanced)
+    combined_image = Image.alpha_composite(combined_image, gfp_enhanced)
+    del dic_image_sharpened, rfp_enhanced, gfp_enhanced
+
+    # Final adjustments
+    combined_image = ImageEnhance.Contrast(combined_image).enhance(final_contrast_factor)
+    return ImageEnhance.Brightness(combined_image).enhance(brightness_factor)
+
+def merge_transform(dic, rfp, gfp, brightness_factor=0.9, final_contrast_factor=1.5, native_depth=False,
+                    transparency=110, sharpness_factor=5):
+    """
+    Merged frame as written by process_merged_images.
+
+    Args:
+        dic: DIC channel (RGBA PIL image, or an array from read_channel with native_depth)
+        rfp: RFP channel
+        gfp: GFP channel
+        brightness_factor (float): Final brightness adjustment factor
+        final_contrast_factor (float): Final contrast adjustment factor
+        native_depth (bool): Merge on native bit depth arrays (process_merged_images native_depth)
+        transparency (int): Alpha (0-255) of fluorescent areas
+        sharpness_factor (float): DIC sharpness factor
+
+    Returns:
+        PIL.Image: Merged RGBA frame
+    """
+    if native_depth:
+        merged = merge_channel_arrays(dic, rfp, gfp, brightness_factor, final_contrast_factor, transparency,
+                                      sharpness_factor)
+        return Image.fromarray(quantize_to_uint8(merged), 'RGBA')
+    channels = [Image.fromarray(channel).convert('RGBA') if isinstance(channel, np.ndarray) else channel
+                for channel in (dic, rfp, gfp)]
+    return merge_channel_images(*channels, brightness_factor, final_contrast_factor, transparency, sharpness_factor)
+
+def to_model_rgb(image):
+    """
+    The 8-bit RGB array yolov9 trains on for a step0 frame.
+
+    Matches cv2.imread(path, IMREAD_COLOR) of the saved PNG, converted to RGB:
+    alpha is dropped without compositing, grey and palette images are
+    expanded, and 16-bit frames keep their high byte.
+
+    Args:
+        image (PIL.Image): Frame from dic_transform or merge_transform
+
+    Returns:
+        numpy.ndarray: uint8 array of shape (H, W, 3)
+    """
+    if image.mode == 'I' or image.mode.startswith('I;16'):
+        high = (np.asarray(image).astype(np.int64).clip(0, 65535) >> 8).astype(np.uint8)
+        return np.repeat(high[:, :, None], 3, axis=2)
+    return np.asarray(image.convert('RGB'))
+
+def iter_frames(images_folder, preprocess=None):
+    """
+    Frames of a folder for inference, named like their step0 outputs.
+
+    Args:
+        images_folder (str): Processed PNGs (preprocess None), or raw channel images
+        preprocess (str): None, "dic" (DIC-only finetuning input) or "merged" (pretraining composite)
+
+    Yields:
+        tuple: (name without extension, source) for load_frame
+    """
+    if preprocess == 'merged':
+        for base_name, paths in sorted(group_channel_files(images_folder).items()):
+            yield base_name, tuple(paths[image_type] for image_type in CHANNEL_TYPES)
+        return
+    for path in sorted(iter_files(images_folder, ('.jpg', '.jpeg', '.png', '.tif'))):
+        filename = os.path.basename(path)
+        if preprocess == 'dic':
+            if is_dic_file(filename):
+                yield dic_output_name(filename)[:-len('.png')], path
+        else:
+            yield os.path.splitext(filename)[0], path
+
+def load_frame(source, preprocess=None, native_depth=False, reader=None):
+    """
+    Decode and transform one frame in memory into the RGB image the model expects.
+
+    Args:
+        source: Path, or DIC/RFP/GFP paths for "merged", from iter_frames
+        preprocess (str): None, "dic" or "merged"
+        native_depth (bool): Merge at native bit depth, as step0 with native_depth
+        reader (ImageReader): Optional shared image reader
+
+    Returns:
+        PIL.Image: RGB image for CPUDetector.predict
+    """
+    from common.channels import read_channel
+
+    def read(path, mode=None):
+        if reader is not None:
+            return reader.read(path, mode=mode)
+        with Image.open(path) as image:
+            image.load()
+            return image.convert(mode) if mode else image
+
+    if preprocess == 'merged':
+        if native_depth:
+            frame = merge_transform(*[read_channel(path) for path in source], native_depth=True)
+        else:
+            frame = merge_transform(*[read(path, 'RGBA') for path in source])
+    elif preprocess == 'dic':
+        frame = dic_transform(read(source))
+    else:
+        frame = read(source)
+    return Image.fromarray(to_model_rgb(frame))
+
+def check_parity(raw_folder, processed_folder, preprocess, native_depth=False, limit=None):
+    """
+    Compare in-memory transforms against frames step0 wrote to disk.
+
+    Args:
+        raw_folder (str): Raw channel images step0 read
+        processed_folder (str): Folder step0 wrote (only_dic_images or merged_images)
+        preprocess (str): "dic" or "merged"
+        native_depth (bool): Whether step0 merged at native bit depth
+        limit (int): Optional number of frames to check
+
+    Returns:
+        dict: frames, missing, mismatched and max_abs_diff over the model input arrays
+    """
+    frames = missing = mismatched = 0
+    max_abs_diff = 0
+    for name, source in iter_frames(raw_folder, preprocess):
+        if limit is not None and frames + missing >= limit:
+            break
+        on_disk_path = os.path.join(processed_folder, name + '.png')
+        if not os.path.exists(on_disk_path):
+            missing += 1
+            continue
+        in_memory = np.asarray(load_frame(source, preprocess, native_depth), dtype=np.int16)
+        with Image.open(on_disk_path) as image:
+            on_disk = to_model_rgb(image).astype(np.int16)
+        frames += 1
+        if in_memory.shape != on_disk.shape:
+            print(f"{name}: shape {in_memory.shape} differs from {on_disk.shape} on disk")
+            mismatched += 1
+            continue
+        diff = int(np.abs(in_memory - on_disk).max())
+        if diff:
+            mismatched += 1
+            max_abs_diff = max(max_abs_diff, diff)
+    return {"frames": frames, "missing": missing, "mismatched": mismatched, "max_abs_diff": max_abs_diff}
+
+def main():
+    parser = argparse.ArgumentParser(description="Check in-memory preprocessing against step0 outputs")
+    parser.add_argument("raw_folder", help="Raw DIC/RFP/GFP images")
+    parser.add_argument("processed_folder", help="Folder written by step0")
+    parser.add_argument("--preprocess", choices=PREPROCESS_MODES, required=True)
+    parser.add_argument("--native-depth", action="store_true")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    report = check_parity(args.raw_folder, args.processed_folder, args.preprocess, args.native_depth, args.limit)
+    print(f"{report['frames']} frames compared, {report['missing']} missing on disk, "
+          f"{report['mismatched']} mismatched (max abs diff {report['max_abs_diff']})")
+    if report['mismatched'] or not report['frames']:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import os
+import sys
 import wandb
 import torch
 import gc
@@ -10,6 +11,29 @@ import shutil
 from pathlib import Path
 import requests
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common.autotune import autotune_train_settings
+from common.evaluation import clear_saved_predictions, evaluate_fold
+from common.model_registry import ModelRegistry
+from common import online_merge
+from common.results_store import ResultsStore
+from common.stacked import write_stacked_hyp
+from common.training import train_fold
+
+# Experiment name under which fold metrics are recorded in the results store
+EXPERIMENT = os.environ.get('ICD_EXPERIMENT', 'yolov9-e')
+
+# Set ICD_AUTOTUNE=1 to probe batch size and workers on this host instead of the defaults
+AUTOTUNE = os.environ.get('ICD_AUTOTUNE', '0') == '1'
+
+# Set ICD_ONLINE_MERGE=1 (with the same flag for step0) to merge DIC/RFP/GFP on the fly from the
+# channel cache; ICD_MERGE_SPREAD is the relative range of the randomized merge parameters (0 keeps them fixed)
+ONLINE_MERGE = os.environ.get('ICD_ONLINE_MERGE', '0') == '1'
+MERGE_SPREAD = float(os.environ.get('ICD_MERGE_SPREAD', '0.15'))
+
+# Set ICD_STACKED_CHANNELS=1 to train on stacked DIC/RFP/GFP channels (set it for step0 as well)
+STACKED_CHANNELS = os.environ.get('ICD_STACKED_CHANNELS', '0') == '1'
+
 def setup_yolov9():
     """Setup YOLOv9 repository and copy required files"""
     
@@ -62,31 +86,52 @@ def setup_yolov9():
             "split_for_yolo_detection directory not found in the parent directory"
         )
 
+def yolov9_command(script, randomize=False):
+    """Command prefix for a yolov9 script, run through the online merge launcher if enabled
+
+    Args:
+        script: yolov9 script (train_dual.py or val_dual.py)
+        randomize: Randomize the merge parameters of training images
+    """
+    if not ONLINE_MERGE:
+        return ['python', script]
+    cmd = ['python', online_merge.__file__, '--cache-dir', '../processed_data/channel_cache']
+    if randomize and MERGE_SPREAD > 0:
+        cmd += ['--randomize', str(MERGE_SPREAD)]
+    return cmd + [script]
+
 def train_model(fold):
     """Train model for each fold
     
     Args:
         fold: Current fold number
     """
-    cmd = [
-        'python', 'train_dual.py',
-        '--workers', '0',
-        '--device', '0',
-        '--batch', '4',
+    settings = {'batch': 4, 'workers': 0, 'device': '0'}
+    if AUTOTUNE:
+        settings = autotune_train_settings('models/detect/yolov9-e.yaml', 1024,
+                                           f'./split_for_yolo_detection/fold_{fold}/train.txt')
+
+    cmd = yolov9_command('train_dual.py', randomize=True) + [
+        '--workers', str(settings['workers']),
+        '--device', settings['device'],
+        '--batch', str(settings['batch']),
         '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
         '--img', '1024',
         '--cfg', 'models/detect/yolov9-e.yaml',
         '--weights', 'yolov9-e.pt',
         '--name', f'test_fold_{fold}',
         '--project', 'Yolov9_pretrainedmodel',
-        '--hyp', 'hyp.scratch-high.yaml',
+        # HSV jitter would mix the stacked channels
+        '--hyp', write_stacked_hyp() if STACKED_CHANNELS else 'hyp.scratch-high.yaml',
         '--min-items', '0',
         # '--epochs', '100',
         '--epochs', '1',
-        '--close-mosaic', '15'
+        '--close-mosaic', '15',
+        '--exist-ok'
     ]
     
-    subprocess.run(cmd)
+    # Resumes from last.pt after interruptions and retries failed runs
+    train_fold(cmd, 'Yolov9_pretrainedmodel', f'test_fold_{fold}', fold)
     torch.cuda.empty_cache()
     gc.collect()
 
@@ -95,9 +140,11 @@ def validate_model(fold):
     
     Args:
         fold: Current fold number
+
+    Returns:
+        dict: Metrics computed from the saved predictions
     """
-    cmd = [
-        'python', 'val_dual.py',
+    cmd = yolov9_command('val_dual.py') + [
         '--data', f'./split_for_yolo_detection/fold_{fold}/custom.yaml',
         '--img', '1024',
         '--batch', '4',
@@ -107,13 +154,20 @@ def validate_model(fold):
         '--weights', f'./Yolov9_pretrainedmodel/test_fold_{fold}/weights/best.pt',
         '--save-json',
         '--save-txt',
+        '--save-conf',
+        '--exist-ok',
         '--name', f'test_fold_{fold}'
     ]
     
-    subprocess.run(cmd)
+    # val_dual.py appends to existing label files
+    clear_saved_predictions(f'runs/val/test_fold_{fold}')
+    subprocess.run(cmd, check=True)
     torch.cuda.empty_cache()
     gc.collect()
 
+    # Keep confidences so metrics at other thresholds never need a rerun
+    return evaluate_fold(f'./split_for_yolo_detection/fold_{fold}', f'runs/val/test_fold_{fold}', ('S.C',))
+
 def main():
     # Setup WandB
     wandb.login(key="Your Key")    
@@ -121,6 +175,9 @@ def main():
     # Setup YOLOv9 and copy required files
     setup_yolov9()
     
+    # Collect per-fold metrics across runs
+    store = ResultsStore()
+
     # Train and validate for each fold
     for fold in range(5):
         print(f"\nProcessing fold {fold}")
@@ -129,7 +186,11 @@ def main():
         train_model(fold)
         
         print(f"Validating fold {fold}...")
-        validate_model(fold)        
+        metrics = validate_model(fold)
+        store.record_evaluation(EXPERIMENT, 'SC', 'pretrain', fold, metrics)
+
+        # Publish the pretrained weights for the SC finetuning run
+        ModelRegistry().publish(f'./Yolov9_pretrainedmodel/test_fold_{fold}/weights/best.pt', 'SC', fold)
         break  # "Only the 0th fold is executed. (If you want additional training, comment out this line)"
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.preprocess import (
+    check_file_names_consistency,
+    copy_images_to_destination,
+    process_labels,
+    count_labels,
+    move_and_convert_dic_images,
+    process_merged_images,
+    split_dataset_inter_device
+)
+from common.image_reader import ImageReader
+from common.label_stats import write_label_report
+from common.online_merge import build_channel_cache
+from common.stacked import stack_channel_images
+
+# Set ICD_ONLINE_MERGE=1 to cache raw channels for merging during training instead of baking composites
+ONLINE_MERGE = os.environ.get('ICD_ONLINE_MERGE', '0') == '1'
+
+# Set ICD_STACKED_CHANNELS=1 to stack DIC/RFP/GFP as separate input channels instead of compositing them
+STACKED_CHANNELS = os.environ.get('ICD_STACKED_CHANNELS', '0') == '1'
+
+# Set ICD_NATIVE_DEPTH=1 to merge composites at the channels' native bit depth (16-bit TIFFs stay 16-bit until saved)
+NATIVE_DEPTH = os.environ.get('ICD_NATIVE_DEPTH', '0') == '1'
+
+def split_for_task(task_dir, merged_images, labels_folder, class_names):
+    """
+    Write the fold splits of one task into its pretraining directory.
+
+    The split lists contain paths relative to the working directory, so the
+    split is written from inside the task directory, exactly as the per-task
+    step0 scripts do.
+
+    Args:
+        task_dir (str): Task directory holding the step1 script (SC or DC)
+        merged_images (str): Folder containing the merged images
+        labels_folder (str): Folder containing the task's labels
+        class_names (tuple): Class names for the task's custom.yaml
+    """
+    merged_images = os.path.abspath(merged_images)
+    labels_folder = os.path.abspath(labels_folder)
+
+    cwd = os.getcwd()
+    os.chdir(task_dir)
+    try:
+        split_dataset_inter_device(merged_images, labels_folder, 'split_for_yolo_detection',
+                                   class_names=class_names,
+                                   sidecar_extensions=('.npy',) if STACKED_CHANNELS else ())
+    finally:
+        os.chdir(cwd)
+
+def link_channel_cache(task_dir, channel_cache):
+    """
+    Expose the shared channel cache at the task's processed_data/channel_cache.
+
+    The step1 scripts look for the cache next to their own directory.
+
+    Args:
+        task_dir (str): Task directory holding the step1 script (SC or DC)
+        channel_cache (str): Shared channel cache folder
+    """
+    link_path = os.path.join(task_dir, 'processed_data', 'channel_cache')
+    os.makedirs(os.path.dirname(link_path), exist_ok=True)
+    if not os.path.lexists(link_path):
+        os.symlink(os.path.abspath(channel_cache), link_path)
+
+def main():
+    # Set base paths
+    base_folders = [
+        '../../data/images/images_DIC',
+        '../../data/images/images_RFP',
+        '../../data/images/images_GFP',
+        '../../data/labels'
+    ]
+    labels_dc_folder = '../../data/labels_DC'
+
+    processed_data_path = './processed_data'
+    images_origin_all = os.path.join(processed_data_path, 'images_origin_all')
+    thumbnails = os.path.join(processed_data_path, 'thumbnails')
+    labels_sc = os.path.join(processed_data_path, 'labels_SC')
+    labels_dc = os.path.join(processed_data_path, 'labels_DC')
+    merged_images = os.path.join(processed_data_path, 'merged_processed_images')
+    channel_cache = os.path.join(processed_data_path, 'channel_cache')
+
+    # 1. Check filename consistency
+    check_file_names_consistency(base_folders)
+
+    # 2. Copy images (once for both tasks; DC images are a subset of these)
+    copy_images_to_destination(base_folders[:3], images_origin_all)
+
+    # 3. Process labels for both tasks
+    process_labels(base_folders[3], labels_sc)
+    process_labels(labels_dc_folder, labels_dc)
+
+    # 4. Count labels
+    count_labels(labels_sc)
+    count_labels(labels_dc, class_names={0: 'D.C'})
+
+    # One reader for the conversion and the QA thumbnails, so each file is decoded once
+    reader = ImageReader()
+
+    # 5. Process and merge every triplet once
+    if STACKED_CHANNELS:
+        stack_channel_images(images_origin_all, merged_images)
+    elif ONLINE_MERGE:
+        # The folds hold DIC images as placeholders; the loader merges from the cache
+        move_and_convert_dic_images(images_origin_all, merged_images, reader, thumbnails)
+        build_channel_cache(images_origin_all, channel_cache)
+        link_channel_cache('SC', channel_cache)
+        link_channel_cache('DC', channel_cache)
+    else:
+        process_merged_images(images_origin_all, merged_images, reader=reader, native_depth=NATIVE_DEPTH,
+                              thumbnail_folder=thumbnails)
+
+    # 6. Split dataset for each task from the shared merged images
+    split_for_task('SC', merged_images, labels_sc, ('S.C',))
+    split_for_task('DC', merged_images, labels_dc, ('D.C',))
+
+    # 7. Write label QA reports
+    write_label_report(labels_sc, os.path.join(processed_data_path, 'label_report_SC'),
+                       os.path.join('SC', 'split_for_yolo_detection'))
+    write_label_report(labels_dc, os.path.join(processed_data_path, 'label_report_DC'),
+                       os.path.join('DC', 'split_for_yolo_detection'), class_names={0: 'D.C'})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Frozen copy of the image functions of the original step0 scripts.
+
+Copied verbatim from src/pretrain/SC/step0-preprocess-for-SC.py as it was
+before the shared common package existed. It is the fixed reference the
+transform tests compare against; do not update it alongside common.
+"""
+import os
+
+from PIL import Image, ImageEnhance
+
+def move_and_convert_dic_images(source_folder, target_folder):
+    """
+    Select and convert DIC images to PNG format.
+    
+    Args:
+        source_folder (str): Source folder containing DIC images
+        target_folder (str): Target folder for converted PNG images
+    """
+    if not os.path.exists(target_folder):
+        os.makedirs(target_folder)
+
+    for filename in os.listdir(source_folder):
+        if filename.endswith(('DIC.jpg', 'DIC.jpeg', 'DIC.png', 'DIC.tif')):
+            source_path = os.path.join(source_folder, filename)
+            new_filename = filename.replace('_DIC', '').rsplit('.', 1)[0] + '.png'
+            target_path = os.path.join(target_folder, new_filename)
+            
+            image = Image.open(source_path)
+            image.save(target_path, 'PNG')
+
+def enhance_fluorescence(image_path, transparency, enhance_factor=1.5, threshold=50, background_alpha=50):
+    """
+    Enhance fluorescence images and adjust transparency.
+    
+    Args:
+        image_path (str): Path to fluorescence image
+        transparency (int): Transparency level for enhanced areas
+        enhance_factor (float): Contrast enhancement factor
+        threshold (int): Threshold for pixel enhancement
+        background_alpha (int): Background transparency level
+        
+    Returns:
+        PIL.Image: Enhanced image
+    """
+    image = Image.open(image_path).convert("RGBA")
+    enhancer = ImageEnhance.Contrast(image)
+    image_enhanced = enhancer.enhance(enhance_factor)
+    
+    datas = image_enhanced.getdata()
+    new_data = []
+    for item in datas:
+        if item[0] > threshold or item[1] > threshold or item[2] > threshold:
+            new_data.append((item[0], item[1], item[2], transparency))
+        else:
+            new_data.append((item[0], item[1], item[2], background_alpha))
+    image_enhanced.putdata(new_data)
+    return image_enhanced
+
+def process_merged_images(images_folder, output_folder, brightness_factor=0.9, final_contrast_factor=1.5):
+    """
+    Merge and process DIC, RFP, and GFP images.
+    
+    Args:
+        images_folder (str): Source folder containing all images
+        output_folder (str): Output folder for merged images
+        brightness_factor (float): Final brightness adjustment factor
+        final_contrast_factor (float): Final contrast adjustment factor
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    image_groups = {}
+    for filename in os.listdir(images_folder):
+        if filename.endswith(('.jpg', '.jpeg', '.png', '.tif')):
+            parts = filename.split('_')
+            base_name = '_'.join(parts[:-1])  # Remove the last part (DIC/RFP/GFP)
+            image_type = parts[-1].split('.')[0]
+            image_groups.setdefault(base_name, {})[image_type] = os.path.join(images_folder, filename)
+
+    for base_name, image_paths in image_groups.items():
+        dic_path = image_paths.get('DIC')
+        rfp_path = image_paths.get('RFP')
+        gfp_path = image_paths.get('GFP')
+
+        if not (dic_path and rfp_path and gfp_path):
+            print(f"Missing images for {base_name}, skipping...")
+            continue
+
+        output_path = os.path.join(output_folder, base_name + '.png')
+
+        # Process images
+        dic_image = Image.open(dic_path).convert("RGBA")
+        rfp_enhanced = enhance_fluorescence(rfp_path, 110)
+        gfp_enhanced = enhance_fluorescence(gfp_path, 110)
+        
+        # Enhance DIC image
+        dic_image_contrasted = ImageEnhance.Contrast(dic_image).enhance(1)
+        dic_image_sharpened = ImageEnhance.Sharpness(dic_image_contrasted).enhance(5)
+
+        # Merge images
+        combined_image = Image.alpha_composite(dic_image_sharpened, rfp_enhanced)
+        combined_image = Image.alpha_composite(combined_image, gfp_enhanced)
+
+        # Final adjustments
+        combined_image = ImageEnhance.Contrast(combined_image).enhance(final_contrast_factor)
+        adjusted_image = ImageEnhance.Brightness(combined_image).enhance(brightness_factor)
+        adjusted_image.save(output_path)
@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from common.folds import FOLD_METHODS, assign_folds, hashed_order, stable_hash
+
+class FoldAssignmentTest(unittest.TestCase):
+    """
+    Fold assignments depend only on the groups and the seed, and never move existing groups.
+    """
+
+    def setUp(self):
+        rng = random.Random(0)
+        self.group_sizes = {f'P{plate}_{well}': rng.randint(1, 40)
+                            for plate in range(1, 4) for well in ('A01', 'A02', 'B01', 'B02', 'C01', 'C02')}
+
+    def shuffled(self, group_sizes, seed):
+        items = list(group_sizes.items())
+        random.Random(seed).shuffle(items)
+        return dict(items)
+
+    def test_stable_hash(self):
+        self.assertEqual(stable_hash('P1_A01'), stable_hash('P1_A01', seed=42))
+        self.assertNotEqual(stable_hash('P1_A01'), stable_hash('P1_A02'))
+        self.assertNotEqual(stable_hash('P1_A01', seed=1), stable_hash('P1_A01', seed=2))
+        self.assertLess(stable_hash('P1_A01'), 2 ** 64)
+
+    def test_hashed_order_ignores_input_order(self):
+        keys = list(self.group_sizes)
+        expected = hashed_order(keys)
+        for seed in range(5):
+            random.Random(seed).shuffle(keys)
+            self.assertEqual(hashed_order(keys), expected)
+
+    def test_hashed_order_keeps_relative_order(self):
+        order = hashed_order(self.group_sizes)
+        extended = hashed_order(list(self.group_sizes) + ['P9_A01', 'P9_A02'])
+        self.assertEqual([key for key in extended if key in self.group_sizes], order)
+
+    def test_assignment_ignores_input_order(self):
+        for method in FOLD_METHODS:
+            with self.subTest(method=method):
+                expected = assign_folds(self.group_sizes, method=method)
+                for seed in range(5):
+                    self.assertEqual(assign_folds(self.shuffled(self.group_sizes, seed), method=method), expected)
+
+    def test_assignment_covers_every_fold(self):
+        for method in FOLD_METHODS:
+            with self.subTest(method=method):
+                assignment = assign_folds(self.group_sizes, n_splits=5, method=method)
+                self.assertEqual(set(assignment), set(self.group_sizes))
+                self.assertTrue(set(assignment.values()) <= set(range(5)))
+        self.assertEqual(set(assign_folds(self.group_sizes, n_splits=5).values()), set(range(5)))
+
+    def test_adding_groups_keeps_existing_folds(self):
+        extended = dict(self.group_sizes, P9_A01=25, P9_A02=3, P9_B01=12)
+        for method in FOLD_METHODS:
+            with self.subTest(method=method):
+                before = assign_folds(self.group_sizes, method=method)
+                after = assign_folds(extended, method=method, existing=before)
+                self.assertEqual({group: after[group] for group in before}, before)
+                self.assertEqual(set(after), set(extended))
+
+    def test_hash_method_is_independent_of_other_groups(self):
+        before = assign_folds(self.group_sizes, method='hash')
+        after = assign_folds(dict(self.group_sizes, P9_A01=25), method='hash')
+        self.assertEqual({group: after[group] for group in before}, before)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            assign_folds(self.group_sizes, method='random')
+
+if __name__ == '__main__':
+    unittest.main()
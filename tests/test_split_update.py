@@ -0,0 +1,92 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+HAVE_IMAGE_STACK = all(find_spec(name) for name in ('numpy', 'PIL', 'yaml'))
+
+@unittest.skipUnless(HAVE_IMAGE_STACK, "needs numpy, Pillow and PyYAML")
+class SplitUpdateTest(unittest.TestCase):
+    """
+    Adding labels with update_split_inter_device must give the split a full
+    rebuild with the same folds.json gives, and be a no-op when nothing is new.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.images = self.folder('images')
+        self.labels = self.folder('labels')
+        os.makedirs(self.images)
+        os.makedirs(self.labels)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def folder(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def add_samples(self, devices, frames):
+        for device in devices:
+            for frame in frames:
+                name = f'{device}_{frame:04d}'
+                with open(os.path.join(self.images, name + '.png'), 'wb') as f:
+                    f.write(name.encode())
+                with open(os.path.join(self.labels, name + '.txt'), 'w') as f:
+                    f.write(f'0 0.5 0.5 0.1 0.{frame % 10}\n')
+
+    def snapshot(self, output_path):
+        """
+        Every file of a split; image lists as sorted file names, since they hold absolute paths.
+        """
+        files = {}
+        for root, _, names in os.walk(output_path):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, output_path)
+                if name.endswith('.txt') and root != output_path and os.path.basename(root) != 'labels':
+                    with open(path) as f:
+                        files[relative] = sorted(os.path.basename(line.strip()) for line in f if line.strip())
+                elif name != 'custom.yaml':
+                    with open(path, 'rb') as f:
+                        files[relative] = f.read()
+        return files
+
+    def test_update_matches_rebuild(self):
+        from common.folds import FOLDS_FILE
+        from common.preprocess import split_dataset_inter_device, update_split_inter_device
+
+        self.add_samples(['P1_A01', 'P1_A02', 'P1_B01', 'P2_A01', 'P2_B01', 'P2_B02', 'P3_A01'], range(1, 4))
+        updated = self.folder('updated')
+        split_dataset_inter_device(self.images, self.labels, updated)
+
+        # New frames of recorded devices and two new devices
+        self.add_samples(['P1_A01', 'P2_B01'], range(4, 7))
+        self.add_samples(['P4_A01', 'P4_A02'], range(1, 5))
+        self.assertEqual(update_split_inter_device(self.images, self.labels, updated), 14)
+
+        rebuilt = self.folder('rebuilt')
+        os.makedirs(rebuilt)
+        shutil.copy(os.path.join(updated, FOLDS_FILE), os.path.join(rebuilt, FOLDS_FILE))
+        split_dataset_inter_device(self.images, self.labels, rebuilt)
+
+        self.assertEqual(self.snapshot(updated), self.snapshot(rebuilt))
+
+    def test_second_update_is_noop(self):
+        from common.preprocess import split_dataset_inter_device, update_split_inter_device
+
+        self.add_samples(['P1_A01', 'P1_A02', 'P2_A01', 'P2_B01', 'P3_A01'], range(1, 4))
+        output = self.folder('split')
+        split_dataset_inter_device(self.images, self.labels, output)
+        self.add_samples(['P1_A01', 'P5_A01'], range(4, 6))
+        self.assertEqual(update_split_inter_device(self.images, self.labels, output), 4)
+
+        before = self.snapshot(output)
+        self.assertEqual(update_split_inter_device(self.images, self.labels, output), 0)
+        self.assertEqual(self.snapshot(output), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import sys
+import tempfile
+import unittest
+from importlib.util import find_spec
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+HAVE_IMAGE_STACK = all(find_spec(name) for name in ('numpy', 'PIL', 'yaml'))
+
+@unittest.skipUnless(HAVE_IMAGE_STACK, "needs numpy, Pillow and PyYAML")
+class BaselineParityTest(unittest.TestCase):
+    """
+    step0 outputs, in-memory frames and online merges must equal what the
+    original step0 code (frozen in baseline_step0) writes for the same input.
+    """
+
+    def setUp(self):
+        import numpy as np
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw = os.path.join(self.tmp.name, 'raw')
+        os.makedirs(self.raw)
+        rng = np.random.default_rng(0)
+        self.pixels = lambda *shape: rng.integers(0, 256, shape, dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def folder(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def read_model_rgb(self, path):
+        from PIL import Image
+        from common.transforms import to_model_rgb
+
+        with Image.open(path) as image:
+            return to_model_rgb(image)
+
+    def save_channels(self, shape, mode):
+        from PIL import Image
+
+        for channel in ('DIC', 'RFP', 'GFP'):
+            Image.fromarray(self.pixels(*shape), mode).save(os.path.join(self.raw, f'P1_A01_0001_{channel}.tif'))
+
+    def assert_same_frames(self, expected, processed):
+        names = sorted(os.listdir(expected))
+        self.assertTrue(names)
+        self.assertEqual(sorted(os.listdir(processed)), names)
+        for name in names:
+            with self.subTest(frame=name):
+                self.assertEqual(self.read_model_rgb(os.path.join(processed, name)).tobytes(),
+                                 self.read_model_rgb(os.path.join(expected, name)).tobytes())
+
+    def assert_in_memory_parity(self, expected, preprocess):
+        from common.transforms import check_parity, iter_frames, load_frame
+
+        frames = list(iter_frames(self.raw, preprocess))
+        self.assertEqual(len(frames), 1)
+        name, source = frames[0]
+        on_disk = self.read_model_rgb(os.path.join(expected, name + '.png'))
+        in_memory = load_frame(source, preprocess)
+        self.assertEqual(in_memory.size, (on_disk.shape[1], on_disk.shape[0]))
+        self.assertEqual(in_memory.tobytes(), on_disk.tobytes())
+
+        report = check_parity(self.raw, expected, preprocess)
+        self.assertEqual((report['frames'], report['missing'], report['mismatched']), (1, 0, 0))
+
+    def test_dic_frame(self):
+        from PIL import Image
+        import baseline_step0
+        from common.preprocess import move_and_convert_dic_images
+
+        Image.fromarray(self.pixels(24, 32), 'L').save(os.path.join(self.raw, 'P1_A01_0001_DIC.tif'))
+        baseline_step0.move_and_convert_dic_images(self.raw, self.folder('expected'))
+        move_and_convert_dic_images(self.raw, self.folder('only_dic_images'))
+
+        self.assert_same_frames(self.folder('expected'), self.folder('only_dic_images'))
+        self.assert_in_memory_parity(self.folder('expected'), 'dic')
+
+    def test_merged_frame(self):
+        import baseline_step0
+        from common.preprocess import process_merged_images
+
+        self.save_channels((24, 32, 3), 'RGB')
+        baseline_step0.process_merged_images(self.raw, self.folder('expected'))
+        process_merged_images(self.raw, self.folder('merged_images'))
+
+        self.assert_same_frames(self.folder('expected'), self.folder('merged_images'))
+        self.assert_in_memory_parity(self.folder('expected'), 'merged')
+
+    def test_merged_grey_frame(self):
+        import baseline_step0
+        from common.preprocess import process_merged_images
+
+        self.save_channels((24, 32), 'L')
+        baseline_step0.process_merged_images(self.raw, self.folder('expected'))
+        process_merged_images(self.raw, self.folder('merged_images'))
+
+        self.assert_same_frames(self.folder('expected'), self.folder('merged_images'))
+
+    def test_online_merge(self):
+        import baseline_step0
+        from common.online_merge import MergeAugment, build_channel_cache, load_cached_channels
+
+        self.save_channels((24, 32, 3), 'RGB')
+        baseline_step0.process_merged_images(self.raw, self.folder('expected'))
+        build_channel_cache(self.raw, self.folder('channel_cache'))
+
+        online = MergeAugment()(load_cached_channels(self.folder('channel_cache'), 'P1_A01_0001'))
+        on_disk = self.read_model_rgb(os.path.join(self.folder('expected'), 'P1_A01_0001.png'))
+        self.assertEqual(online.tobytes(), on_disk[:, :, ::-1].tobytes())
+
+@unittest.skipUnless(HAVE_IMAGE_STACK, "needs numpy, Pillow and PyYAML")
+class NativeDepthParityTest(unittest.TestCase):
+    """
+    The native bit-depth merge has no baseline; in-memory frames and online
+    merges must equal what step0 writes with native_depth.
+    """
+
+    def setUp(self):
+        import numpy as np
+        from PIL import Image
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.raw = os.path.join(self.tmp.name, 'raw')
+        os.makedirs(self.raw)
+        rng = np.random.default_rng(1)
+        for channel in ('DIC', 'RFP', 'GFP'):
+            pixels = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+            Image.fromarray(pixels, 'RGB').save(os.path.join(self.raw, f'P1_A01_0001_{channel}.tif'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_native_depth_merge(self):
+        from PIL import Image
+        from common.online_merge import MergeAugment, build_channel_cache, load_cached_channels
+        from common.preprocess import process_merged_images
+        from common.transforms import check_parity, to_model_rgb
+
+        processed = os.path.join(self.tmp.name, 'merged_images')
+        process_merged_images(self.raw, processed, native_depth=True)
+        with Image.open(os.path.join(processed, 'P1_A01_0001.png')) as image:
+            on_disk = to_model_rgb(image)
+
+        report = check_parity(self.raw, processed, 'merged', native_depth=True)
+        self.assertEqual((report['frames'], report['missing'], report['mismatched']), (1, 0, 0))
+
+        cache = os.path.join(self.tmp.name, 'channel_cache')
+        build_channel_cache(self.raw, cache)
+        online = MergeAugment(native_depth=True)(load_cached_channels(cache, 'P1_A01_0001'))
+        self.assertEqual(online.tobytes(), on_disk[:, :, ::-1].tobytes())
+
+if __name__ == '__main__':
+    unittest.main()